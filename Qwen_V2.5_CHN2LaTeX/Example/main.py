@@ -1,5 +1,4 @@
 import sys
-import json
 import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
@@ -12,6 +11,10 @@ PROJECT_ROOT = Path("E:/Qwen_V2.5_CHN2LaTeX")
 RESOURCE_FILE_FLODER = PROJECT_ROOT / "data/splits"
 EXAMPLE_FILE = RESOURCE_FILE_FLODER / "data_splits_with_CHN_Example.jsonl"
 
+# 记录类型与数据管线共用（data/processed/records.py）
+sys.path.append(str(Path(__file__).resolve().parent.parent / "data" / "processed"))
+from records import LabelledRecord
+
 # === QtPy UI定义 ===
 class FormulaApp(QWidget):
     def __init__(self):
@@ -105,16 +108,24 @@ class FormulaApp(QWidget):
         """)
 
     def load_data(self, file_path):
-        """加载JSONL数据文件"""
+        """加载JSONL数据文件，每行解码为 LabelledRecord；无效或未标注的行跳过"""
         formulas = []
+        skipped = 0
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
+            with open(file_path, 'rb') as f:
                 for line in f:
-                    formulas.append(json.loads(line))
-            return formulas
+                    if not line.strip():
+                        continue
+                    try:
+                        formulas.append(LabelledRecord.from_json(line))
+                    except ValueError:
+                        skipped += 1
         except Exception as e:
             QMessageBox.critical(self, "数据加载错误", f"无法加载数据文件:\n{str(e)}")
             return []
+        if skipped:
+            QMessageBox.warning(self, "数据加载警告", f"跳过了 {skipped} 条无效或未标注的记录")
+        return formulas
 
     def create_widgets(self):
         """创建界面组件"""
@@ -129,7 +140,7 @@ class FormulaApp(QWidget):
         selection_layout.addWidget(QLabel("选择中文描述："))
         self.combo = QComboBox()
         self.combo.setFont(QFont("Microsoft YaHei", 10))
-        self.combo.addItems([item['CHINESE'] for item in self.formulas])
+        self.combo.addItems([item.chinese for item in self.formulas])
         self.combo.currentIndexChanged.connect(self.update_formula_preview)
         selection_layout.addWidget(self.combo)
         
@@ -201,13 +212,13 @@ class FormulaApp(QWidget):
             
         # 获取当前公式数据
         current_data = self.formulas[index]
-        latex_code = current_data['LaTeX']
+        latex_code = current_data.latex
         
         # 显示LaTeX代码
         self.latex_label.setText(latex_code)
         
         # 显示公式意义（如果存在）
-        meaning = current_data.get('MEANING', '该公式暂无详细说明')
+        meaning = current_data.meaning or '该公式暂无详细说明'
         self.meaning_text.setPlainText(meaning)
         
         # 渲染公式图像
@@ -250,7 +261,7 @@ class FormulaApp(QWidget):
             QApplication.setOverrideCursor(Qt.WaitCursor)
             
             # 生成智能默认文件名
-            default_name = self.formulas[self.current_index]['CHINESE'][:10] + ".png"
+            default_name = self.formulas[self.current_index].chinese[:10] + ".png"
             
             options = QFileDialog.Options()
             file_name, _ = QFileDialog.getSaveFileName(
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import requests
+
+from latex_scan import scan_batch
+from raw_format import arxiv_record
+
+logger = logging.getLogger("crawler")
+
+ARXIV_API_URL = "http://export.arxiv.org/api/query"
+ATOM_NS = {"atom": "http://www.w3.org/2005/Atom"}
+DEFAULT_CATEGORIES = ["math.AP", "math.CA", "math.PR", "math.NA", "math-ph"]
+
+# === 公式提取 ===
+def entry_records(title, formulas, min_length=10):
+    """把一篇论文摘要中提取出的公式转换为原始记录"""
+    # 过滤简单公式
+    return [arxiv_record(title, formula) for formula in formulas if len(formula) > min_length]
+
+def parse_feed(content):
+    """解析 Atom 响应，返回 [(id, published, title, abstract), ...]"""
+    root = ET.fromstring(content)
+    entries = []
+    for entry in root.findall("atom:entry", ATOM_NS):
+        entries.append((
+            entry.findtext("atom:id", "", ATOM_NS).strip(),
+            entry.findtext("atom:published", "", ATOM_NS).strip(),
+            entry.findtext("atom:title", "", ATOM_NS).strip(),
+            entry.findtext("atom:summary", "", ATOM_NS).strip(),
+        ))
+    return entries
+
+# === 高水位状态 ===
+class HarvestState:
+    """每个分类的高水位：已抓取的最新提交时间，以及该时间点上已见过的论文id"""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.marks = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.marks = json.load(f)
+
+    def get(self, category):
+        mark = self.marks.get(category)
+        if not mark:
+            return None, set()
+        return mark["published"], set(mark["ids"])
+
+    def update(self, category, published, ids):
+        self.marks[category] = {"published": published, "ids": sorted(ids)}
+        self.save()
+
+    def save(self):
+        """先写临时文件再替换，避免中途崩溃写坏状态"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.marks, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+# === 多分类增量采集 ===
+class ArxivHarvester:
+    """按分类并行分页采集 arXiv，只获取高水位之后的新论文
+
+    - 每个分类一个线程、一个会话，分类内按提交时间倒序翻页
+    - 遇到不晚于高水位的论文即停止翻页
+    - 分类内相邻两次请求至少间隔 delay 秒（arXiv 建议 3 秒）
+    - max_per_category 限制首次采集（尚无高水位）时每个分类回溯的论文数
+    - 高水位在该分类的全部记录写入后才更新，崩溃后不会漏采
+    """
+    def __init__(self, state_path, categories=None, batch_size=100, delay=3.0,
+                 max_per_category=None, max_workers=4, api_url=ARXIV_API_URL,
+                 session_factory=requests.Session):
+        self.state = HarvestState(state_path)
+        self.categories = categories or DEFAULT_CATEGORIES
+        self.batch_size = batch_size
+        self.delay = delay
+        self.max_per_category = max_per_category
+        self.max_workers = max_workers
+        self.api_url = api_url
+        self.session_factory = session_factory
+        self.stats = {"requests": 0, "papers": 0, "records": 0}
+        self._lock = threading.Lock()
+
+    def _harvest_category(self, category, out):
+        """采集单个分类，把 ("batch", 记录) 和 ("done", 分类, 新高水位) 放入 out"""
+        session = self.session_factory()
+        mark_published, mark_ids = self.state.get(category)
+        newest_published, newest_ids = mark_published, set(mark_ids)
+        start = 0
+        fetched = 0
+        last_request = 0.0
+
+        try:
+            while True:
+                wait = self.delay - (time.monotonic() - last_request)
+                if wait > 0:
+                    time.sleep(wait)
+                last_request = time.monotonic()
+
+                params = {
+                    "search_query": f"cat:{category}",
+                    "start": start,
+                    "max_results": self.batch_size,
+                    "sortBy": "submittedDate",
+                    "sortOrder": "descending"
+                }
+                response = session.get(self.api_url, params=params)
+                response.raise_for_status()
+                with self._lock:
+                    self.stats["requests"] += 1
+                entries = parse_feed(response.content)
+                if not entries:
+                    break
+
+                new_entries = []
+                reached_mark = False
+                for paper_id, published, title, abstract in entries:
+                    # 到达高水位：之后的论文在以前的运行中已经采集过
+                    if mark_published and (published < mark_published or
+                                           (published == mark_published and paper_id in mark_ids)):
+                        reached_mark = True
+                        break
+                    if newest_published is None or published > newest_published:
+                        newest_published, newest_ids = published, {paper_id}
+                    elif published == newest_published:
+                        newest_ids.add(paper_id)
+                    new_entries.append((title, abstract))
+
+                # 整页摘要一次扫描提取公式
+                records = []
+                for (title, _), formulas in zip(new_entries, scan_batch(a for _, a in new_entries)):
+                    records.extend(entry_records(title, formulas))
+                new_papers = len(new_entries)
+                fetched += new_papers
+                with self._lock:
+                    self.stats["papers"] += new_papers
+                out.put(("batch", category, records))
+
+                start += len(entries)
+                if reached_mark or len(entries) < self.batch_size:
+                    break
+                # 上限只约束首次采集的回溯深度；已有高水位时必须翻到高水位为止，否则会漏采
+                if self.max_per_category and mark_published is None and fetched >= self.max_per_category:
+                    break
+        except Exception as e:
+            logger.error(f"arXiv分类 {category} 采集失败: {str(e)}")
+            out.put(("done", category, None, None))
+            return
+
+        logger.info(f"arXiv分类 {category} 新增论文 {fetched} 篇")
+        out.put(("done", category, newest_published, newest_ids))
+
+    def iter_batches(self):
+        """生成器：并行采集所有分类，逐批产出记录；调用方写入后再提交高水位"""
+        out = queue.Queue(maxsize=self.max_workers * 4)
+        pending = list(self.categories)
+        running = 0
+        threads = []
+
+        def launch():
+            nonlocal running
+            category = pending.pop(0)
+            thread = threading.Thread(target=self._harvest_category, args=(category, out), daemon=True)
+            thread.start()
+            threads.append(thread)
+            running += 1
+
+        while pending and running < self.max_workers:
+            launch()
+
+        while running:
+            item = out.get()
+            if item[0] == "batch":
+                _, category, records = item
+                with self._lock:
+                    self.stats["records"] += len(records)
+                yield records
+                continue
+            _, category, published, ids = item
+            running -= 1
+            if published is not None:
+                self.state.update(category, published, ids)
+            if pending:
+                launch()
+
+        for thread in threads:
+            thread.join()
+        logger.info(f"arXiv采集完成: {len(self.categories)} 个分类, 请求 {self.stats['requests']} 次, "
+                    f"新增论文 {self.stats['papers']} 篇, 新增记录 {self.stats['records']} 条")
+
+    def harvest(self):
+        """iter_batches 的列表版本
+
+        高水位在返回前就已推进并保存，返回后写入前崩溃会永久漏采这些论文；
+        需要落盘的场景应把 iter_batches() 直接写入 sink（见 crawler / crawler_violent）。
+        """
+        data = []
+        for records in self.iter_batches():
+            data.extend(records)
+        return data
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger("crawler")
+
+DEFAULT_HEADERS = {
+    "User-Agent": "CHN2LaTeX-crawler/1.0 (+https://github.com/GrayOcean0133/CHN2LaTeX)"
+}
+
+# === 异步抓取引擎 ===
+class AsyncFetcher:
+    """基于asyncio的并发抓取引擎
+
+    - 共享一个 aiohttp.ClientSession，连接池保持长连接，避免每页重新握手
+    - concurrency 限制全局在途请求数，per_host_limit 限制单个主机的在途请求数
+    - 传入 rate_controller 时再按主机自适应限速（见 rate_control.RateController）
+    """
+    def __init__(self, concurrency=16, per_host_limit=4, timeout=30, headers=None, rate_controller=None):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.rate_controller = rate_controller
+        self.session = None
+        self._host_slots = {}
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.per_host_limit,
+            keepalive_timeout=60
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _slot(self, url):
+        """获取主机对应的信号量（每主机在途上限）"""
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_slots[host]
+
+    async def fetch(self, url):
+        """抓取单个页面，返回 (url, 文本或None, 异常或None)"""
+        async with self._slot(url):
+            try:
+                if self.rate_controller:
+                    await self.rate_controller.acquire_async(url)
+                async with self.session.get(url) as response:
+                    if self.rate_controller:
+                        self.rate_controller.observe(url, response.status, response.headers)
+                    response.raise_for_status()
+                    body = await response.read()
+                    self.stats["requests"] += 1
+                    self.stats["bytes"] += len(body)
+                    text = body.decode(response.get_encoding(), errors="replace")
+                    return url, text, None
+            except Exception as e:
+                self.stats["errors"] += 1
+                return url, None, e
+
+    async def fetch_all(self, urls):
+        """并发抓取全部页面，结果顺序与输入顺序一致"""
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+
+def fetch_pages(urls, concurrency=16, per_host_limit=4, timeout=30, rate_controller=None):
+    """同步入口：并发抓取一组URL，返回 [(url, 文本或None, 异常或None), ...]"""
+    async def _run():
+        async with AsyncFetcher(concurrency, per_host_limit, timeout,
+                                rate_controller=rate_controller) as fetcher:
+            start = time.perf_counter()
+            results = await fetcher.fetch_all(urls)
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"异步抓取完成: {fetcher.stats['requests']} 页成功, "
+                f"{fetcher.stats['errors']} 页失败, 用时 {elapsed:.2f}s "
+                f"({len(urls)/max(elapsed, 1e-9):.1f} 页/秒)"
+            )
+            return results
+
+    return asyncio.run(_run())
@@ -0,0 +1,315 @@
+import argparse
+import logging
+import os
+import struct
+import time
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from hash_set import content_digest
+from label_client import parse_label
+from label_store import parse_batch_result
+from records import dumps_line, loads
+
+logger = logging.getLogger("data_wash")
+
+# === custom_id → 字节偏移索引 ===
+INDEX_MAGIC = b"CLIX"
+INDEX_VERSION = 2  # 2: 重复的 custom_id 只保留最后一行
+INDEX_HEADER = struct.Struct("<4sIQQQ")  # 魔数、版本、行数、源文件大小、源文件修改时间（纳秒）
+INDEX_DTYPE = np.dtype([("key", "<u8"), ("offset", "<u8")])
+
+# records 编解码器写出紧凑分隔符；旧数据集由标准库 json 写出，冒号后带空格
+CUSTOM_ID_PREFIXES = (b'{"custom_id":"', b'{"custom_id": "')
+
+def id_key(custom_id):
+    """custom_id 的64位摘要；摘要相同的 id 在查找时按源文件中的记录区分"""
+    return content_digest(custom_id, 64)
+
+def extract_id(line):
+    """从一行记录中取出 custom_id；datawash 输出的行以 custom_id 开头，不必解析整行
+
+    无法解析或没有字符串 custom_id 的行返回 None，由调用方跳过并计数。
+    """
+    for prefix in CUSTOM_ID_PREFIXES:
+        if line.startswith(prefix):
+            end = line.find(b'"', len(prefix))
+            if end > 0 and b"\\" not in line[len(prefix):end]:
+                return line[len(prefix):end].decode("utf-8")
+            break
+    item = parse_record(line)
+    return item["custom_id"] if item is not None else None
+
+def parse_record(line):
+    """解析一行记录/批处理结果；无法解析或没有字符串 custom_id 时返回 None"""
+    try:
+        item = loads(line)
+    except ValueError:
+        return None
+    if not isinstance(item, dict) or not isinstance(item.get("custom_id"), str):
+        return None
+    return item
+
+class IdOffsetIndex:
+    """数据集的 custom_id → 字节偏移索引，保存在 <数据集>.idx 中
+
+    - 每条 16 字节：64位 id 摘要 + 偏移，按摘要排序后写入，查询时内存映射、二分查找
+    - 文件头记录源文件大小与修改时间，数据集变化后自动重建
+    - lookup 按偏移顺序读取源文件并核对 custom_id，摘要冲突不会取错记录
+    - 同一 custom_id 出现多次时（非增量的 datawash 重跑会把同样的记录再追加一遍）只索引最后一行，
+      并记录警告；合并结果与待重新提交的记录都只对应这一行
+    """
+    def __init__(self, source, path=None, rebuild=False):
+        self.source = Path(source)
+        self.path = Path(path) if path else self.source.with_name(self.source.name + ".idx")
+        if rebuild or not self._fresh():
+            self.build()
+        self._open()
+
+    def _stamp(self):
+        st = os.stat(self.source)
+        return st.st_size, st.st_mtime_ns
+
+    def _fresh(self):
+        if not self.path.exists():
+            return False
+        with open(self.path, "rb") as f:
+            header = f.read(INDEX_HEADER.size)
+        if len(header) != INDEX_HEADER.size:
+            return False
+        magic, version, _, size, mtime = INDEX_HEADER.unpack(header)
+        return magic == INDEX_MAGIC and version == INDEX_VERSION and (size, mtime) == self._stamp()
+
+    def build(self):
+        start = time.perf_counter()
+        keys, offsets = array('Q'), array('Q')
+        offset = skipped = 0
+        with open(self.source, "rb") as f:
+            for line in f:
+                if line.strip():
+                    custom_id = extract_id(line)
+                    if custom_id is None:
+                        skipped += 1
+                    else:
+                        keys.append(id_key(custom_id))
+                        offsets.append(offset)
+                offset += len(line)
+        if skipped:
+            logger.warning(f"{self.source} 中 {skipped} 行无法解析或没有 custom_id，未编入索引（不会合并或重新提交）")
+        table = np.empty(len(keys), dtype=INDEX_DTYPE)
+        table["key"] = np.frombuffer(keys, dtype=np.uint64) if keys else 0
+        table["offset"] = np.frombuffer(offsets, dtype=np.uint64) if offsets else 0
+        table.sort(order=("key", "offset"))
+        table = self._drop_duplicates(table)
+
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(table), *self._stamp()))
+            f.write(table.tobytes())
+        os.replace(tmp, self.path)
+        logger.info(f"索引构建完成: {len(table)} 条记录 → {self.path} "
+                    f"({self.path.stat().st_size / 1024**2:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+    def _drop_duplicates(self, table):
+        """去掉 custom_id 重复的行，只保留最后一次出现的（偏移最大的）一行
+
+        摘要相同的行逐条读出 custom_id 核对，64位摘要冲突的不同 id 都保留。
+        """
+        same = np.flatnonzero(table["key"][1:] == table["key"][:-1])
+        if not same.size:
+            return table
+        last = {}
+        keep = np.ones(len(table), dtype=bool)
+        with open(self.source, "rb") as f:
+            # 表已按 (摘要, 偏移) 排序：同一 id 后读到的行偏移更大
+            for row in np.union1d(same, same + 1).tolist():
+                f.seek(int(table["offset"][row]))
+                key = (int(table["key"][row]), extract_id(f.readline()))
+                if key in last:
+                    keep[last[key]] = False
+                last[key] = row
+        dropped = len(table) - int(np.count_nonzero(keep))
+        if dropped:
+            logger.warning(f"{self.source} 中有 {dropped} 行的 custom_id 在后面再次出现，索引只保留最后一次出现的记录")
+        return table[keep]
+
+    def _open(self):
+        with open(self.path, "rb") as f:
+            _, _, rows, _, _ = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if rows:
+            self.table = np.memmap(self.path, dtype=INDEX_DTYPE, mode="r", offset=INDEX_HEADER.size, shape=(rows,))
+        else:
+            self.table = np.empty(0, dtype=INDEX_DTYPE)
+        self.keys = self.table["key"]
+        self.offsets = self.table["offset"]
+        self.file = open(self.source, "rb")
+
+    def __len__(self):
+        return len(self.table)
+
+    def read(self, row):
+        """读取索引第 row 条对应的原始行（字节）"""
+        self.file.seek(int(self.offsets[row]))
+        return self.file.readline()
+
+    def lookup(self, custom_ids):
+        """批量查找，返回与输入等长的列表，元素为 (索引行号, 原始行字节)，找不到时为 None"""
+        result = [None] * len(custom_ids)
+        if not len(self.table) or not custom_ids:
+            return result
+        keys = np.fromiter((id_key(c) for c in custom_ids), dtype=np.uint64, count=len(custom_ids))
+        rows = np.searchsorted(self.keys, keys)
+        hit = rows < len(self.table)
+        hit[hit] = self.keys[rows[hit]] == keys[hit]
+        # 按偏移顺序读源文件，尽量顺序访问磁盘
+        candidates = np.flatnonzero(hit)
+        offsets = self.offsets[rows[candidates]]
+        order = np.argsort(offsets, kind="stable")
+        for i, row, offset in zip(candidates[order].tolist(), rows[candidates[order]].tolist(),
+                                  offsets[order].tolist()):
+            while True:
+                self.file.seek(offset)
+                line = self.file.readline()
+                if extract_id(line) == custom_ids[i]:
+                    result[i] = (row, line)
+                    break
+                # 64位摘要冲突：同一摘要的下一条
+                row += 1
+                if row >= len(self.table) or self.keys[row] != keys[i]:
+                    break
+                offset = int(self.offsets[row])
+        return result
+
+    def close(self):
+        self.file.close()
+        self.table = self.keys = self.offsets = None
+
+# === 合并 ===
+def truncate_partial_line(path):
+    """进程中断可能留下不完整的最后一行，截断到最后一个换行符"""
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            f.seek(max(0, end - 4096))
+            block = f.read(end - max(0, end - 4096))
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                end = max(0, end - 4096) + newline + 1
+                break
+            end = max(0, end - 4096)
+        if end != size:
+            logger.warning(f"{path} 末尾有 {size - end} 字节不完整的记录，已截断")
+            f.truncate(end)
+
+def _chunks(lines, size):
+    chunk = []
+    for line in lines:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def merge_results(splits_file, result_files, output_file, resubmit_file=None, chunk=10000,
+                  label_store=None, rebuild_index=False):
+    """把批处理输出按 custom_id 合并回数据集，写出带 CHINESE/Meaning 的记录
+
+    - 结果文件可以是任意顺序、任意批次；每块 chunk 条在索引中查找后按偏移顺序读取数据集
+    - 常驻内存只有索引的内存映射（每条 16 字节）和每条记录 2 字节的标记，不随结果文件增大
+    - output_file 已有的记录（之前合并的或 label_client 写出的）不会重复写入
+    - 失败请求与没有结果的记录，按原始请求格式写入 resubmit_file，可直接重新分片提交
+    返回统计字典。
+    """
+    start = time.perf_counter()
+    index = IdOffsetIndex(splits_file, rebuild=rebuild_index)
+    merged = np.zeros(len(index), dtype=bool)
+    failed = np.zeros(len(index), dtype=bool)
+    stats = {"records": len(index), "merged": 0, "existing": 0, "failed": 0, "duplicates": 0,
+             "unknown": 0, "invalid": 0, "resubmit": 0}
+
+    if os.path.exists(output_file):
+        truncate_partial_line(output_file)
+        with open(output_file, "rb") as f:
+            for lines in _chunks(f, chunk):
+                custom_ids = [c for c in map(extract_id, lines) if c is not None]
+                stats["invalid"] += len(lines) - len(custom_ids)
+                for found in index.lookup(custom_ids):
+                    if found is not None and not merged[found[0]]:
+                        merged[found[0]] = True
+                        stats["existing"] += 1
+
+    with open(output_file, "a", encoding="utf-8") as out:
+        for path in result_files:
+            with open(path, "rb") as f:
+                for lines in _chunks(f, chunk):
+                    items = [item for item in map(parse_record, lines) if item is not None]
+                    stats["invalid"] += len(lines) - len(items)
+                    labels = []
+                    for item, found in zip(items, index.lookup([item["custom_id"] for item in items])):
+                        if found is None:
+                            stats["unknown"] += 1
+                            continue
+                        row, line = found
+                        label = parse_batch_result(item)
+                        if label is None:
+                            failed[row] = True
+                            continue
+                        if merged[row]:
+                            stats["duplicates"] += 1
+                            continue
+                        merged[row] = True
+                        entry = loads(line)
+                        entry["CHINESE"], entry["Meaning"] = parse_label(label[1])
+                        out.write(dumps_line(entry))
+                        stats["merged"] += 1
+                        labels.append((entry["custom_id"], entry["CHINESE"], label[2]))
+                    if label_store is not None and labels:
+                        label_store.put_many(labels)
+            logger.info(f"已合并 {path}")
+
+    # 后来又成功的请求不算失败
+    failed &= ~merged
+    stats["failed"] = int(np.count_nonzero(failed))
+    if stats["unknown"]:
+        logger.warning(f"{stats['unknown']} 条结果的 custom_id 不在数据集中（数据集可能已重新清洗）")
+    if stats["invalid"]:
+        logger.warning(f"{stats['invalid']} 行结果/已有输出无法解析或没有 custom_id，已跳过")
+    if resubmit_file is not None:
+        with open(resubmit_file, "wb") as out:
+            pending = np.flatnonzero(~merged)
+            for row in pending[np.argsort(index.offsets[pending], kind="stable")]:
+                out.write(index.read(row))
+                stats["resubmit"] += 1
+    index.close()
+
+    logger.info(f"合并完成: 数据集 {stats['records']} 条，本次合并 {stats['merged']} 条，"
+                f"输出中已有 {stats['existing']} 条，失败 {stats['failed']} 条，"
+                f"无结果 {stats['records'] - stats['merged'] - stats['existing'] - stats['failed']} 条，"
+                f"重复结果 {stats['duplicates']} 条 ({time.perf_counter() - start:.1f}s)"
+                + (f"，待重新提交 {stats['resubmit']} 条 → {resubmit_file}" if resubmit_file else ""))
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把批处理结果按 custom_id 合并回数据集")
+    parser.add_argument("splits", help="datawash 输出的数据集（data_splits_NO_CHN.jsonl）")
+    parser.add_argument("output", help="合并后的数据集（data_splits_with_CHN.jsonl），已有记录不会重复写入")
+    parser.add_argument("results", nargs="+", help="批处理输出文件（任意顺序）")
+    parser.add_argument("--resubmit", default=None, help="失败或缺失的请求（原始请求格式）")
+    parser.add_argument("--chunk", type=int, default=10000, help="每次查找的结果条数")
+    parser.add_argument("--labels", default=None, help="同时把标注登记到标注库（label_store）")
+    parser.add_argument("--rebuild-index", action="store_true", help="强制重建 custom_id 索引")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    store = None
+    if args.labels:
+        from label_store import LabelStore
+        store = LabelStore(args.labels)
+    merge_results(args.splits, args.results, args.output, args.resubmit, args.chunk, store, args.rebuild_index)
+    if store is not None:
+        store.close()
@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from hash_set import CompactHashSet, content_digest
+from records import loads
+
+logger = logging.getLogger("data_wash")
+
+# 百炼 / OpenAI 批处理接口对单个输入文件的限制：最多 5 万条请求；大小限制取较保守的值
+MAX_LINES = 50000
+MAX_BYTES = 100 * 1024**2
+MANIFEST_NAME = "manifest.json"
+LEGACY_FIELDS = ("first_custom_id", "last_custom_id")
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# === 清单 ===
+class Manifest:
+    """分片清单：每个分片的文件名、行数、字节数、sha256、在数据集中的位置，
+    以及上传/重试/合并阶段写入的状态字段（status、batch_id 等）
+
+    位置：分片的记录取自数据集第 start_line 到 end_line 行（从1计，含两端），即字节 [start_offset, end_offset)，
+    其中跳过的（已标注、custom_id 重复的）行不在分片中；first/last_source_line 为原始数据中的行号。
+
+    先写临时文件再替换，中途崩溃不会写坏清单。
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = {"shards": []}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    @property
+    def shards(self):
+        return self.data["shards"]
+
+    def shard(self, name):
+        for shard in self.shards:
+            if shard["file"] == name:
+                return shard
+        raise KeyError(name)
+
+    def update_shard(self, name, **fields):
+        """更新一个分片的状态字段并立即保存"""
+        self.shard(name).update(fields)
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+# === 分片 ===
+class _ShardWriter:
+    """写一个分片：边写边算 sha256，关闭时改名为正式文件名"""
+    def __init__(self, out_dir, index, prefix):
+        self.name = f"{prefix}_{index:05d}.jsonl"
+        self.path = Path(out_dir) / self.name
+        self.tmp = self.path.with_suffix(".jsonl.tmp")
+        self.file = open(self.tmp, "wb")
+        self.sha = hashlib.sha256()
+        self.info = {"index": index, "file": self.name, "lines": 0, "bytes": 0}
+
+    def write(self, line, entry, line_num, offset, end):
+        self.file.write(line)
+        self.sha.update(line)
+        info = self.info
+        if not info["lines"]:
+            info["start_line"] = line_num
+            info["start_offset"] = offset
+            info["first_source_line"] = entry.get("source_line")
+        info["end_line"] = line_num
+        info["end_offset"] = end
+        info["last_source_line"] = entry.get("source_line")
+        info["lines"] += 1
+        info["bytes"] += len(line)
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp, self.path)
+        self.info["sha256"] = self.sha.hexdigest()
+        return self.info
+
+def shard_splits(splits_file, out_dir, max_lines=MAX_LINES, max_bytes=MAX_BYTES, prefix="batch",
+                 label_store=None):
+    """把清洗后的数据集流式切分为行数、字节数都不超限的分片，并写出清单
+
+    - 记录按原样（原始字节）写入，分片内容只取决于输入，重跑结果完全相同
+    - 与旧清单中文件名、sha256 都相同的分片沿用其状态字段（已上传、已完成等），
+      数据集只在末尾追加时，只有最后一个分片和新增的分片需要重新处理
+    - 传入 label_store（label_store.LabelStore）时跳过已有标注的记录
+    - custom_id 重复的记录（非增量的 datawash 重跑会把同样的记录再追加一遍）只提交第一次出现的，
+      避免同一请求提交、计费两次；已见过的 id 以128位摘要保存在 CompactHashSet 中
+    返回清单对象。
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(out_dir / MANIFEST_NAME)
+    previous = {shard["file"]: shard for shard in manifest.shards}
+
+    start = time.perf_counter()
+    shards = []
+    writer = None
+    skipped = duplicates = 0
+    seen = CompactHashSet(bits=128)
+
+    def records():
+        """(行号, 起始偏移, 结束偏移, 行, 记录)；行号与偏移都按数据集文件计"""
+        offset = 0
+        with open(splits_file, "rb") as f:
+            for line_num, line in enumerate(f, 1):
+                start, offset = offset, offset + len(line)
+                if not line.strip():
+                    continue
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                yield line_num, start, offset, line, loads(line)
+
+    def drain(batch):
+        nonlocal writer, skipped, duplicates
+        if label_store is not None:
+            # 整块批量查询标注库
+            pending = {entry["custom_id"] for entry in label_store.unlabelled(item[4] for item in batch)}
+        for line_num, start, end, line, entry in batch:
+            if not seen.add(content_digest(entry["custom_id"], 128)):
+                duplicates += 1
+                continue
+            if label_store is not None and entry["custom_id"] not in pending:
+                skipped += 1
+                continue
+            if len(line) > max_bytes:
+                raise ValueError(f"记录 {entry['custom_id']} 长 {len(line)} 字节，超过单个分片上限 {max_bytes}")
+            if writer is not None and (writer.info["lines"] >= max_lines or
+                                       writer.info["bytes"] + len(line) > max_bytes):
+                shards.append(writer.close())
+                writer = None
+            if writer is None:
+                writer = _ShardWriter(out_dir, len(shards), prefix)
+            writer.write(line, entry, line_num, start, end)
+
+    batch = []
+    for item in records():
+        batch.append(item)
+        if len(batch) >= 1000:
+            drain(batch)
+            batch = []
+    drain(batch)
+    if writer is not None:
+        shards.append(writer.close())
+
+    # 沿用未变化分片的状态
+    reused = 0
+    for info in shards:
+        old = previous.get(info["file"])
+        if old and old.get("sha256") == info["sha256"]:
+            # 旧版清单的 first/last_custom_id 不能定位记录，不再沿用
+            info.update({k: v for k, v in old.items() if k not in info and k not in LEGACY_FIELDS})
+            reused += 1
+        else:
+            info["status"] = "pending"
+
+    # 删除上次多出来的旧分片文件
+    names = {info["file"] for info in shards}
+    for name in previous:
+        if name not in names and (out_dir / name).exists():
+            (out_dir / name).unlink()
+
+    manifest.data = {
+        "source": str(splits_file),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "max_lines": max_lines,
+        "max_bytes": max_bytes,
+        "records": sum(info["lines"] for info in shards),
+        "skipped_labelled": skipped,
+        "skipped_duplicates": duplicates,
+        "shards": shards,
+    }
+    manifest.save()
+    if duplicates:
+        logger.warning(f"{splits_file} 中 {duplicates} 条记录的 custom_id 与前面的记录重复，未写入分片")
+    logger.info(f"分片完成: {manifest.data['records']} 条记录 → {len(shards)} 个分片 ({out_dir})，"
+                f"沿用未变化分片 {reused} 个，跳过已标注 {skipped} 条、重复 {duplicates} 条 "
+                f"({time.perf_counter() - start:.1f}s)")
+    return manifest
+
+def verify_shards(out_dir):
+    """按清单重新计算各分片的 sha256 与行数，返回不一致的分片文件名列表"""
+    out_dir = Path(out_dir)
+    manifest = Manifest(out_dir / MANIFEST_NAME)
+    bad = []
+    for shard in manifest.shards:
+        path = out_dir / shard["file"]
+        if not path.exists():
+            bad.append(shard["file"])
+            continue
+        with open(path, "rb") as f:
+            lines = sum(1 for _ in f)
+        if lines != shard["lines"] or file_sha256(path) != shard["sha256"]:
+            bad.append(shard["file"])
+    return bad
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把数据集切分为批处理任务分片并生成清单")
+    parser.add_argument("splits", help="datawash 输出的数据集（批处理请求格式）")
+    parser.add_argument("out_dir", help="分片与 manifest.json 的输出目录")
+    parser.add_argument("--max-lines", type=int, default=MAX_LINES, help="每个分片最多的请求数")
+    parser.add_argument("--max-mb", type=float, default=MAX_BYTES / 1024**2, help="每个分片最大的字节数（MB）")
+    parser.add_argument("--prefix", default="batch", help="分片文件名前缀")
+    parser.add_argument("--labels", default=None, help="标注库（label_store），跳过已标注的记录")
+    parser.add_argument("--verify", action="store_true", help="只校验已有分片与清单是否一致")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.verify:
+        bad = verify_shards(args.out_dir)
+        for name in bad:
+            logger.error(f"分片与清单不一致: {name}")
+        logger.info(f"校验完成，不一致 {len(bad)} 个")
+        raise SystemExit(1 if bad else 0)
+
+    store = None
+    if args.labels:
+        from label_store import LabelStore
+        store = LabelStore(args.labels)
+    shard_splits(args.splits, args.out_dir, args.max_lines, int(args.max_mb * 1024**2), args.prefix, store)
+    if store is not None:
+        store.close()
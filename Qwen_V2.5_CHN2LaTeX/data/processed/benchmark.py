@@ -0,0 +1,1661 @@
+import argparse
+import filecmp
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+# === 本地夹具站点 ===
+WIKI_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html class="client-nojs" lang="zh">
+<head><meta charset="UTF-8"><title>{title} - 维基百科，自由的百科全书</title></head>
+<body class="mediawiki skin-vector">
+<div id="mw-navigation"><ul>{nav}</ul></div>
+<div id="content" class="mw-body">
+<h1 id="firstHeading" class="firstHeading mw-first-heading"><span class="mw-page-title-main">{title}</span></h1>
+<div id="bodyContent" class="vector-body"><div id="mw-content-text" class="mw-body-content">
+<div class="mw-parser-output">
+{paragraphs}
+</div></div></div></div>
+</body></html>"""
+
+WIKI_FORMULA_TEMPLATE = """<p>{text}<span class="mwe-math-element"><span class="mwe-math-mathml-inline mwe-math-mathml-a11y" style="display: none;"><math xmlns="http://www.w3.org/1998/Math/MathML" alttext="{{\\displaystyle {latex}}}"><semantics><mrow><mi>x</mi></mrow><annotation encoding="application/x-tex">{{\\displaystyle {latex}}}</annotation></semantics></math></span><img src="/media/math/render/svg/{idx}" class="mwe-math-fallback-image-inline" aria-hidden="true" alt="{{\\displaystyle {latex}}}"></span>。</p>"""
+
+CATEGORY_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh"><head><meta charset="UTF-8"><title>Category:数学公式</title></head>
+<body><h1 id="firstHeading">Category:数学公式</h1>
+<div id="mw-pages"><div class="mw-category"><ul>{items}</ul></div></div>
+</body></html>"""
+
+SAMPLE_LATEX = [
+    "E = mc^2",
+    "\\int_a^b f(x)\\,dx = F(b) - F(a)",
+    "\\sum_{i=1}^n i = \\frac{n(n+1)}{2}",
+    "e^{i\\pi} + 1 = 0",
+    "\\nabla \\cdot \\mathbf{E} = \\frac{\\rho}{\\varepsilon_0}",
+    "\\lambda_k(\\Omega)",
+    "a^2 + b^2 = c^2",
+    "\\lim_{x \\to 0} \\frac{\\sin x}{x} = 1",
+]
+
+def fixture_formulas(formulas, seed=0):
+    """夹具页面中的公式列表，HTML页面与API回放使用同一份"""
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLE_LATEX) + f" + x_{{{idx}}}" for idx in range(formulas)]
+
+def escape_attr(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+def make_wiki_page(title, formulas, seed=0):
+    """生成一个结构与维基百科文章一致的夹具页面"""
+    rng = random.Random(seed)
+    nav = "".join(f'<li><a href="/wiki/Nav{i}">导航{i}</a></li>' for i in range(40))
+    paragraphs = []
+    for idx, latex in enumerate(fixture_formulas(formulas, seed)):
+        paragraphs.append(WIKI_FORMULA_TEMPLATE.format(text="正文" * rng.randint(20, 80), latex=escape_attr(latex), idx=idx))
+        paragraphs.append(f"<p>{'填充文字' * rng.randint(50, 150)}</p>")
+    return WIKI_PAGE_TEMPLATE.format(title=title, nav=nav, paragraphs="\n".join(paragraphs))
+
+def make_wikitext(formulas, seed=0):
+    """与 make_wiki_page 对应的 wikitext 源码"""
+    rng = random.Random(seed)
+    lines = ["{{Infobox 数学}}", "'''公式'''是……"]
+    for latex in fixture_formulas(formulas, seed):
+        lines.append("正文" * rng.randint(5, 20) + f"<math>{latex}</math>。")
+    lines.append("== 参见 ==\n* [[数学]]\n[[Category:数学公式]]")
+    return "\n".join(lines)
+
+def make_fixture_site(pages=100, formulas_per_page=10):
+    """生成夹具站点：分类页 + pages 个文章页，返回 {路径: HTML字节}"""
+    site = {}
+    items = []
+    for i in range(pages):
+        path = f"/wiki/公式{i}"
+        items.append(f'<li><a href="{path}" title="公式{i}">公式{i}</a></li>')
+        site[path] = make_wiki_page(f"公式{i}", formulas_per_page, seed=i).encode("utf-8")
+    site["/wiki/Category:数学公式"] = CATEGORY_TEMPLATE.format(items="".join(items)).encode("utf-8")
+    return site
+
+def api_key(params, path="/w/api.php"):
+    """回放响应的索引键：与参数顺序无关"""
+    return (path,) + tuple(sorted((k, str(v)) for k, v in params.items()))
+
+def record_api_responses(pages=100, formulas_per_page=10, member_page_size=100):
+    """生成 MediaWiki API 的录制响应（分类成员分页 + 每批50个标题的 wikitext）"""
+    titles = [f"公式{i}" for i in range(pages)]
+    responses = {}
+    base = {"format": "json", "formatversion": 2, "action": "query"}
+
+    # 分类成员：按 member_page_size 分页，带 cmcontinue 续传令牌
+    for start in range(0, pages, member_page_size):
+        params = dict(base, list="categorymembers", cmtitle="Category:数学公式",
+                      cmnamespace=0, cmtype="page", cmlimit=500)
+        if start:
+            params["cmcontinue"] = f"page|{start}"
+            params["continue"] = "-||"
+        payload = {"batchcomplete": True, "query": {"categorymembers": [
+            {"pageid": i + 1, "ns": 0, "title": titles[i]}
+            for i in range(start, min(start + member_page_size, pages))]}}
+        if start + member_page_size < pages:
+            payload["continue"] = {"cmcontinue": f"page|{start + member_page_size}", "continue": "-||"}
+        responses[api_key(params)] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    # 页面源码：每批50个标题
+    for start in range(0, pages, 50):
+        batch = titles[start:start + 50]
+        params = dict(base, prop="revisions", rvprop="content", rvslots="main", titles="|".join(batch))
+        payload = {"batchcomplete": True, "query": {"pages": [
+            {"pageid": start + j + 1, "ns": 0, "title": title, "revisions": [
+                {"slots": {"main": {"contentmodel": "wikitext", "contentformat": "text/x-wiki",
+                                    "content": make_wikitext(formulas_per_page, seed=start + j)}}}]}
+            for j, title in enumerate(batch)]}}
+        responses[api_key(params)] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return responses
+
+ARXIV_FEED_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+<title type="html">ArXiv Query</title>
+<opensearch:totalResults>{total}</opensearch:totalResults>
+{entries}
+</feed>"""
+
+ARXIV_ENTRY_TEMPLATE = """<entry>
+<id>http://arxiv.org/abs/{paper_id}v1</id>
+<published>{published}</published>
+<title>{title}</title>
+<summary>  We study $u_t - \\Delta u = f(u)$ on $\\Omega \\subset \\mathbb{{R}}^n$ and prove that
+  $\\|u(t)\\|_{{L^\\infty}} \\le C t^{{-{idx}}}$ for the {idx}-th mode.</summary>
+</entry>"""
+
+def make_arxiv_papers(category, count, offset=0):
+    """生成某分类的论文列表（按提交时间倒序），offset 越大越新"""
+    code = sum(map(ord, category)) % 100
+    papers = []
+    for i in reversed(range(offset, offset + count)):
+        published = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1.7e9 + i * 3600))
+        papers.append({"paper_id": f"25{code:02d}.{i:05d}", "published": published,
+                       "title": f"On problem {i} in {category}", "idx": i})
+    return papers
+
+def record_arxiv_feeds(papers_by_category, batch_size=100):
+    """生成 arXiv API 的录制 Atom 响应，按 start/max_results 分页"""
+    responses = {}
+    for category, papers in papers_by_category.items():
+        for start in range(0, len(papers) + 1, batch_size):
+            page = papers[start:start + batch_size]
+            params = {"search_query": f"cat:{category}", "start": start, "max_results": batch_size,
+                      "sortBy": "submittedDate", "sortOrder": "descending"}
+            entries = "\n".join(ARXIV_ENTRY_TEMPLATE.format(**paper) for paper in page)
+            body = ARXIV_FEED_TEMPLATE.format(total=len(papers), entries=entries)
+            responses[api_key(params, "/api/query")] = body.encode("utf-8")
+    return responses
+
+ABSTRACT_SNIPPETS = [
+    "We study ${body}$ for every admissible {word}.",
+    "The estimate $$\\int_\\Omega |{body}|^2 \\, dx \\le C$$ holds uniformly.",
+    "Moreover \\({body}\\) is bounded whenever the {word} is compact.",
+    "In particular \\[{body} = 0\\] characterises the {word}.",
+    "The {word} costs \\$5 per unit and \\$20 in total, independent of ${body}$.",
+    "Numerical experiments confirm the {word} rate.",
+]
+ABSTRACT_WORDS = ["operator", "domain", "manifold", "spectrum", "kernel", "boundary", "measure"]
+
+def make_abstracts(count, seed=0):
+    """生成混合 $…$、$$…$$、\\(…\\)、\\[…\\] 和转义 \\$ 的合成摘要"""
+    rng = random.Random(seed)
+    bodies = fixture_formulas(50, seed)
+    abstracts = []
+    for _ in range(count):
+        parts = [rng.choice(ABSTRACT_SNIPPETS).format(body=rng.choice(bodies), word=rng.choice(ABSTRACT_WORDS))
+                 for _ in range(rng.randint(3, 8))]
+        abstracts.append(" ".join(parts))
+    return abstracts
+
+def raw_record(bodies, idx):
+    return json.dumps({"chinese": f"公式{idx}的数学表达式", "latex": f"{bodies[idx % len(bodies)]} + y_{{{idx}}}",
+                       "source": f"https://zh.wikipedia.org/wiki/公式{idx}"}, ensure_ascii=False) + "\n"
+
+def make_raw_data(path, lines, unique=200000, seed=0):
+    """生成爬虫格式的合成原始数据：每个公式出现4次（四种描述变体），约万分之一为坏行"""
+    rng = random.Random(seed)
+    bodies = fixture_formulas(50, seed)
+    with open(path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+        for i in range(lines):
+            if rng.random() < 0.0001:
+                f.write('{"chinese": "截断的记录", "latex": \n' if rng.random() < 0.5 else '{"chinese": "缺少公式"}\n')
+                continue
+            f.write(raw_record(bodies, (i // 4) % unique))
+
+class FixtureServer:
+    """在本地端口上提供夹具页面的HTTP服务器，latency 模拟网络往返延迟
+
+    site 的键为页面路径；API回放响应的键由 api_key 生成。
+    rate_limit 为每秒允许的请求数，超出时返回 429 和 Retry-After（模拟服务器限流）。
+    """
+    def __init__(self, site, latency=0.0, rate_limit=None, burst=5):
+        self.site = site
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.tokens = burst
+        self.refilled = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持长连接
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if not server.admit():
+                    server.throttled += 1
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = server.lookup(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                server.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def lookup(self, path):
+        parts = urlsplit(path)
+        if parts.query:
+            return self.site.get((parts.path,) + tuple(sorted(parse_qsl(parts.query))))
+        return self.site.get(unquote(parts.path))
+
+    def admit(self):
+        """服务器端令牌桶：未设置 rate_limit 时总是放行"""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate_limit)
+            self.refilled = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def reset_counters(self):
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class MockChatServer:
+    """模拟 OpenAI 兼容 chat/completions 接口的本地服务器
+
+    延迟为 latency × 对数正态随机数（长尾）；error_rate 的请求返回 500，
+    throttle_rate 的请求返回 429（不带 Retry-After，由客户端退避）。
+    """
+    def __init__(self, latency=0.05, error_rate=0.0, throttle_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server._lock:
+                    server.requests += 1
+                    delay = server.latency * server.rng.lognormvariate(0, 0.5)
+                    roll = server.rng.random()
+                time.sleep(delay)
+                status = 200
+                if roll < server.error_rate:
+                    status = 500
+                elif roll < server.error_rate + server.throttle_rate:
+                    status = 429
+                if status != 200:
+                    server.failures += 1
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                latex = body["messages"][-1]["content"]
+                content = json.dumps({"CHINESE": f"公式 {latex} 的读法", "Meaning": "模拟标注"},
+                                     ensure_ascii=False)
+                payload = json.dumps({
+                    "id": f"chatcmpl-{server.requests}", "object": "chat.completion", "model": body["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                }, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+# === 基准测试 ===
+def quiet(*names):
+    """压低被测模块的日志级别，避免逐页日志干扰计时"""
+    for name in names:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def bench_fetch(args):
+    """对比顺序抓取循环与异步抓取引擎的吞吐量"""
+    from crawler import crawl_math_wiki, crawl_math_wiki_async
+    quiet("crawler")
+
+    site = make_fixture_site(args.pages, args.formulas)
+    with FixtureServer(site, latency=args.latency) as server:
+        random.seed(0)
+        seq_data, seq_time = timed(crawl_math_wiki, max_pages=args.pages,
+                                   base_url=server.base_url, delay=(0, 0))
+        random.seed(0)
+        async_data, async_time = timed(crawl_math_wiki_async, max_pages=args.pages,
+                                       base_url=server.base_url,
+                                       concurrency=args.concurrency,
+                                       per_host_limit=args.per_host)
+
+    print(f"页面数: {args.pages} | 模拟延迟: {args.latency*1000:.0f}ms")
+    print(f"顺序抓取(不含礼貌延迟): {seq_time:.2f}s  {args.pages/seq_time:.1f} 页/秒")
+    print(f"顺序抓取(含0-2s礼貌延迟, 估算): {seq_time + args.pages:.2f}s  "
+          f"{args.pages/(seq_time + args.pages):.2f} 页/秒")
+    print(f"异步抓取(并发 {args.concurrency}, 单主机 {args.per_host}): "
+          f"{async_time:.2f}s  {args.pages/async_time:.1f} 页/秒")
+    print(f"加速比: {seq_time/async_time:.1f}x | 输出一致: {seq_data == async_data}")
+
+def bench_rate(args):
+    """服务器限流下三种等待策略：不等待、固定随机等待、自适应限速"""
+    from crawler import build_session, crawl_math_wiki
+    from rate_control import RateController
+    # “不等待”策略会产生大量 429 失败日志，这里只看汇总
+    logging.getLogger("crawler").setLevel(logging.CRITICAL)
+
+    site = make_fixture_site(args.pages, args.formulas)
+    print(f"页面数: {args.pages} | 服务器限流: {args.server_rate:g} 次/秒（突发 5） | "
+          f"模拟延迟: {args.latency*1000:.0f}ms")
+    strategies = [
+        ("不等待", None, None),
+        (f"固定随机等待 0-{args.fixed_delay:g}s", (0, args.fixed_delay), None),
+        ("自适应限速", None, RateController(rate=args.rate, max_rate=args.max_rate)),
+    ]
+    for label, delay, controller in strategies:
+        with FixtureServer(site, latency=args.latency, rate_limit=args.server_rate) as server:
+            random.seed(0)
+            data, elapsed = timed(crawl_math_wiki, max_pages=args.pages, base_url=server.base_url,
+                                  delay=delay, session=build_session(controller=controller))
+        pages = len({record.source for record in data})
+        line = (f"{label}: {elapsed:.2f}s  成功 {pages}/{args.pages} 页  "
+                f"{pages/elapsed:.1f} 页/秒  收到429 {server.throttled} 次")
+        if controller:
+            m = next(iter(controller.metrics().values()))
+            line += f"  最终速率 {m['rate']:.1f} 次/秒  降速 {m['decreases']} 次"
+        print(line)
+
+def bench_api(args):
+    """对比逐页HTML抓取与MediaWiki API批量获取的请求数、流量和耗时"""
+    from crawler import crawl_math_wiki
+    from wiki_api import crawl_math_wiki_api
+    quiet("crawler")
+
+    site = make_fixture_site(args.pages, args.formulas)
+    site.update(record_api_responses(args.pages, args.formulas))
+    with FixtureServer(site, latency=args.latency) as server:
+        html_data, html_time = timed(crawl_math_wiki, max_pages=args.pages,
+                                     base_url=server.base_url, delay=(0, 0))
+        html_stats = (server.requests, server.bytes_sent)
+        server.reset_counters()
+        api_data, api_time = timed(crawl_math_wiki_api, server.base_url, max_pages=args.pages)
+        api_stats = (server.requests, server.bytes_sent)
+
+    print(f"页面数: {args.pages} | 每页公式: {args.formulas} | 模拟延迟: {args.latency*1000:.0f}ms")
+    print(f"HTML逐页: {html_stats[0]} 次请求  {html_stats[1]/1024:.1f} KB  {html_time:.2f}s  {len(html_data)} 条记录")
+    print(f"API批量 : {api_stats[0]} 次请求  {api_stats[1]/1024:.1f} KB  {api_time:.2f}s  {len(api_data)} 条记录")
+    print(f"请求数减少 {html_stats[0]/max(api_stats[0], 1):.1f}x | 流量减少 {html_stats[1]/max(api_stats[1], 1):.1f}x")
+
+def load_fixture_pages(pages_dir, pages, formulas):
+    """读取保存的维基百科页面（*.html）；未指定目录时使用生成的夹具页面"""
+    if pages_dir:
+        return [path.read_text(encoding="utf-8") for path in sorted(Path(pages_dir).glob("*.html"))]
+    return [make_wiki_page(f"公式{i}", formulas, seed=i) for i in range(pages)]
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows 没有 resource 模块
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _run_extractor(name, pages, repeat):
+    """在独立进程中运行单个后端，避免峰值内存互相干扰"""
+    from extractors import get_extractor
+    extract = get_extractor(name)
+    results = [extract(html) for html in pages]
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            extract(html)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, peak_rss_mb(), results
+
+def bench_extract(args):
+    """各页面解析后端的吞吐量（页/秒）与峰值内存，并校验结果一致"""
+    from extractors import EXTRACTORS
+
+    pages = load_fixture_pages(args.pages_dir, args.pages, args.formulas)
+    total = len(pages) * args.repeat
+    print(f"页面数: {len(pages)} x {args.repeat} 轮 | 平均页面大小: "
+          f"{sum(len(p.encode('utf-8')) for p in pages) / len(pages) / 1024:.1f} KB")
+
+    ctx = multiprocessing.get_context("spawn")
+    baseline = None
+    for name in EXTRACTORS:
+        with ctx.Pool(1) as pool:
+            elapsed, peak, rss, results = pool.apply(_run_extractor, (name, pages, args.repeat))
+        if baseline is None:
+            baseline = results
+        print(f"{name:>9}: {total/elapsed:8.1f} 页/秒 | Python堆峰值 {peak/1024**2:6.2f} MB | "
+              f"进程RSS峰值 {rss:7.1f} MB | 结果一致: {results == baseline}")
+
+def bench_pipeline(args):
+    """顺序抓取+解析 vs 抓取线程/解析进程池流水线"""
+    from crawler import crawl_math_wiki, crawl_math_wiki_pipeline
+    from extractors import get_extractor
+    from record_sink import JsonlSink
+    from records import dumps
+    quiet("crawler")
+
+    site = make_fixture_site(args.pages, args.formulas)
+    with FixtureServer(site, latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        seq_data, seq_time = timed(crawl_math_wiki, max_pages=args.pages, base_url=server.base_url,
+                                   delay=(0, 0), extractor=get_extractor(args.extractor))
+        output = Path(tmp) / "raw_data.jsonl"
+        with JsonlSink(output) as sink:
+            _, pipe_time = timed(crawl_math_wiki_pipeline, sink, max_pages=args.pages,
+                                 base_url=server.base_url, fetch_workers=args.fetch_workers,
+                                 parse_workers=args.parse_workers, queue_depth=args.queue_depth,
+                                 extractor=args.extractor)
+        with open(output, encoding="utf-8") as f:
+            pipe_data = [json.loads(line) for line in f]
+
+    same = sorted(map(dumps, seq_data)) == sorted(map(dumps, pipe_data))
+    print(f"页面数: {args.pages} | 解析后端: {args.extractor} | 模拟延迟: {args.latency*1000:.0f}ms")
+    print(f"顺序抓取+解析: {seq_time:.2f}s  {args.pages/seq_time:.1f} 页/秒")
+    print(f"流水线(抓取 {args.fetch_workers} 线程, 解析 {args.parse_workers or multiprocessing.cpu_count()} 进程, "
+          f"队列 {args.queue_depth}): {pipe_time:.2f}s  {args.pages/pipe_time:.1f} 页/秒")
+    print(f"加速比: {seq_time/pipe_time:.1f}x | 记录集合一致: {same}")
+
+def bench_arxiv(args):
+    """多分类增量采集：首次全量、重复运行、出现新论文后各自的请求数"""
+    from arxiv_harvest import ArxivHarvester
+    quiet("crawler")
+
+    categories = [f"math.C{i}" for i in range(args.categories)]
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = Path(tmp) / "arxiv_state.json"
+        papers = {c: make_arxiv_papers(c, args.papers) for c in categories}
+        rounds = [("首次采集", papers), ("重复运行", papers),
+                  (f"每分类新增 {args.new}", {c: make_arxiv_papers(c, args.new, offset=args.papers) + p
+                                            for c, p in papers.items()})]
+        for label, feeds in rounds:
+            with FixtureServer(record_arxiv_feeds(feeds, args.batch), latency=args.latency) as server:
+                harvester = ArxivHarvester(state_path, categories=categories, batch_size=args.batch,
+                                           delay=args.delay, max_workers=args.workers,
+                                           api_url=server.base_url + "/api/query")
+                data, elapsed = timed(harvester.harvest)
+            print(f"{label}: {server.requests} 次请求  {harvester.stats['papers']} 篇新论文  "
+                  f"{len(data)} 条记录  {elapsed:.2f}s")
+
+def bench_scan(args):
+    """arXiv摘要公式提取：原始非贪婪正则 vs 单遍定界符扫描器"""
+    import re
+    from latex_scan import scan_batch
+
+    if args.abstracts:
+        with open(args.abstracts, 'r', encoding='utf-8') as f:
+            abstracts = [line.strip() for line in f if line.strip()]
+    else:
+        abstracts = make_abstracts(args.count)
+
+    legacy_pattern = r'\$(.*?)\$'
+    # 不含反斜杠、却有两个以上英文单词的“公式”基本是两个美元符号之间的普通文本
+    junk = re.compile(r'^[^\\]*[A-Za-z]{2,}\s+[A-Za-z]{2,}')
+
+    def run_legacy():
+        return [re.findall(legacy_pattern, abstract) for abstract in abstracts]
+
+    for label, func in (("原始正则", run_legacy), ("单遍扫描", lambda: scan_batch(abstracts))):
+        best = None
+        for _ in range(args.repeat):
+            results, elapsed = timed(func)
+            best = elapsed if best is None else min(best, elapsed)
+        spans = [formula for formulas in results for formula in formulas]
+        kept = [formula for formula in spans if len(formula) > 10]
+        print(f"{label}: {len(abstracts)/best:,.0f} 篇/秒  公式 {len(spans)} 个  "
+              f"长度>10 {len(kept)} 个  疑似误提取 {sum(1 for f in kept if junk.match(f))} 个")
+
+# 只改变写法、不改变公式的变换，用于生成“格式变体”
+FORMAT_VARIANTS = [
+    lambda f: f,
+    lambda f: "\\displaystyle " + f,
+    lambda f: "{\\displaystyle " + f + "}",
+    lambda f: f.replace(" = ", "=").replace(" + ", "+"),
+    lambda f: f.replace(" ", "  ") + " ",
+    lambda f: f + ".",
+    lambda f: f.replace("\\frac", "\\dfrac").replace("\\to ", "\\rightarrow "),
+    lambda f: f.replace("^2", "^{2}").replace("_0", "_{0}"),
+]
+
+def bench_normalize(args):
+    """公式规范化：回归用例、吞吐量，以及格式变体在原始键/规范键下的唯一数"""
+    from latex_norm import DISTINCT_PAIRS, EQUIVALENT_PAIRS, canonical_latex, self_check
+
+    failures = self_check()
+    print(f"回归用例: {len(EQUIVALENT_PAIRS)} 对等价 + {len(DISTINCT_PAIRS)} 对不等价，失败 {len(failures)} 项")
+    for failure in failures:
+        print("  " + failure)
+
+    if args.raw_file:
+        with open(args.raw_file, 'r', encoding='utf-8') as f:
+            formulas = [json.loads(line).get("latex") or "" for line in f if line.strip()]
+    else:
+        rng = random.Random(0)
+        bases = fixture_formulas(args.unique)
+        formulas = [rng.choice(FORMAT_VARIANTS)(rng.choice(bases)) for _ in range(args.count)]
+
+    best = None
+    for _ in range(args.repeat):
+        keys, elapsed = timed(lambda: [canonical_latex(f) for f in formulas])
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"规范化: {len(formulas)/best:,.0f} 条/秒（{len(formulas)/best*60/1e6:.1f} 百万条/分钟），"
+          f"平均长度 {sum(map(len, formulas))/max(len(formulas), 1):.0f} 字符")
+    print(f"唯一公式: 原始字符串 {len(set(formulas))}  规范形式 {len(set(keys))}")
+
+FORMULA_COMMANDS = ["\\sum", "\\int", "\\frac", "\\sqrt", "\\partial", "\\nabla", "\\log", "\\sin", "\\cos",
+                    "\\exp", "\\lim", "\\mathbf", "\\mathbb", "\\hat", "\\bar", "\\det", "\\max", "\\min",
+                    "\\sup", "\\inf", "\\prod", "\\oint", "\\binom", "\\vec", "\\tilde", "\\Re", "\\Im"]
+FORMULA_OPERATORS = ["+", "-", "=", "<", ">", "\\cdot", "\\times", "\\leq", "\\geq", "\\in", "\\subset",
+                     "\\approx", "\\equiv", "\\otimes", "\\cup", "\\cap", "\\mapsto", "\\sim"]
+VARIABLES = list("abcdefghxyzuvwnmk") + ["\\alpha", "\\beta", "\\gamma", "\\theta", "\\lambda", "\\Omega"]
+
+def random_formula_pieces(rng):
+    pieces = []
+    for _ in range(rng.randint(3, 8)):
+        piece = rng.choice(VARIABLES)
+        if rng.random() < 0.5:
+            piece = f"{rng.choice(FORMULA_COMMANDS)}{{{piece}}}"
+        if rng.random() < 0.4:
+            piece += f"_{{{rng.choice(VARIABLES)}{rng.randint(0, 9)}}}"
+        if rng.random() < 0.3:
+            piece += f"^{{{rng.randint(2, 99)}}}"
+        pieces += [piece, rng.choice(FORMULA_OPERATORS)]
+    return pieces[:-1]
+
+def make_near_dup_rows(count, variant_ratio=0.3, seed=0):
+    """合成数据集：随机公式，其中一部分带一个只差变量名或下标的变体，返回 [(公式, 基础公式编号)]"""
+    rng = random.Random(seed)
+    rows = []
+    base_id = 0
+    while len(rows) < count:
+        pieces = random_formula_pieces(rng)
+        rows.append((" ".join(pieces), base_id))
+        if rng.random() < variant_ratio:
+            # 把一个变量换成另一个，或给它加/换下标
+            variant = list(pieces)
+            i = rng.randrange(0, len(variant), 2)
+            variant[i] = variant[i].replace(rng.choice([v for v in VARIABLES if v in variant[i]] or ["+"]),
+                                            rng.choice(VARIABLES), 1) if rng.random() < 0.5 else variant[i] + "_{j}"
+            rows.append((" ".join(variant), base_id))
+        base_id += 1
+    return rows[:count]
+
+def bench_near_dup(args):
+    """近似去重：签名与聚类用时，以及植入变体的召回率和簇的纯度"""
+    import numpy as np
+    from near_dup import cluster_signatures, minhash_signatures, near_duplicate_stage
+    quiet("data_wash")
+
+    # 只差一个希腊字母的短公式（shingle Jaccard 0.67），默认参数下换任何随机种子都应在同一簇
+    pair = [r"\lambda_k(\Omega)", r"\lambda_k(\Theta)"]
+    together = sum(int(cluster_signatures(minhash_signatures(pair, seed=seed), texts=pair)[1] == 0)
+                   for seed in range(1, 51))
+    print(f"{pair[0]} 与 {pair[1]}: 默认参数下 50 个随机种子中 {together} 个聚为一簇")
+
+    rows = make_near_dup_rows(args.rows, args.variants)
+    with tempfile.TemporaryDirectory() as tmp:
+        splits = Path(tmp) / "splits.jsonl"
+        with open(splits, 'w', encoding='utf-8') as f:
+            for line, (latex, _) in enumerate(rows, 1):
+                f.write(json.dumps({"LaTeX": latex, "source_line": line}, ensure_ascii=False) + '\n')
+        clusters_file = Path(tmp) / "near_duplicates.jsonl"
+        stats, elapsed = timed(near_duplicate_stage, splits, clusters_file, threshold=args.threshold,
+                               num_perm=args.num_perm, shingle=args.shingle)
+
+        cluster = np.arange(1, len(rows) + 1)
+        with open(clusters_file, encoding='utf-8') as f:
+            for line in f:
+                item = json.loads(line)
+                cluster[item["source_line"] - 1] = item["cluster"]
+
+    base = np.array([b for _, b in rows])
+    # 召回：植入的变体对落在同一簇；纯度：同一簇内成员来自同一基础公式的比例
+    first = {}
+    together = planted = 0
+    for row, b in enumerate(base):
+        if b in first:
+            planted += 1
+            together += cluster[row] == cluster[first[b]]
+        else:
+            first[b] = row
+    members = cluster != np.arange(1, len(rows) + 1)
+    pure = sum(1 for row in np.flatnonzero(members) if base[row] == base[cluster[row] - 1])
+    print(f"{len(rows):,} 条公式: {elapsed:.1f}s  {len(rows)/elapsed:,.0f} 条/秒  "
+          f"签名矩阵 {len(rows) * args.num_perm * 4 / 1024**2:.0f} MB")
+    print(f"簇 {stats['clusters']} 个, 成员 {stats['members']} 条, 可少标注 {stats['removable']} 条")
+    print(f"植入变体 {planted} 对, 召回 {together/max(planted, 1):.1%}, "
+          f"非代表成员与代表同源 {pure/max(members.sum(), 1):.1%}")
+
+def _run_wash(mode, raw_file, out_dir, workers=None, compress=False):
+    """在独立进程中运行一次清洗，返回 (用时, 峰值RSS, 唯一数, 重复数, 错误数)
+
+    compress 时重复记录写为块压缩的 duplicates.jsonl.gz。
+    """
+    import datawash
+    # 合成数据中的坏行会逐条打印错误日志，这里只看汇总
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+    out_dir = Path(out_dir)
+    outputs = {"output_file": out_dir / "splits.jsonl",
+               "duplicate_file": out_dir / ("duplicates.jsonl.gz" if compress else "duplicates.jsonl"),
+               "error_file": out_dir / "errors.jsonl"}
+    start = time.perf_counter()
+    if mode == "legacy":
+        datawash.RAW_DATA_FILE = Path(raw_file)
+        datawash.DATASPLITS_FILE = outputs["output_file"]
+        datawash.DUPLICATE_LOG_FILE = outputs["duplicate_file"]
+        datawash.ERROR_LOG_FILE = outputs["error_file"]
+        unique, _, errors, duplicates = datawash.process_raw_data()
+        counts = (unique, len(duplicates), len(errors))
+    else:
+        if mode == "parallel":
+            stats = datawash.process_raw_data_parallel(raw_file, workers=workers, **outputs)
+        else:
+            stats = datawash.process_raw_data_stream(raw_file, **outputs)
+        counts = (stats["unique"], stats["duplicates"], stats["errors"])
+    return (time.perf_counter() - start, peak_rss_mb()) + counts
+
+def bench_wash(args):
+    """datawash：原始实现 vs 流式模式的吞吐量与峰值内存（各在独立进程中运行）"""
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [("原始实现", "legacy", args.legacy_lines), ("流式模式", "stream", args.legacy_lines),
+                ("流式模式", "stream", args.lines)]
+        for i, (label, mode, lines) in enumerate(runs):
+            if lines <= 0 or (i == 2 and lines == args.legacy_lines):
+                continue
+            raw_file = Path(tmp) / f"raw_{lines}.jsonl"
+            if not raw_file.exists():
+                make_raw_data(raw_file, lines, unique=args.unique)
+            out_dir = Path(tmp) / f"run{i}"
+            out_dir.mkdir()
+            with ctx.Pool(1) as pool:
+                elapsed, rss, unique, dups, errors = pool.apply(_run_wash, (mode, str(raw_file), str(out_dir)))
+            print(f"{label} {lines:,} 行 ({raw_file.stat().st_size/1024**2:.0f} MB): {elapsed:.1f}s  "
+                  f"{lines/elapsed:,.0f} 行/秒  峰值RSS {rss:.0f} MB  "
+                  f"唯一 {unique}  重复 {dups}  错误 {errors}")
+
+def make_legacy_raw(path, formulas, per_page=10, arxiv_ratio=0.05, repeat_ratio=0.2, seed=0):
+    """按爬虫旧格式生成原始数据：维基百科公式每条四种描述各一行，arXiv 公式一行；
+    repeat_ratio 的公式是之前出现过的（不同页面引用同一公式）"""
+    from raw_format import WIKI_VARIANTS, arxiv_record, compact_record, expand_record
+    from records import dumps_line
+    rng = random.Random(seed)
+    bodies = fixture_formulas(50)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(formulas):
+            n = rng.randrange(max(i, 1)) if rng.random() < repeat_ratio else i
+            latex = f"{bodies[n % len(bodies)]} + y_{{{n}}}"
+            page = i // per_page
+            if rng.random() < arxiv_ratio:
+                record = arxiv_record(f"On the Regularity of Solutions to Problem {page}", latex)
+            else:
+                record = compact_record(f"数学条目{page}", latex, f"https://zh.wikipedia.org/wiki/数学条目{page}",
+                                        WIKI_VARIANTS)
+            for item in expand_record(record):
+                f.write(dumps_line(item))
+
+def bench_raw_format(args):
+    """原始数据：旧格式（四种描述各一行）vs 紧凑格式（每条公式一行）的体积与清洗用时"""
+    from raw_format import convert_file, expand_file
+    logging.getLogger("crawler").setLevel(logging.CRITICAL)
+    ctx = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        legacy, compact, expanded = tmp / "raw_legacy.jsonl", tmp / "raw_compact.jsonl", tmp / "raw_expanded.jsonl"
+        make_legacy_raw(legacy, args.formulas)
+        (lines, compact_lines), elapsed = timed(convert_file, legacy, compact)
+        legacy_mb, compact_mb = legacy.stat().st_size / 1024**2, compact.stat().st_size / 1024**2
+        print(f"{args.formulas:,} 条公式: 旧格式 {lines:,} 行 {legacy_mb:.0f} MB → 紧凑格式 {compact_lines:,} 行 "
+              f"{compact_mb:.0f} MB（{compact_mb / legacy_mb:.0%}），转换 {elapsed:.1f}s")
+        _, elapsed = timed(expand_file, compact, expanded)
+        print(f"展开回旧格式 {elapsed:.1f}s，与原文件逐字节相同: {_same_output(legacy, expanded)}")
+
+        outputs = {}
+        for label, raw_file in (("旧格式", legacy), ("紧凑格式", compact)):
+            out_dir = tmp / f"wash_{raw_file.stem}"
+            out_dir.mkdir()
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                elapsed, rss, unique, dups, errors = pool.submit(_run_wash, "stream", str(raw_file), str(out_dir)).result()
+            outputs[label] = out_dir / "splits.jsonl"
+            print(f"清洗{label}: {elapsed:.1f}s  峰值RSS {rss:.0f} MB  唯一 {unique:,}  重复 {dups:,}  错误 {errors}")
+
+        def formulas(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return [json.loads(line)["LaTeX"] for line in f]
+        print(f"两种格式清洗出的公式（顺序与 custom_id）一致: {formulas(outputs['旧格式']) == formulas(outputs['紧凑格式'])}")
+
+        # 真实原始数据：arXiv 描述（含早期爬虫留下占位标记的）都应按“论文《…》中的公式”解析出标题
+        if args.real_raw and Path(args.real_raw).exists():
+            real = tmp / "raw_real_compact.jsonl"
+            (lines, compact_lines), _ = timed(convert_file, args.real_raw, real)
+            with open(real, "r", encoding="utf-8") as f:
+                arxiv = [r for r in map(json.loads, f) if r.get("source") == "arXiv"]
+            bad = [r for r in arxiv if r.get("variants") != [4] or r["title"].startswith("论文《")
+                   or "@replace" in r["title"]]
+            print(f"{args.real_raw}: {lines:,} 行 → {compact_lines:,} 行，arXiv 记录 {len(arxiv):,} 条，"
+                  f"标题解析错误 {len(bad)} 条")
+            assert not bad, bad[:3]
+
+def bench_columnar(args):
+    """列式内存映射格式 vs JSONL：导出、单列扫描、按行随机访问"""
+    import datawash
+    from columnar import ColumnarDataset, export_jsonl
+    from label_store import formula_id
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        splits = tmp / "splits.jsonl"
+        rng = random.Random(0)
+        bodies = fixture_formulas(50)
+        with open(splits, "w", encoding="utf-8") as f:
+            for i in range(args.rows):
+                entry = datawash.build_entry(f"{bodies[i % len(bodies)]} + y_{{{i}}}", i, formula_id(rng.getrandbits(128)))
+                if i % 2:
+                    entry["CHINESE"], entry["Meaning"] = f"第{i}条公式的中文读法", "模拟标注"
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        path = tmp / "splits.cols"
+        _, elapsed = timed(export_jsonl, splits, path)
+        size = sum(p.stat().st_size for p in path.iterdir())
+        print(f"{args.rows:,} 行: JSONL {splits.stat().st_size / 1024**2:.0f} MB → 列式 {size / 1024**2:.0f} MB，"
+              f"导出 {elapsed:.1f}s")
+
+        def jsonl_column(name):
+            with open(splits, "r", encoding="utf-8") as f:
+                return [json.loads(line)[name] for line in f]
+
+        with ColumnarDataset(path) as ds:
+            latex, t_json = timed(jsonl_column, "LaTeX")
+            col_latex, t_col = timed(list, ds["LaTeX"])
+            lengths, t_vec = timed(lambda: int(ds["LaTeX"].byte_lengths().sum()))
+            print(f"扫描 LaTeX 列: JSONL {t_json:.2f}s，列式逐行解码 {t_col:.2f}s ({t_json / t_col:.0f}x)，"
+                  f"列式只取长度 {t_vec * 1000:.1f}ms；结果一致: {latex == col_latex}")
+            labelled, t_json = timed(lambda: sum(v is not None for v in jsonl_column("CHINESE")))
+            col_labelled, t_col = timed(lambda: int(ds["CHINESE"].valid.sum()))
+            print(f"统计已标注行数: JSONL {t_json:.2f}s，列式 {t_col * 1000:.1f}ms；{labelled:,} = {col_labelled:,}")
+
+            # JSONL 随机访问需要先有行偏移（否则每次都要从头扫描）
+            def line_offsets():
+                offsets, pos = array('Q'), 0
+                with open(splits, "rb") as f:
+                    for line in f:
+                        offsets.append(pos)
+                        pos += len(line)
+                return offsets
+            offsets, t_index = timed(line_offsets)
+            picks = [rng.randrange(args.rows) for _ in range(args.lookups)]
+            columns = ["custom_id", "LaTeX", "CHINESE", "source_line"]
+
+            def jsonl_rows():
+                out = []
+                with open(splits, "rb") as f:
+                    for i in picks:
+                        f.seek(offsets[i])
+                        record = json.loads(f.readline())
+                        out.append({name: record[name] for name in columns})
+                return out
+            expected, t_json = timed(jsonl_rows)
+            got, t_col = timed(lambda: [ds.row(i, columns) for i in picks])
+            batch, t_batch = timed(ds.rows, picks, columns)
+            print(f"随机访问 {args.lookups:,} 行（4 列）: JSONL+行偏移 {t_json:.2f}s（另需建偏移 {t_index:.1f}s），"
+                  f"列式逐行 {t_col:.2f}s，列式批量 {t_batch:.3f}s ({t_json / t_batch:.0f}x)；"
+                  f"结果一致: {expected == got == batch}")
+
+def bench_records(args):
+    """逐条编解码开销：标准库 json vs 可用的编解码器 vs 带校验的记录类型，以及整个清洗流程的用时"""
+    from raw_format import WIKI_VARIANTS, compact_record
+    from records import CODEC_ENV, CODECS, RawRecord, SplitRecord, get_codec
+    ctx = multiprocessing.get_context("spawn")
+
+    bodies = fixture_formulas(50)
+    rng = random.Random(0)
+    raw = [compact_record(f"数学条目{i // 10}", f"{bodies[i % len(bodies)]} + y_{{{i}}}",
+                          f"https://zh.wikipedia.org/wiki/数学条目{i // 10}", WIKI_VARIANTS)
+           for i in range(args.records)]
+    splits = [SplitRecord(f"latex_{rng.getrandbits(128):032x}", r.latex, source_line=i + 1) for i, r in enumerate(raw)]
+    raw_dicts = [r.to_dict() for r in raw]
+    split_dicts = [r.to_dict() for r in splits]
+    # 输入行按现有文件的写法（标准库 json，默认分隔符）
+    raw_lines = [(json.dumps(d, ensure_ascii=False) + "\n").encode("utf-8") for d in raw_dicts]
+    split_lines = [(json.dumps(d, ensure_ascii=False) + "\n").encode("utf-8") for d in split_dicts]
+
+    def per_record(func, items):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        return (time.perf_counter() - start) / len(items) * 1e6
+
+    available = []
+    for name in CODECS:
+        try:
+            available.append(get_codec(name))
+        except ImportError:
+            print(f"编解码器 {name} 不可用，跳过")
+    rows = [("标准库 json（原写法）", lambda line: json.loads(line.decode("utf-8")), lambda d: json.dumps(d, ensure_ascii=False) + "\n",
+             lambda line: json.loads(line.decode("utf-8")), lambda d: json.dumps(d, ensure_ascii=False) + "\n", raw_dicts, split_dicts)]
+    for name, loads, dumps in available:
+        rows.append((f"records 编解码器 {name}", loads, lambda d, dumps=dumps: dumps(d) + "\n",
+                     loads, lambda d, dumps=dumps: dumps(d) + "\n", raw_dicts, split_dicts))
+    rows.append((f"记录类型（{get_codec()[0]}，含校验）", RawRecord.from_json, lambda r: r.to_json() + "\n",
+                 SplitRecord.from_json, lambda r: r.to_json() + "\n", raw, splits))
+
+    print(f"记录数 {args.records:,}（原始记录约 {sum(map(len, raw_lines)) / len(raw_lines):.0f} 字节/行，"
+          f"数据集记录约 {sum(map(len, split_lines)) / len(split_lines):.0f} 字节/行），单位: 微秒/条")
+    for label, raw_decode, raw_encode, split_decode, split_encode, raw_items, split_items in rows:
+        print(f"{label:<28} 原始记录 解码 {per_record(raw_decode, raw_lines):5.2f}  编码 {per_record(raw_encode, raw_items):5.2f}"
+              f" | 数据集记录 解码 {per_record(split_decode, split_lines):5.2f}  编码 {per_record(split_encode, split_items):5.2f}")
+
+    def resident(decode, lines):
+        tracemalloc.start()
+        kept = [decode(line) for line in lines]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return size / len(lines)
+    print(f"常驻内存（每条，含字符串）: 原始记录 字典 {resident(lambda l: json.loads(l), raw_lines):.0f} B / "
+          f"RawRecord {resident(RawRecord.from_json, raw_lines):.0f} B | "
+          f"数据集记录 字典 {resident(lambda l: json.loads(l), split_lines):.0f} B / "
+          f"SplitRecord {resident(SplitRecord.from_json, split_lines):.0f} B")
+
+    if args.lines <= 0:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_file = Path(tmp) / "raw.jsonl"
+        make_raw_data(raw_file, args.lines, unique=args.unique)
+        previous = os.environ.get(CODEC_ENV)
+        outputs = []
+        for name, _, _ in available:
+            out_dir = Path(tmp) / name
+            out_dir.mkdir()
+            # 编解码器在 records 导入时选定，子进程由环境变量指定
+            os.environ[CODEC_ENV] = name
+            try:
+                with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                    elapsed, rss, unique, dups, errors = pool.submit(_run_wash, "stream", str(raw_file), str(out_dir)).result()
+            finally:
+                if previous is None:
+                    os.environ.pop(CODEC_ENV, None)
+                else:
+                    os.environ[CODEC_ENV] = previous
+            outputs.append(out_dir)
+            print(f"流式清洗 {args.lines:,} 行（编解码器 {name}）: {elapsed:.1f}s  {args.lines/elapsed:,.0f} 行/秒  "
+                  f"唯一 {unique}  重复 {dups}  错误 {errors}")
+        if len(outputs) > 1:
+            same = all(_same_output(out_dir / name, outputs[0] / name) for out_dir in outputs[1:]
+                       for name in ("splits.jsonl", "duplicates.jsonl", "errors.jsonl"))
+            print(f"各编解码器输出逐字节相同: {same}")
+
+def make_log_lines(path, lines, seed=0):
+    """生成爬虫日志风格的文本行"""
+    rng = random.Random(seed)
+    messages = ["成功获取页面: https://zh.wikipedia.org/wiki/数学条目{n}", "页面 数学条目{n} 提取到 {k} 条公式",
+                "请求失败，{k} 秒后重试: https://zh.wikipedia.org/wiki/数学条目{n}", "已跳过重复页面: 数学条目{n}"]
+    levels = ["INFO", "INFO", "WARNING", "INFO"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            kind = rng.randrange(len(messages))
+            f.write(f"2024-05-{1 + i * 30 // lines:02d} {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d},"
+                    f"{rng.randrange(1000):03d} - {levels[kind]} - "
+                    f"{messages[kind].format(n=rng.randrange(100000), k=rng.randrange(1, 30))}\n")
+
+def bench_compress(args):
+    """块压缩 JSONL：体积、读写吞吐量、并行解压、按行号随机访问，以及 datawash 直接读写压缩文件"""
+    import gzip
+    from block_jsonl import BlockIndex, compress_file, decompress_file, open_jsonl, read_lines
+    import datawash
+    from wash_index import WashIndex
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+    logging.getLogger("crawler").setLevel(logging.CRITICAL)
+    ctx = multiprocessing.get_context("spawn")
+
+    def read_all(path):
+        lines = 0
+        with open_jsonl(path, "rb") as f:
+            for _ in f:
+                lines += 1
+        return lines
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        datasets = {"原始数据": tmp / "raw.jsonl", "旧格式原始数据": tmp / "raw_legacy.jsonl",
+                    "重复记录": tmp / "duplicates.jsonl", "爬虫日志": tmp / "crawler.log"}
+        make_raw_data(datasets["原始数据"], args.lines, unique=args.unique)
+        make_legacy_raw(datasets["旧格式原始数据"], args.formulas)
+        make_log_lines(datasets["爬虫日志"], args.log_lines)
+        with open(datasets["重复记录"], "w", encoding="utf-8") as f:
+            with open(datasets["原始数据"], "r", encoding="utf-8") as raw:
+                for line_num, line in enumerate(raw, 1):
+                    if line_num % 4:
+                        latex = line.partition('"latex": "')[2].partition('", "source"')[0]
+                        f.write(f'{{"line":{line_num},"latex":"{latex}"}}\n')
+
+        print("== 体积与吞吐量（块压缩 vs 单个 gzip 流 vs 未压缩）==")
+        for label, path in datasets.items():
+            blocked = path.with_name(path.name + ".gz")
+            stream = path.with_name(path.name + ".stream.gz")
+            (raw_size, packed), write_time = timed(compress_file, path, blocked)
+            def gzip_stream():
+                with open(path, "rb") as f, gzip.open(stream, "wb", compresslevel=6) as out:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        out.write(chunk)
+            _, stream_time = timed(gzip_stream)
+            lines, plain_read = timed(read_all, path)
+            blocked_lines, blocked_read = timed(read_all, blocked)
+            mb = raw_size / 1024**2
+            print(f"{label} {mb:.0f} MB {lines:,} 行: 块压缩 {packed / raw_size:.1%}（单个 gzip 流 "
+                  f"{stream.stat().st_size / raw_size:.1%}）  写 {mb / write_time:.0f} MB/s（gzip 流 "
+                  f"{mb / stream_time:.0f} MB/s）  逐行读 {mb / blocked_read:.0f} MB/s（未压缩 "
+                  f"{mb / plain_read:.0f} MB/s）  行数一致: {lines == blocked_lines}")
+            with gzip.open(blocked, "rb") as f, open(path, "rb") as original:
+                same = all(a == b for a, b in zip(iter(lambda: f.read(1024 * 1024), b""),
+                                                  iter(lambda: original.read(1024 * 1024), b"")))
+            print(f"  gzip 模块直接解压块压缩文件与原文件一致: {same}")
+
+        print("== 并行解压 ==")
+        blocked = datasets["原始数据"].with_name("raw.jsonl.gz")
+        baseline = None
+        for workers in sorted({1, os.cpu_count() or 1, 4}):
+            target = tmp / f"inflated_{workers}.jsonl"
+            raw_size, elapsed = timed(decompress_file, blocked, target, workers)
+            baseline = baseline or elapsed
+            print(f"{workers} 进程: {elapsed:.2f}s  {raw_size / 1024**2 / elapsed:.0f} MB/s  加速 {baseline / elapsed:.2f}x  "
+                  f"与原文件一致: {_same_output(target, datasets['原始数据'])}")
+            target.unlink()
+
+        print("== 按行号随机访问 ==")
+        index = BlockIndex(blocked)
+        rng = random.Random(0)
+        targets = [rng.randrange(1, index.lines + 1) for _ in range(args.lookups)]
+        found, elapsed = timed(lambda: [read_lines(blocked, n)[0] for n in targets])
+        print(f"块压缩 read_lines: {args.lookups} 次 {elapsed / args.lookups * 1000:.2f} ms/次")
+        scans = targets[:max(1, args.lookups // 100)]
+        expected, scan_time = timed(lambda: [read_lines(datasets["原始数据"], n)[0] for n in scans])
+        print(f"未压缩文件顺序扫描到该行: {len(scans)} 次 {scan_time / len(scans) * 1000:.2f} ms/次  "
+              f"结果一致: {found[:len(scans)] == expected}")
+
+        print("== datawash 直接读写块压缩文件 ==")
+        runs = [("未压缩输入", "stream", datasets["原始数据"], None, False),
+                ("块压缩输入与重复记录", "stream", blocked, None, True),
+                ("块压缩输入，并行 2 进程", "parallel", blocked, 2, False)]
+        for i, (label, mode, raw_file, workers, compress) in enumerate(runs):
+            out_dir = tmp / f"wash{i}"
+            out_dir.mkdir()
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                elapsed, rss, unique, dups, errors = pool.submit(_run_wash, mode, str(raw_file), str(out_dir),
+                                                                 workers, compress).result()
+            same = ""
+            if i:
+                dup_file = out_dir / ("duplicates.jsonl.gz" if compress else "duplicates.jsonl")
+                with open_jsonl(dup_file, "rb") as f:
+                    dup_same = f.read() == (tmp / "wash0" / "duplicates.jsonl").read_bytes()
+                same = all(_same_output(out_dir / name, tmp / "wash0" / name) for name in ("splits.jsonl", "errors.jsonl"))
+                same = f"  与未压缩输入一致: {same and dup_same}"
+            print(f"{label}: {elapsed:.1f}s  峰值RSS {rss:.0f} MB  唯一 {unique}  重复 {dups}  错误 {errors}{same}")
+
+        # 增量模式：先写一半，处理后再追加另一半（块压缩写入器追加），结果应与一次全量处理相同
+        growing = tmp / "raw_growing.jsonl.gz"
+        outputs = {"output_file": tmp / "inc_splits.jsonl", "duplicate_file": tmp / "inc_dups.jsonl.gz",
+                   "error_file": tmp / "inc_errors.jsonl"}
+        with open(datasets["原始数据"], "rb") as f:
+            lines = f.readlines()
+        runs = []
+        for mode, part in (("w", lines[:len(lines) // 2]), ("a", lines[len(lines) // 2:])):
+            with open_jsonl(growing, mode) as out:
+                out.write(b"".join(part))
+            index = WashIndex(tmp / "wash_index.sqlite3")
+            stats, elapsed = timed(datawash.process_raw_data_stream, growing, index=index, **outputs)
+            index.close()
+            runs.append(f"{stats['lines']} 行 {elapsed:.1f}s")
+        with open_jsonl(outputs["duplicate_file"], "rb") as f:
+            dup_same = f.read() == (tmp / "wash0" / "duplicates.jsonl").read_bytes()
+        same = all(_same_output(outputs[key], tmp / "wash0" / name)
+                   for key, name in (("output_file", "splits.jsonl"), ("error_file", "errors.jsonl")))
+        print(f"增量模式（块压缩输入，分两次追加）: 前一半 {runs[0]}，追加后 {runs[1]}  "
+              f"输出与全量一致: {same and dup_same}")
+
+def bench_lines(args):
+    """行号索引：建立与增量更新用时、按行号随机读取 vs 从头扫描，以及追溯重复记录的吞吐量"""
+    import numpy as np
+    from block_jsonl import compress_file, read_lines
+    from line_index import LineIndex, audit, index_path
+    import datawash
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        raw_file = tmp / "raw.jsonl"
+        make_raw_data(raw_file, args.lines, unique=args.unique)
+        with open(raw_file, "rb") as f:
+            expected = f.readlines()
+        appended = expected[:args.append]
+        # 最后一行没有换行符：模拟爬虫写到一半
+        appended[-1] = appended[-1].rstrip(b"\n")
+        compressed = tmp / "raw.jsonl.gz"
+        compress_file(raw_file, compressed)
+        rng = random.Random(0)
+        targets = [rng.randrange(1, args.lines + 1) for _ in range(args.lookups)]
+
+        for label, path in (("未压缩", raw_file), ("块压缩", compressed)):
+            index, build = timed(LineIndex, path)
+            index.close()
+            index, reopen = timed(LineIndex, path)
+            found, elapsed = timed(lambda: [index.read(n) for n in targets])
+            ok = found == [expected[n - 1] for n in targets]
+            rows, range_time = timed(index.read_range, args.lines // 2, 1000)
+            print(f"{label} {args.lines:,} 行: 建立索引 {build:.2f}s（{index_path(path).stat().st_size / 1024**2:.1f} MB）  "
+                  f"再次打开 {reopen * 1000:.1f} ms  按行号读取 {elapsed / args.lookups * 1000:.3f} ms/次  "
+                  f"连续 1000 行 {range_time * 1000:.1f} ms  结果正确: {ok and rows == expected[args.lines // 2 - 1:][:1000]}")
+            index.close()
+
+        scans = targets[:max(1, args.lookups // 200)]
+        found, elapsed = timed(lambda: [read_lines(raw_file, n)[0] for n in scans])
+        print(f"对照：从头扫描到该行 {elapsed / len(scans) * 1000:.1f} ms/次")
+        found, elapsed = timed(lambda: [read_lines(compressed, n)[0] for n in targets])
+        print(f"对照：块压缩文件按块索引找行（block_jsonl.read_lines）{elapsed / args.lookups * 1000:.3f} ms/次")
+
+        # 追加新行后增量更新（只扫描新增部分），与重新建立的索引比较
+        with open(raw_file, "ab") as f:
+            f.write(b"".join(appended))
+        index = LineIndex(raw_file)
+        index.close()
+        index, elapsed = timed(LineIndex, raw_file)
+        refreshed = np.array(index.ends)
+        tail = index.read(len(index))
+        index.close()
+        os.replace(index_path(raw_file), tmp / "refreshed.lines")
+        with LineIndex(raw_file) as rebuilt:
+            same = np.array_equal(refreshed, np.array(rebuilt.ends))
+        print(f"追加 {args.append:,} 行后增量更新: 共 {len(refreshed):,} 个完整行，与重新建立一致: {same}  "
+              f"未写完的最后一行可读: {tail == appended[-1]}")
+
+        out_dir = tmp / "wash"
+        out_dir.mkdir()
+        datawash.process_raw_data_stream(raw_file, out_dir / "splits.jsonl", out_dir / "duplicates.jsonl",
+                                         out_dir / "errors.jsonl")
+        for name in ("duplicates.jsonl", "errors.jsonl"):
+            with open(os.devnull, "w", encoding="utf-8") as sink:
+                written, elapsed = timed(audit, raw_file, out_dir / name, sink)
+            print(f"追溯 {name}: {written:,} 条 {elapsed:.2f}s（{written / max(elapsed, 1e-9):,.0f} 条/秒）")
+
+def _same_output(path_a, path_b):
+    """两次运行的输出是否逐字节相同（custom_id 由公式决定，可以直接比较）"""
+    return filecmp.cmp(path_a, path_b, shallow=False)
+
+def bench_wash_parallel(args):
+    """并行清洗：1..N 个进程的扩展性，并校验输出与单进程流式模式一致"""
+    ctx = multiprocessing.get_context("spawn")
+    print(f"CPU 核数: {os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_file = Path(tmp) / "raw.jsonl"
+        make_raw_data(raw_file, args.lines, unique=args.unique)
+        runs = [("单进程流式", "stream", None)] + [(f"并行 {n} 进程", "parallel", n) for n in args.workers]
+        results = []
+        for i, (label, mode, workers) in enumerate(runs):
+            out_dir = Path(tmp) / f"run{i}"
+            out_dir.mkdir()
+            # Pool 的工作进程是守护进程，不能再创建进程池，这里改用 ProcessPoolExecutor
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                results.append(pool.submit(_run_wash, mode, str(raw_file), str(out_dir), workers).result())
+
+        # 全部运行结束后再比较输出，避免比较时的内存被后续子进程的峰值RSS继承
+        baseline = results[0][0]
+        for i, ((label, _, _), (elapsed, rss, unique, dups, errors)) in enumerate(zip(runs, results)):
+            same = ""
+            if i:
+                same = all(_same_output(Path(tmp) / f"run{i}" / name, Path(tmp) / "run0" / name)
+                           for name in ("splits.jsonl", "duplicates.jsonl", "errors.jsonl"))
+                same = f"  与单进程一致: {same}"
+            print(f"{label}: {elapsed:.1f}s  {args.lines/elapsed:,.0f} 行/秒  加速 {baseline/elapsed:.2f}x  "
+                  f"峰值RSS(主进程) {rss:.0f} MB  唯一 {unique}  重复 {dups}  错误 {errors}{same}")
+
+def bench_relabel(args):
+    """重跑清洗后需要付费标注的记录数：确定性 custom_id + 标注库 vs 每次随机 id"""
+    import datawash
+    from label_store import IdRegistry, LabelStore, read_jsonl
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        raw_file = tmp / "raw.jsonl"
+        make_raw_data(raw_file, args.lines, unique=args.unique)
+        store = LabelStore(tmp / "labels.sqlite3")
+
+        def wash(tag, registry=None):
+            outputs = {k: tmp / f"{tag}_{k}.jsonl" for k in ("output_file", "duplicate_file", "error_file")}
+            stats, elapsed = timed(datawash.process_raw_data_stream, raw_file, registry=registry, **outputs)
+            return outputs["output_file"], stats, elapsed
+
+        first, stats, plain_time = wash("first")
+        registry = IdRegistry(tmp / "labels.sqlite3")
+        _, _, registry_time = wash("first_registry", registry)
+        print(f"首次清洗 {args.lines:,} 行: {plain_time:.2f}s，带 id 登记表 {registry_time:.2f}s，"
+              f"唯一公式 {stats['unique']}，登记 {registry.count()} 个 id")
+
+        # 模拟首批全部标注完成并导入标注库
+        store.put_many((entry["custom_id"], f"标注{i}", "fixture") for i, entry in enumerate(read_jsonl(first)))
+
+        # 追加新数据后整体重跑：一半是已见过的公式，一半是新公式
+        bodies = fixture_formulas(50)
+        with open(raw_file, 'a', encoding='utf-8') as f:
+            for i in range(args.append):
+                f.write(raw_record(bodies, args.unique + i if i % 2 else i % args.unique))
+        second, stats, _ = wash("second", registry)
+        registry.close()
+        pending = sum(1 for _ in store.unlabelled(read_jsonl(second)))
+        first_ids = {entry["custom_id"] for entry in read_jsonl(first)}
+        kept = sum(1 for entry in read_jsonl(second) if entry["custom_id"] in first_ids)
+        print(f"追加 {args.append:,} 行后重跑: 唯一公式 {stats['unique']}，沿用首次的 id {kept} 个")
+        print(f"需要标注: 随机 id 时 {stats['unique']} 条，确定性 id + 标注库 {pending} 条 "
+              f"（节省 {1 - pending / max(stats['unique'], 1):.1%}）")
+        store.close()
+
+def bench_shard(args):
+    """批处理分片：吞吐量、行数/字节上限、拼接还原，以及追加数据后沿用的分片数"""
+    import datawash
+    from batch_shard import shard_splits, verify_shards
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        raw_file = tmp / "raw.jsonl"
+        splits = tmp / "splits.jsonl"
+        make_raw_data(raw_file, args.lines, unique=args.unique)
+        datawash.process_raw_data_stream(raw_file, splits, tmp / "dup.jsonl", tmp / "err.jsonl")
+        size = splits.stat().st_size
+        max_bytes = int(args.max_mb * 1024**2)
+
+        out_dir = tmp / "shards"
+        manifest, elapsed = timed(shard_splits, splits, out_dir, args.max_lines, max_bytes)
+        shards = manifest.shards
+        print(f"{manifest.data['records']:,} 条请求 ({size / 1024**2:.1f} MB) → {len(shards)} 个分片: "
+              f"{elapsed:.2f}s，{size / 1024**2 / elapsed:.0f} MB/s")
+        over = [s["file"] for s in shards if s["lines"] > args.max_lines or s["bytes"] > max_bytes]
+        with open(splits, "rb") as f:
+            source = hashlib.sha256(f.read()).hexdigest()
+        joined = hashlib.sha256()
+        for s in shards:
+            with open(out_dir / s["file"], "rb") as f:
+                joined.update(f.read())
+        located = True
+        with open(splits, "rb") as f:
+            for s in shards:
+                f.seek(s["start_offset"])
+                located &= f.read(s["end_offset"] - s["start_offset"]) == (out_dir / s["file"]).read_bytes()
+        print(f"超限分片 {len(over)} 个，按顺序拼接与原文件一致: {joined.hexdigest() == source}，"
+              f"按清单偏移从数据集读回一致: {located}，校验不一致 {len(verify_shards(out_dir))} 个")
+
+        # 模拟全部分片已上传，再追加新数据后重新分片；另把开头的记录原样再追加一遍（非增量重跑），不应再提交
+        for s in shards:
+            manifest.update_shard(s["file"], status="uploaded")
+        with open(splits, "rb") as f:
+            repeated = [f.readline() for _ in range(args.append)]
+        with open(splits, "a", encoding="utf-8") as f:
+            for i in range(args.append):
+                f.write(json.dumps(datawash.build_entry(f"x_{{{i}}} + {args.unique}", args.lines + i),
+                                   ensure_ascii=False) + "\n")
+        with open(splits, "ab") as f:
+            f.writelines(repeated)
+        manifest, elapsed = timed(shard_splits, splits, out_dir, args.max_lines, max_bytes)
+        kept = sum(1 for s in manifest.shards if s.get("status") == "uploaded")
+        print(f"追加 {args.append:,} 条新记录和 {len(repeated):,} 条重复记录后重新分片 ({elapsed:.2f}s): "
+              f"{len(manifest.shards)} 个分片，沿用已上传 {kept} 个，需要上传 {len(manifest.shards) - kept} 个"
+              f"（整文件重传时为全部 {manifest.data['records']:,} 条），跳过重复 {manifest.data['skipped_duplicates']:,} 条")
+
+def bench_label(args):
+    """异步标注客户端：对模拟接口的吞吐量、尾延迟、重试与断点续传"""
+    import datawash
+    from label_client import label_splits, read_entries
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        splits = tmp / "splits.jsonl"
+        with open(splits, "w", encoding="utf-8") as f:
+            for i in range(args.records):
+                f.write(json.dumps(datawash.build_entry(f"x_{{{i}}} + y^{{{i % 7}}}", i), ensure_ascii=False) + "\n")
+        print(f"记录数 {args.records} | 模拟延迟中位数 {args.latency*1000:.0f}ms（对数正态长尾）| "
+              f"500 比例 {args.error_rate:.1%} | 429 比例 {args.throttle_rate:.1%}")
+
+        def run(tag, concurrency, limit=None, output=None):
+            output = output or tmp / f"{tag}.jsonl"
+            with MockChatServer(args.latency, args.error_rate, args.throttle_rate) as server:
+                stats = label_splits(splits, str(output), str(output) + ".failed", base_url=server.base_url,
+                                     concurrency=concurrency, limit=limit, timeout=30)
+            print(f"{tag}: {stats['labelled']} 条 {stats['elapsed']:.2f}s ({stats['rate']:.1f} 条/秒) | "
+                  f"p50 {stats['p50']*1000:.0f}ms  p95 {stats['p95']*1000:.0f}ms  p99 {stats['p99']*1000:.0f}ms  "
+                  f"最大 {stats['max']*1000:.0f}ms | 请求 {stats['requests']}，重试 {stats['retries']}，"
+                  f"失败 {stats['failed']}，跳过 {stats['skipped']}")
+            return output, stats
+
+        sequential = min(args.records, args.sequential)
+        run(f"逐条请求（前 {sequential} 条）", 1, limit=sequential)
+        for concurrency in args.concurrency:
+            run(f"并发 {concurrency}", concurrency)
+
+        # 断点续传：先标注一半，再整体重跑
+        resumed = tmp / "resumed.jsonl"
+        run("中断前（前一半）", args.concurrency[-1], limit=args.records // 2, output=resumed)
+        with open(resumed, "a", encoding="utf-8") as f:
+            f.write('{"custom_id": "latex_trunc')  # 模拟写到一半时进程被杀
+        run("续传", args.concurrency[-1], output=resumed)
+        ids = [entry["custom_id"] for entry in read_entries(resumed)]
+        filled = sum(1 for entry in read_entries(resumed) if entry["CHINESE"] and entry["Meaning"])
+        failed = sum(1 for _ in open(str(resumed) + ".failed", encoding="utf-8"))
+        print(f"续传后: {len(ids)} 条，重复 id {len(ids) - len(set(ids))} 个，CHINESE/Meaning 已填写 {filled} 条，"
+              f"失败记录 {failed} 条")
+
+def make_batch_results(splits, result_dir, files=4, fail_rate=0.02, missing_rate=0.01, retry_rate=0.005, seed=0):
+    """按数据集生成乱序、分多个文件的批处理输出：部分失败、部分缺失、部分重复（重试成功）"""
+    rng = random.Random(seed)
+    ids = []
+    with open(splits, "rb") as f:
+        for line in f:
+            ids.append(json.loads(line)["custom_id"])
+    rng.shuffle(ids)
+    outputs = [open(Path(result_dir) / f"result_{i}.jsonl", "w", encoding="utf-8") for i in range(files)]
+    for n, custom_id in enumerate(ids):
+        roll = rng.random()
+        if roll < missing_rate:
+            continue
+        ok = roll >= missing_rate + fail_rate
+        item = {"id": f"batch_req_{n}", "custom_id": custom_id,
+                "response": {"status_code": 200 if ok else 500, "request_id": f"req-{n}",
+                             "body": {"model": "qwen-fixture", "choices": [{"index": 0, "message": {
+                                 "role": "assistant",
+                                 "content": json.dumps({"CHINESE": f"公式{n}", "Meaning": "模拟"}, ensure_ascii=False)
+                             }}]} if ok else {}},
+                "error": None if ok else {"code": "server_error", "message": "模拟失败"}}
+        outputs[n % files].write(json.dumps(item, ensure_ascii=False) + "\n")
+        if roll > 1 - retry_rate:
+            outputs[(n + 1) % files].write(json.dumps(item, ensure_ascii=False) + "\n")
+    for out in outputs:
+        out.close()
+    return sorted(Path(result_dir).glob("result_*.jsonl"))
+
+def _run_merge(mode, splits, results, output):
+    """在独立进程中运行一次合并，返回 (用时, 峰值RSS, 合并条数)"""
+    from batch_merge import merge_results
+    from label_client import parse_label
+    from label_store import parse_batch_result
+    from records import dumps_line
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+    start = time.perf_counter()
+    if mode == "naive":
+        # 两个文件都读进字典再按 custom_id 连接
+        with open(splits, "r", encoding="utf-8") as f:
+            entries = {entry["custom_id"]: entry for entry in map(json.loads, f)}
+        labels = {}
+        for path in results:
+            with open(path, "r", encoding="utf-8") as f:
+                for item in map(json.loads, f):
+                    label = parse_batch_result(item)
+                    if label is not None:
+                        labels.setdefault(label[0], label[1])
+        merged = 0
+        with open(output, "w", encoding="utf-8") as out:
+            for custom_id, entry in entries.items():
+                if custom_id in labels:
+                    entry["CHINESE"], entry["Meaning"] = parse_label(labels[custom_id])
+                    out.write(dumps_line(entry))
+                    merged += 1
+    else:
+        merged = merge_results(splits, results, output, str(output) + ".resubmit")["merged"]
+    return time.perf_counter() - start, peak_rss_mb(), merged
+
+def bench_merge(args):
+    """批处理结果合并：字典连接 vs custom_id 偏移索引（各在独立进程中运行）"""
+    import datawash
+    from label_store import formula_id
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+    ctx = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        splits = tmp / "splits.jsonl"
+        rng = random.Random(0)
+        with open(splits, "w", encoding="utf-8") as f:
+            for i in range(args.records):
+                latex = f"\\frac{{x_{{{i}}}}}{{y}} + \\sum_{{k=1}}^{{{i % 97}}} a_k"
+                f.write(json.dumps(datawash.build_entry(latex, i, formula_id(rng.getrandbits(128))),
+                                   ensure_ascii=False) + "\n")
+        results = make_batch_results(splits, tmp, files=args.files)
+        result_mb = sum(p.stat().st_size for p in results) / 1024**2
+        print(f"数据集 {args.records:,} 条 ({splits.stat().st_size / 1024**2:.0f} MB)，"
+              f"批处理输出 {len(results)} 个文件 ({result_mb:.0f} MB，乱序，含失败/缺失/重复)")
+
+        runs = {}
+        for label, mode in (("字典连接", "naive"), ("偏移索引（含建索引）", "index"), ("偏移索引（已有索引）", "index")):
+            output = tmp / f"{mode}.jsonl"
+            if output.exists():
+                output.unlink()
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                elapsed, rss, merged = pool.submit(_run_merge, mode, str(splits), [str(p) for p in results],
+                                                   str(output)).result()
+            runs[mode] = output
+            print(f"{label}: {elapsed:.1f}s  峰值RSS {rss:.0f} MB  合并 {merged:,} 条")
+
+        def by_id(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return sorted(f, key=lambda line: json.loads(line)["custom_id"])
+        resubmit = sum(1 for _ in open(str(runs["index"]) + ".resubmit", encoding="utf-8"))
+        print(f"两种方式输出一致（按 custom_id 排序后）: {by_id(runs['naive']) == by_id(runs['index'])}，"
+              f"待重新提交 {resubmit:,} 条")
+
+def bench_incremental(args):
+    """增量清洗：首次全量、追加新行后重跑、无新数据重跑的用时，与每次全量重跑对比"""
+    import datawash
+    from wash_index import WashIndex
+    logging.getLogger("data_wash").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        raw_file = tmp / "raw.jsonl"
+        make_raw_data(raw_file, args.lines, unique=args.unique)
+        outputs = {"output_file": tmp / "splits.jsonl", "duplicate_file": tmp / "duplicates.jsonl",
+                   "error_file": tmp / "errors.jsonl"}
+
+        def run(label):
+            index = WashIndex(tmp / "wash_index.sqlite3",
+                              bloom_path=tmp / "wash_index.bloom" if args.bloom else None)
+            stats, elapsed = timed(datawash.process_raw_data_stream, raw_file, index=index, **outputs)
+            print(f"{label}: {elapsed:.2f}s  处理 {stats['lines']} 行  新增唯一 {stats['unique']}  "
+                  f"索引累计 {index.count()}")
+            index.close()
+
+        run(f"首次运行 ({args.lines:,} 行)")
+        # 追加的行中一半是已见过的公式，一半是新公式
+        bodies = fixture_formulas(50)
+        with open(raw_file, 'a', encoding='utf-8') as f:
+            for i in range(args.append):
+                f.write(raw_record(bodies, args.unique + i if i % 2 else i % args.unique))
+        run(f"追加 {args.append:,} 行后")
+        run("无新数据")
+
+        full = {k: tmp / f"full_{k}" for k in outputs}
+        stats, elapsed = timed(datawash.process_raw_data_stream, raw_file, **full)
+        print(f"对照：全量重跑 {elapsed:.2f}s  处理 {stats['lines']} 行")
+        written = sum(1 for _ in open(outputs["output_file"], encoding='utf-8'))
+        print(f"增量输出 {written} 条，全量输出 {stats['unique']} 条，一致: {written == stats['unique']}")
+
+def bench_hashset(args):
+    """去重集合：每条内存与插入/查找吞吐量（当前 set[SHA256十六进制] vs 定长摘要）"""
+    from datawash import calculate_hash
+    from hash_set import BloomFilter, CompactHashSet, content_digest
+    quiet("data_wash")
+
+    texts = [f"\\frac{{a_{{{i}}}}}{{b}} + x^{{{i % 97}}}" for i in range(args.entries)]
+    misses = [f"\\sqrt{{{i}}} - y" for i in range(min(args.entries, 500000))]
+
+    def measure(label, make, key):
+        keys = [key(t) for t in texts]
+        miss_keys = [key(t) for t in misses]
+        container, add = make()
+        start = time.perf_counter()
+        for k in keys:
+            add(k)
+        insert_time = time.perf_counter() - start
+        if isinstance(container, set):
+            # set 中的每个键都是独立的Python对象，一并计入
+            size = sys.getsizeof(container) + sum(sys.getsizeof(k) for k in keys)
+        else:
+            size = container.nbytes
+        start = time.perf_counter()
+        hits = sum(1 for k in keys[:len(miss_keys)] if k in container)
+        false_hits = sum(1 for k in miss_keys if k in container)
+        lookup_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for t in misses:
+            key(t)
+        key_time = time.perf_counter() - start
+        print(f"{label:<22} {size/args.entries:7.1f} 字节/条  插入 {args.entries/insert_time/1e6:5.2f}M/s  "
+              f"查找 {2*len(miss_keys)/lookup_time/1e6:5.2f}M/s  摘要计算 {len(misses)/key_time/1e6:5.2f}M/s  "
+              f"命中 {hits}/{len(miss_keys)}  误报 {false_hits}")
+
+    def python_set():
+        seen = set()
+        return seen, seen.add
+
+    def compact(bits):
+        def make():
+            seen = CompactHashSet(bits=bits)
+            return seen, seen.add
+        return make
+
+    def bloom():
+        seen = BloomFilter(args.entries, error_rate=0.01)
+        return seen, seen.add
+
+    print(f"条目数: {args.entries:,}")
+    measure("set[SHA256十六进制]", python_set, calculate_hash)
+    measure("set[blake2b-64 整数]", python_set, content_digest)
+    measure("CompactHashSet 64位", compact(64), content_digest)
+    measure("CompactHashSet 128位", compact(128), lambda t: content_digest(t, 128))
+    measure("BloomFilter 1%", bloom, lambda t: content_digest(t, 128))
+
+def main():
+    parser = argparse.ArgumentParser(description="CHN2LaTeX 数据管线基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("fetch", help="顺序抓取 vs 异步抓取吞吐量")
+    p.add_argument("--pages", type=int, default=200)
+    p.add_argument("--formulas", type=int, default=10)
+    p.add_argument("--latency", type=float, default=0.05, help="每个请求的模拟延迟（秒）")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--per-host", type=int, default=8)
+    p.set_defaults(func=bench_fetch)
+
+    p = sub.add_parser("rate", help="服务器限流下固定等待 vs 自适应限速")
+    p.add_argument("--pages", type=int, default=150)
+    p.add_argument("--formulas", type=int, default=10)
+    p.add_argument("--latency", type=float, default=0.01)
+    p.add_argument("--server-rate", type=float, default=10.0, help="服务器每秒放行的请求数")
+    p.add_argument("--fixed-delay", type=float, default=0.5, help="固定策略每页随机等待的上限（秒）")
+    p.add_argument("--rate", type=float, default=2.0, help="自适应限速的初始速率")
+    p.add_argument("--max-rate", type=float, default=50.0)
+    p.set_defaults(func=bench_rate)
+
+    p = sub.add_parser("wash", help="datawash 原始实现 vs 流式模式")
+    p.add_argument("--lines", type=int, default=10_000_000, help="流式模式的合成输入行数")
+    p.add_argument("--legacy-lines", type=int, default=1_000_000, help="两种实现对照的输入行数（0 表示跳过）")
+    p.add_argument("--unique", type=int, default=200000, help="合成数据中的唯一公式数")
+    p.set_defaults(func=bench_wash)
+
+    p = sub.add_parser("wash-parallel", help="datawash 多进程分片清洗的扩展性")
+    p.add_argument("--lines", type=int, default=2_000_000)
+    p.add_argument("--unique", type=int, default=200000)
+    p.add_argument("--workers", type=lambda v: [int(n) for n in v.split(",")], default=[1, 2, 4],
+                   help="逗号分隔的进程数列表")
+    p.set_defaults(func=bench_wash_parallel)
+
+    p = sub.add_parser("incremental", help="增量清洗：只处理新追加的行")
+    p.add_argument("--lines", type=int, default=1_000_000)
+    p.add_argument("--append", type=int, default=10000)
+    p.add_argument("--unique", type=int, default=200000)
+    p.add_argument("--bloom", action="store_true", help="索引前加磁盘布隆过滤器预判")
+    p.set_defaults(func=bench_incremental)
+
+    p = sub.add_parser("relabel", help="重跑清洗后需要重新标注的记录数")
+    p.add_argument("--lines", type=int, default=200000)
+    p.add_argument("--append", type=int, default=20000)
+    p.add_argument("--unique", type=int, default=50000)
+    p.set_defaults(func=bench_relabel)
+
+    p = sub.add_parser("shard", help="批处理任务分片与清单")
+    p.add_argument("--lines", type=int, default=1_000_000)
+    p.add_argument("--unique", type=int, default=300000)
+    p.add_argument("--append", type=int, default=5000)
+    p.add_argument("--max-lines", type=int, default=50000)
+    p.add_argument("--max-mb", type=float, default=10.0)
+    p.set_defaults(func=bench_shard)
+
+    p = sub.add_parser("label", help="异步标注客户端对模拟接口的吞吐量与尾延迟")
+    p.add_argument("--records", type=int, default=5000)
+    p.add_argument("--latency", type=float, default=0.2, help="模拟接口延迟中位数（秒）")
+    p.add_argument("--error-rate", type=float, default=0.01)
+    p.add_argument("--throttle-rate", type=float, default=0.01)
+    p.add_argument("--sequential", type=int, default=100, help="逐条请求对照的记录数")
+    p.add_argument("--concurrency", type=lambda v: [int(n) for n in v.split(",")], default=[16, 64],
+                   help="逗号分隔的并发数列表")
+    p.set_defaults(func=bench_label)
+
+    p = sub.add_parser("merge", help="批处理结果合并：字典连接 vs custom_id 偏移索引")
+    p.add_argument("--records", type=int, default=1_000_000)
+    p.add_argument("--files", type=int, default=4, help="批处理输出文件数")
+    p.set_defaults(func=bench_merge)
+
+    p = sub.add_parser("raw-format", help="原始数据旧格式 vs 紧凑格式的体积与清洗用时")
+    p.add_argument("--formulas", type=int, default=1_000_000)
+    p.add_argument("--real-raw", default=str(Path(__file__).resolve().parent.parent / "raw" / "raw_data.jsonl"),
+                   help="额外转换的真实原始数据（旧格式），检查 arXiv 标题是否解析正确")
+    p.set_defaults(func=bench_raw_format)
+
+    p = sub.add_parser("columnar", help="列式内存映射格式 vs JSONL 的扫描与随机访问")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--lookups", type=int, default=100000)
+    p.set_defaults(func=bench_columnar)
+
+    p = sub.add_parser("records", help="逐条编解码开销：标准库 json vs 快速编解码器 vs 记录类型")
+    p.add_argument("--records", type=int, default=200000)
+    p.add_argument("--lines", type=int, default=2_000_000, help="整条清洗流程的原始数据行数（0 跳过）")
+    p.add_argument("--unique", type=int, default=200000)
+    p.set_defaults(func=bench_records)
+
+    p = sub.add_parser("compress", help="块压缩 JSONL 的体积、吞吐量与随机访问")
+    p.add_argument("--lines", type=int, default=1_000_000, help="合成原始数据的行数")
+    p.add_argument("--unique", type=int, default=200000)
+    p.add_argument("--formulas", type=int, default=200000, help="旧格式原始数据的公式数")
+    p.add_argument("--log-lines", type=int, default=500000)
+    p.add_argument("--lookups", type=int, default=1000, help="按行号随机读取的次数")
+    p.set_defaults(func=bench_compress)
+
+    p = sub.add_parser("lines", help="原始数据行号索引的建立、增量更新与按行号读取")
+    p.add_argument("--lines", type=int, default=1_000_000)
+    p.add_argument("--unique", type=int, default=200000)
+    p.add_argument("--append", type=int, default=100000, help="追加后增量更新的行数")
+    p.add_argument("--lookups", type=int, default=10000)
+    p.set_defaults(func=bench_lines)
+
+    p = sub.add_parser("hashset", help="去重集合的每条内存与查找吞吐量")
+    p.add_argument("--entries", type=int, default=2_000_000)
+    p.set_defaults(func=bench_hashset)
+
+    p = sub.add_parser("api", help="HTML逐页抓取 vs MediaWiki API批量获取")
+    p.add_argument("--pages", type=int, default=300)
+    p.add_argument("--formulas", type=int, default=10)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.set_defaults(func=bench_api)
+
+    p = sub.add_parser("extract", help="页面解析后端吞吐量与峰值内存")
+    p.add_argument("--pages", type=int, default=100)
+    p.add_argument("--formulas", type=int, default=10)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--pages-dir", default=None, help="保存的维基百科HTML页面目录")
+    p.set_defaults(func=bench_extract)
+
+    p = sub.add_parser("pipeline", help="顺序抓取+解析 vs 抓取/解析流水线")
+    p.add_argument("--pages", type=int, default=200)
+    p.add_argument("--formulas", type=int, default=10)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.add_argument("--extractor", default="bs4")
+    p.add_argument("--fetch-workers", type=int, default=8)
+    p.add_argument("--parse-workers", type=int, default=None)
+    p.add_argument("--queue-depth", type=int, default=32)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("arxiv", help="arXiv 多分类并行增量采集")
+    p.add_argument("--categories", type=int, default=4)
+    p.add_argument("--papers", type=int, default=450)
+    p.add_argument("--new", type=int, default=30)
+    p.add_argument("--batch", type=int, default=100)
+    p.add_argument("--delay", type=float, default=0.1)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.set_defaults(func=bench_arxiv)
+
+    p = sub.add_parser("scan", help="arXiv摘要公式提取：原始正则 vs 单遍扫描器")
+    p.add_argument("--count", type=int, default=20000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--abstracts", default=None, help="每行一篇摘要的文本文件")
+    p.set_defaults(func=bench_scan)
+
+    p = sub.add_parser("normalize", help="LaTeX规范化：回归用例、吞吐量与去重效果")
+    p.add_argument("--count", type=int, default=500000)
+    p.add_argument("--unique", type=int, default=20000, help="合成数据中的不同公式数（每个有多种写法）")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--raw-file", default=None, help="raw_data.jsonl 格式的真实数据")
+    p.set_defaults(func=bench_normalize)
+
+    p = sub.add_parser("near-dup", help="MinHash/LSH 近似重复聚类的用时与召回率")
+    p.add_argument("--rows", type=int, default=200000)
+    p.add_argument("--variants", type=float, default=0.3, help="带变体的基础公式比例")
+    p.add_argument("--threshold", type=float, default=0.6)
+    p.add_argument("--num-perm", type=int, default=64)
+    p.add_argument("--shingle", type=int, default=2)
+    p.set_defaults(func=bench_near_dup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
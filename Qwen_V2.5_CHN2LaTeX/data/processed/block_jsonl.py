@@ -0,0 +1,545 @@
+import argparse
+import io
+import logging
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("crawler")
+
+# === 块压缩 JSONL ===
+# 数据文件（*.gz）由若干独立压缩的 gzip 成员首尾相接组成，每个成员是一块完整的行，
+# 整个文件仍是合法的 gzip 文件，zcat / gzip.open 可以直接读。
+# 旁边的 <文件>.blocks 是块索引：文件头之后每块一条定长记录。
+# 数据文件是唯一可信的来源：索引缺失、落后或超出数据文件时，打开时按数据文件修复。
+BLOCK_SUFFIX = ".gz"
+INDEX_SUFFIX = ".blocks"
+INDEX_MAGIC = b"BJIX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sI")  # 魔数、版本
+# 压缩数据偏移、压缩大小、解压后偏移、解压后大小、首行行号（从0计）、行数
+BLOCK_STRUCT = struct.Struct("<QIQIQI")
+BLOCK_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u4"), ("raw_offset", "<u8"), ("raw_size", "<u4"),
+                        ("first_line", "<u8"), ("lines", "<u4")])
+
+BLOCK_SIZE = 256 * 1024   # gzip 窗口只有 32KB，块再大压缩率提升很小，随机访问却要多解压
+READ_BUFFER = 64 * 1024
+
+def is_blocked(path):
+    return str(path).endswith(BLOCK_SUFFIX)
+
+def index_path(path):
+    return Path(str(path) + INDEX_SUFFIX)
+
+def compressed_path(path):
+    """普通文件名对应的块压缩文件名（raw_data.jsonl → raw_data.jsonl.gz）"""
+    return path if is_blocked(path) else type(path)(str(path) + BLOCK_SUFFIX)
+
+def compress_block(raw, level=6):
+    """把一块数据压缩为一个完整的 gzip 成员（文件头中的时间戳为0，输出只取决于内容）"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(raw) + compressor.flush()
+
+def decompress_block(member):
+    return zlib.decompress(member, 31)
+
+def _line_count(raw):
+    return raw.count(b"\n") + (1 if raw and not raw.endswith(b"\n") else 0)
+
+def _scan_members(f, start, end):
+    """从 start 开始逐个解压 gzip 成员，返回完整成员的 (偏移, 压缩大小, 解压后大小, 行数) 列表
+
+    遇到不完整或损坏的成员（写到一半时崩溃）就停止。
+    """
+    found = []
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        decompressor = zlib.decompressobj(31)
+        raw_size = lines = consumed = 0
+        tail = b""
+        try:
+            while not decompressor.eof:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                out = decompressor.decompress(chunk)
+                raw_size += len(out)
+                lines += out.count(b"\n")
+                if out:
+                    tail = out[-1:]
+                consumed += len(chunk) - len(decompressor.unused_data)
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            break
+        if raw_size and tail != b"\n":
+            lines += 1
+        found.append((pos, consumed, raw_size, lines))
+        pos += consumed
+    return found
+
+# === 块索引 ===
+class BlockIndex:
+    """块压缩文件的块索引
+
+    - blocks 是 BLOCK_DTYPE 数组，按偏移排列；解压后偏移与首行行号都是累计值，二分查找即可定位
+    - data_end 是最后一个完整块的结尾；之后的字节是写到一半的块，读取时忽略，写入时截掉
+    - dirty 表示与磁盘上的索引文件不一致，需要 save()
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index_path = index_path(self.path)
+        self.file_size = os.path.getsize(self.path) if self.path.exists() else 0
+        self.blocks, self.dirty = self._load()
+        self._buffer = None
+        self._refresh()
+
+    def _read_saved(self):
+        if not self.index_path.exists():
+            return np.empty(0, dtype=BLOCK_DTYPE)
+        with open(self.index_path, "rb") as f:
+            header = f.read(INDEX_HEADER.size)
+            body = f.read()
+        if len(header) != INDEX_HEADER.size or INDEX_HEADER.unpack(header) != (INDEX_MAGIC, INDEX_VERSION):
+            logger.warning(f"块索引无法识别，按数据文件重建: {self.index_path}")
+            return None
+        count = len(body) // BLOCK_DTYPE.itemsize
+        return np.frombuffer(body[:count * BLOCK_DTYPE.itemsize], dtype=BLOCK_DTYPE).copy()
+
+    def _load(self):
+        saved = self._read_saved()
+        dirty = saved is None or not self.index_path.exists()
+        if saved is None:
+            saved = np.empty(0, dtype=BLOCK_DTYPE)
+        # 只保留完整落在数据文件内、首尾相接的条目（数据文件被截断回滚时后面的条目作废）
+        ends = saved["offset"] + saved["size"].astype(np.uint64)
+        ok = (saved["offset"] == np.concatenate([np.zeros(1, np.uint64), ends[:-1]])) & (ends <= self.file_size)
+        valid = len(saved) if ok.all() else int(np.argmin(ok))
+        if valid != len(saved):
+            saved = saved[:valid]
+            dirty = True
+        indexed_end = int(ends[valid - 1]) if valid else 0
+        if indexed_end >= self.file_size:
+            return saved, dirty
+        # 索引落后于数据文件（写完数据、写索引之前崩溃，或没有索引）：解压补齐
+        with open(self.path, "rb") as f:
+            found = _scan_members(f, indexed_end, self.file_size)
+        if not found:
+            return saved, dirty
+        extra = np.empty(len(found), dtype=BLOCK_DTYPE)
+        raw_offset = int(saved["raw_offset"][-1] + saved["raw_size"][-1]) if valid else 0
+        first_line = int(saved["first_line"][-1] + saved["lines"][-1]) if valid else 0
+        for i, (offset, size, raw_size, lines) in enumerate(found):
+            extra[i] = (offset, size, raw_offset, raw_size, first_line, lines)
+            raw_offset += raw_size
+            first_line += lines
+        return np.concatenate([saved, extra]), True
+
+    def _refresh(self):
+        self.raw_offsets = self.blocks["raw_offset"]
+        self.first_lines = self.blocks["first_line"]
+        if len(self.blocks):
+            last = self.blocks[-1]
+            self.data_end = int(last["offset"] + last["size"])
+            self.raw_size = int(last["raw_offset"] + last["raw_size"])
+            self.lines = int(last["first_line"] + last["lines"])
+        else:
+            self.data_end = self.raw_size = self.lines = 0
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def append(self, offset, size, raw_size, lines):
+        """登记新写入的一块（由 BlockWriter 调用），返回索引条目的字节"""
+        entry = (offset, size, self.raw_size, raw_size, self.lines, lines)
+        # 容量按倍数扩大，blocks 是其前缀视图，逐块追加时不必每次复制整个数组
+        count = len(self.blocks)
+        if self._buffer is None or len(self._buffer) <= count:
+            buffer = np.empty(max(1024, count * 2), dtype=BLOCK_DTYPE)
+            buffer[:count] = self.blocks
+            self._buffer = buffer
+        self._buffer[count] = entry
+        self.blocks = self._buffer[:count + 1]
+        self._refresh()
+        return BLOCK_STRUCT.pack(*entry)
+
+    def save(self):
+        """按当前条目重写索引文件（先写临时文件再替换）"""
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION))
+            f.write(self.blocks.tobytes())
+        os.replace(tmp, self.index_path)
+        self.dirty = False
+
+    def block_at(self, raw_pos):
+        """解压后偏移 raw_pos 所在的块号，超出末尾返回 -1"""
+        if raw_pos >= self.raw_size:
+            return -1
+        return int(np.searchsorted(self.raw_offsets, raw_pos, side="right")) - 1
+
+    def block_of_line(self, line):
+        """第 line 行（从0计）所在的块号，超出末尾返回 -1"""
+        if line >= self.lines or line < 0:
+            return -1
+        return int(np.searchsorted(self.first_lines, line, side="right")) - 1
+
+    def read_block(self, f, block):
+        offset, size = int(self.blocks["offset"][block]), int(self.blocks["size"][block])
+        f.seek(offset)
+        return decompress_block(f.read(size))
+
+    def ranges(self, target_bytes):
+        """把连续的块按解压后大小约 target_bytes 分组，返回 [(起始偏移, 结束偏移), ...]（解压后偏移）"""
+        ranges = []
+        start = 0
+        for block in range(len(self.blocks)):
+            end = int(self.raw_offsets[block] + self.blocks["raw_size"][block])
+            if end - start >= target_bytes or block == len(self.blocks) - 1:
+                ranges.append((start, end))
+                start = end
+        return ranges
+
+    def count_lines(self, start, end):
+        """解压后偏移 [start, end) 内的行数；start、end 必须落在块边界上"""
+        first = self.block_at(start)
+        if first < 0:
+            return 0
+        last = self.block_at(end) if end < self.raw_size else len(self.blocks)
+        return int(self.blocks["lines"][first:last].sum())
+
+# === 读取 ===
+class BlockReader(io.RawIOBase):
+    """按解压后偏移随机读取块压缩文件，只解压用到的块
+
+    通常包在 io.BufferedReader 中使用（见 open_jsonl），支持 seek / tell / readline / 逐行迭代。
+    """
+    def __init__(self, path, index=None):
+        super().__init__()
+        self.index = index or BlockIndex(path)
+        self.file = open(path, "rb")
+        self.pos = 0
+        self._block = -1
+        self._data = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += self.index.raw_size
+        self.pos = max(0, pos)
+        return self.pos
+
+    def readinto(self, buffer):
+        block = self.index.block_at(self.pos)
+        if block < 0:
+            return 0
+        if block != self._block:
+            self._data = memoryview(self.index.read_block(self.file, block))
+            self._block = block
+        start = self.pos - int(self.index.raw_offsets[block])
+        chunk = self._data[start:start + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self.pos += len(chunk)
+        return len(chunk)
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+            self._data = memoryview(b"")
+        super().close()
+
+# === 写入 ===
+class BlockWriter:
+    """追加写入块压缩文件
+
+    - write 接受 str 或 bytes；攒满 block_size 后在行边界切块，压缩为一个 gzip 成员写出，同时追加索引条目
+    - flush 只把已压缩的块交给操作系统，不切块（否则每批记录一块，压缩率很差）
+    - sync 把缓冲中的完整行切成一块并 fsync 数据与索引；崩溃最多丢失上次 sync 之后的记录
+    - 打开时截掉写到一半的块，并按数据文件修复索引
+    - tell 返回解压后的偏移，与 BlockReader 的 seek/tell 一致
+    """
+    def __init__(self, path, mode="a", block_size=BLOCK_SIZE, level=6):
+        self.path = Path(path)
+        self.block_size = block_size
+        self.level = level
+        if mode == "w":
+            for p in (self.path, index_path(self.path)):
+                if p.exists():
+                    p.unlink()
+        self.index = BlockIndex(self.path)
+        if self.index.file_size > self.index.data_end:
+            logger.warning(f"{self.path} 末尾有 {self.index.file_size - self.index.data_end} 字节不完整的块，已截断")
+            with open(self.path, "r+b") as f:
+                f.truncate(self.index.data_end)
+        if self.index.dirty or not self.index.index_path.exists():
+            self.index.save()
+        self.file = open(self.path, "ab")
+        self.index_file = open(self.index.index_path, "ab")
+        self.pending = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.pending += data
+        if len(self.pending) >= self.block_size:
+            self._cut()
+        return len(data)
+
+    def _cut(self, force=False):
+        """切出完整的块；force 时把缓冲中所有完整的行都写出"""
+        pending = self.pending
+        while True:
+            if len(pending) >= self.block_size:
+                cut = pending.rfind(b"\n", 0, self.block_size)
+                if cut < 0:
+                    cut = pending.find(b"\n", self.block_size)
+            elif force:
+                cut = pending.rfind(b"\n")
+            else:
+                break
+            if cut < 0:
+                break
+            self._emit(bytes(pending[:cut + 1]))
+            del pending[:cut + 1]
+
+    def _emit(self, raw):
+        member = compress_block(raw, self.level)
+        self.file.write(member)
+        # 先写数据再写索引；两者之间崩溃时，下次打开按数据文件补齐索引
+        self.index_file.write(self.index.append(self.index.data_end, len(member), len(raw), _line_count(raw)))
+
+    def tell(self):
+        return self.index.raw_size + len(self.pending)
+
+    @property
+    def compressed_size(self):
+        return self.index.data_end
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def flush(self):
+        self.file.flush()
+        self.index_file.flush()
+
+    def sync(self):
+        self._cut(force=True)
+        self.flush()
+        os.fsync(self.file.fileno())
+        os.fsync(self.index_file.fileno())
+
+    def close(self):
+        if self.closed:
+            return
+        self._cut(force=True)
+        if self.pending:
+            # 没有换行符结尾的最后一行单独成块
+            self._emit(bytes(self.pending))
+            self.pending.clear()
+        self.file.close()
+        self.index_file.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# === 透明读写入口 ===
+def open_jsonl(path, mode="r", buffering=-1):
+    """按扩展名打开 JSONL 文件：*.gz 为块压缩格式，其余为普通 UTF-8 文件
+
+    mode 为 r / rb（可 seek，偏移为解压后偏移）或 a / w（写入 str 或 bytes 均可，块压缩格式忽略 buffering）。
+    """
+    if not is_blocked(path):
+        if "b" in mode:
+            return open(path, mode, buffering=buffering)
+        return open(path, mode, encoding="utf-8", buffering=buffering)
+    if mode in ("r", "rb"):
+        reader = io.BufferedReader(BlockReader(path), buffer_size=READ_BUFFER)
+        return reader if mode == "rb" else io.TextIOWrapper(reader, encoding="utf-8")
+    if mode in ("a", "ab", "w", "wb"):
+        return BlockWriter(path, mode[0])
+    raise ValueError(f"不支持的打开方式: {mode}")
+
+def sync_file(f):
+    """把写入器的数据落盘：普通文件 flush + fsync，块压缩文件切块后 fsync"""
+    if isinstance(f, BlockWriter):
+        f.sync()
+    else:
+        f.flush()
+        os.fsync(f.fileno())
+
+def jsonl_size(path):
+    """文件内容（解压后）的字节数；块压缩文件只计完整的块"""
+    if is_blocked(path):
+        return BlockIndex(path).raw_size
+    return os.path.getsize(path)
+
+def truncate_jsonl(path, size):
+    """截断到 size 字节（压缩后大小，应落在块边界上），块压缩文件同时重写块索引"""
+    with open(path, "r+b") as f:
+        f.truncate(size)
+    if is_blocked(path):
+        index = BlockIndex(path)
+        if index.dirty:
+            index.save()
+
+def move_jsonl(src, dst):
+    """改名，块压缩文件连同块索引一起"""
+    os.replace(src, dst)
+    if is_blocked(src) and index_path(src).exists():
+        os.replace(index_path(src), index_path(dst))
+
+def read_lines(path, first, count=1):
+    """按行号（从1计）读取 count 行原始字节，只解压涉及的块"""
+    if not is_blocked(path):
+        result = []
+        with open(path, "rb") as f:
+            for line_num, line in enumerate(f, 1):
+                if line_num >= first + count:
+                    break
+                if line_num >= first:
+                    result.append(line)
+        return result
+    index = BlockIndex(path)
+    block = index.block_of_line(first - 1)
+    result = []
+    if block < 0:
+        return result
+    skip = first - 1 - int(index.first_lines[block])
+    with open(path, "rb") as f:
+        while block < len(index) and len(result) < count:
+            lines = index.read_block(f, block).splitlines(keepends=True)
+            result.extend(lines[skip:skip + count - len(result)])
+            skip = 0
+            block += 1
+    return result
+
+# === 日志 ===
+class BlockLogHandler(logging.StreamHandler):
+    """把日志写入块压缩文件；距上次落盘超过 sync_interval 秒时切块并 fsync"""
+    def __init__(self, path, sync_interval=5.0, block_size=BLOCK_SIZE):
+        super().__init__(BlockWriter(path, block_size=block_size))
+        self.sync_interval = sync_interval
+        self.last_sync = time.monotonic()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.stream is not None and time.monotonic() - self.last_sync >= self.sync_interval:
+                self.stream.sync()
+                self.last_sync = time.monotonic()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+        finally:
+            self.release()
+        super().close()
+
+def log_file_handler(path):
+    """日志文件处理器：*.gz 写块压缩格式，其余同 logging.FileHandler"""
+    if is_blocked(path):
+        return BlockLogHandler(path)
+    return logging.FileHandler(path, mode='a', encoding='utf-8')
+
+# === 转换 ===
+def compress_file(src, dst, block_size=BLOCK_SIZE, level=6):
+    """普通 JSONL → 块压缩格式，返回 (解压后字节数, 压缩后字节数)"""
+    with open(src, "rb") as f, BlockWriter(dst, "w", block_size, level) as out:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            out.write(chunk)
+    return out.index.raw_size, out.index.data_end
+
+def _inflate_range(path, first, last):
+    """工作进程：解压第 first..last-1 块"""
+    index = BlockIndex(path)
+    with open(path, "rb") as f:
+        return b"".join(index.read_block(f, block) for block in range(first, last))
+
+def decompress_file(src, dst, workers=None, blocks_per_task=64):
+    """块压缩格式 → 普通 JSONL；workers 个进程并行解压，按块顺序写出，返回解压后字节数"""
+    index = BlockIndex(src)
+    workers = workers or os.cpu_count() or 1
+    tasks = [(start, min(start + blocks_per_task, len(index))) for start in range(0, len(index), blocks_per_task)]
+    written = 0
+    with open(dst, "wb") as out:
+        if workers == 1:
+            for first, last in tasks:
+                written += out.write(_inflate_range(src, first, last))
+            return written
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            for first, last in tasks:
+                in_flight.append(pool.submit(_inflate_range, str(src), first, last))
+                if len(in_flight) >= 2 * workers:
+                    written += out.write(in_flight.popleft().result())
+            while in_flight:
+                written += out.write(in_flight.popleft().result())
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="块压缩 JSONL：转换、查看块索引、按行号读取")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("compress", help="普通文件 → 块压缩格式（目标文件名以 .gz 结尾）")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p.add_argument("--block-kb", type=int, default=BLOCK_SIZE // 1024, help="每块解压后的大小（KB）")
+    p.add_argument("--level", type=int, default=6, help="压缩级别 1-9")
+    p = sub.add_parser("decompress", help="块压缩格式 → 普通文件")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p.add_argument("--workers", type=int, default=None, help="并行解压的进程数")
+    p = sub.add_parser("info", help="块数、行数、压缩率")
+    p.add_argument("path")
+    p = sub.add_parser("lines", help="按行号（从1计）打印原始行")
+    p.add_argument("path")
+    p.add_argument("first", type=int)
+    p.add_argument("count", type=int, nargs="?", default=1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "compress":
+        start = time.perf_counter()
+        raw, packed = compress_file(args.src, args.dst, args.block_kb * 1024, args.level)
+        logger.info(f"压缩完成: {raw / 1024**2:.1f} MB → {packed / 1024**2:.1f} MB "
+                    f"({packed / max(raw, 1):.1%}, {time.perf_counter() - start:.1f}s)")
+    elif args.command == "decompress":
+        start = time.perf_counter()
+        raw = decompress_file(args.src, args.dst, args.workers)
+        logger.info(f"解压完成: {raw / 1024**2:.1f} MB ({time.perf_counter() - start:.1f}s)")
+    elif args.command == "info":
+        index = BlockIndex(args.path)
+        print(f"块数: {len(index)}  行数: {index.lines}  解压后 {index.raw_size / 1024**2:.1f} MB  "
+              f"压缩后 {index.data_end / 1024**2:.1f} MB ({index.data_end / max(index.raw_size, 1):.1%})")
+        if index.file_size > index.data_end:
+            print(f"末尾有 {index.file_size - index.data_end} 字节不完整的块")
+    else:
+        for line in read_lines(args.path, args.first, args.count):
+            sys.stdout.write(line.decode("utf-8", "replace"))
@@ -0,0 +1,306 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import shutil
+import time
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from records import loads
+
+logger = logging.getLogger("data_wash")
+
+FORMAT_NAME = "chn2latex-columnar"
+FORMAT_VERSION = 1
+
+# 记录中没有这个字段（区别于值为 null）
+MISSING = object()
+
+def _field(name):
+    return lambda r: r.get(name, MISSING)
+
+def _metadata(name):
+    return lambda r: r["metadata"].get(name, MISSING) if isinstance(r.get("metadata"), dict) else MISSING
+
+# 列名 → (类型, 从数据集记录中取值的函数，没有该字段时返回 MISSING)；metadata 中的字段展开为独立的列
+# 每一列都可以缺失（UI/标注文件只有 {"LaTeX", "CHINESE"}）：缺失与 null 都记为无值，所有记录都没有的列不写出
+SPLITS_COLUMNS = {
+    "custom_id": ("str", _field("custom_id")),
+    "LaTeX": ("str", _field("LaTeX")),
+    "CHINESE": ("str", _field("CHINESE")),
+    "Meaning": ("str", _field("Meaning")),
+    "source_line": ("int64", _field("source_line")),
+    "length": ("int32", _metadata("length")),
+    "complexity": ("int32", _metadata("complexity")),
+}
+
+# === 写入 ===
+class _StringColumnWriter:
+    """字符串列：UTF-8 字节依次写入 <列>.heap，第 i 行占 offsets[i]:offsets[i+1]；没有值的行记在 valid 中"""
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.heap = open(directory / f"{name}.heap", "wb", buffering=1024 * 1024)
+        self.offsets = array('Q', [0])
+        self.valid = bytearray()
+        self.present = False
+
+    def append(self, value):
+        if value is None or value is MISSING:
+            self.present |= value is None
+            self.valid.append(0)
+        else:
+            self.heap.write(value.encode("utf-8"))
+            self.valid.append(1)
+            self.present = True
+        self.offsets.append(self.heap.tell())
+
+    def close(self):
+        self.heap.close()
+        np.save(self.directory / f"{self.name}.offsets.npy", np.frombuffer(self.offsets, dtype=np.uint64))
+        np.save(self.directory / f"{self.name}.valid.npy", np.frombuffer(self.valid, dtype=np.bool_))
+
+    def discard(self):
+        for suffix in (".heap", ".offsets.npy", ".valid.npy"):
+            (self.directory / f"{self.name}{suffix}").unlink()
+
+class _IntColumnWriter:
+    """整数列：值写入 <列>.npy；没有值的行写 0，记在 valid 中"""
+    def __init__(self, directory, name, dtype):
+        self.directory = directory
+        self.name = name
+        self.dtype = dtype
+        self.values = array('q')
+        self.valid = bytearray()
+        self.present = False
+
+    def append(self, value):
+        if value is None or value is MISSING:
+            self.present |= value is None
+            self.values.append(0)
+            self.valid.append(0)
+        else:
+            self.values.append(value)
+            self.valid.append(1)
+            self.present = True
+
+    def close(self):
+        np.save(self.directory / f"{self.name}.npy", np.frombuffer(self.values, dtype=np.int64).astype(self.dtype))
+        np.save(self.directory / f"{self.name}.valid.npy", np.frombuffer(self.valid, dtype=np.bool_))
+
+    def discard(self):
+        for suffix in (".npy", ".valid.npy"):
+            (self.directory / f"{self.name}{suffix}").unlink()
+
+def write_columnar(records, path, columns=SPLITS_COLUMNS, source=None):
+    """把记录流写为列式目录，返回行数
+
+    先写到 <目录>.tmp，完成后再替换旧目录，中途失败不会留下半个数据集。
+    所有记录都没有的字段（getter 总是返回 MISSING）不写出，也不出现在 meta.json 的 columns 中。
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    writers = {}
+    for name, (kind, _) in columns.items():
+        writers[name] = _StringColumnWriter(tmp, name) if kind == "str" else _IntColumnWriter(tmp, name, kind)
+    getters = [(writers[name], getter) for name, (_, getter) in columns.items()]
+    rows = 0
+    for record in records:
+        for writer, getter in getters:
+            writer.append(getter(record))
+        rows += 1
+    schema = {}
+    for name, (kind, _) in columns.items():
+        writers[name].close()
+        if writers[name].present:
+            schema[name] = kind
+        else:
+            writers[name].discard()
+    missing = [name for name in columns if name not in schema]
+    if missing and rows:
+        logger.info(f"数据集中没有这些字段，不导出: {', '.join(missing)}")
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"format": FORMAT_NAME, "version": FORMAT_VERSION, "rows": rows, "source": source,
+                   "columns": schema},
+                  f, ensure_ascii=False, indent=2)
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    return rows
+
+def export_jsonl(jsonl_file, path, columns=SPLITS_COLUMNS):
+    """把 datawash/标注输出的 JSONL 数据集导出为列式目录"""
+    start = time.perf_counter()
+    def records():
+        with open(jsonl_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+    rows = write_columnar(records(), path, columns, source=str(jsonl_file))
+    logger.info(f"列式导出完成: {rows} 行 → {path} ({time.perf_counter() - start:.1f}s)")
+    return rows
+
+# === 读取 ===
+class StringColumn:
+    """内存映射的字符串列；raw(i) 返回堆上的 memoryview，不复制"""
+    def __init__(self, directory, name):
+        self.offsets = np.load(directory / f"{name}.offsets.npy", mmap_mode="r")
+        self.valid = np.load(directory / f"{name}.valid.npy", mmap_mode="r")
+        heap_path = directory / f"{name}.heap"
+        self._file = open(heap_path, "rb")
+        if os.path.getsize(heap_path):
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.heap = memoryview(self._mmap)
+        else:
+            self._mmap = None
+            self.heap = memoryview(b"")
+
+    def __len__(self):
+        return len(self.valid)
+
+    def raw(self, i):
+        return self.heap[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def __getitem__(self, i):
+        if not self.valid[i]:
+            return None
+        return str(self.raw(i), "utf-8")
+
+    def take(self, rows):
+        """按行号列表批量取值"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows].tolist()
+        ends = self.offsets[rows + 1].tolist()
+        valid = self.valid[rows].tolist()
+        heap = self.heap
+        return [str(heap[s:e], "utf-8") if v else None for s, e, v in zip(starts, ends, valid)]
+
+    def __iter__(self):
+        chunk = 65536
+        for begin in range(0, len(self), chunk):
+            yield from self.take(np.arange(begin, min(begin + chunk, len(self))))
+
+    def byte_lengths(self):
+        """每行的 UTF-8 字节数（向量化，不解码）"""
+        return np.diff(self.offsets)
+
+    def close(self):
+        self.heap.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+class ColumnarDataset:
+    """列式数据集：只打开用到的列，按行号随机访问
+
+    字符串列见 StringColumn；整数列是内存映射的 numpy 数组（缺失的行为 0，用 valid 区分）。
+    row/rows 中缺失的值为 None。
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_NAME or self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"不是可识别的列式数据集: {self.path}")
+        self.schema = self.meta["columns"]
+        self._columns = {}
+        self._valid = {}
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def column(self, name):
+        if name not in self._columns:
+            if name not in self.schema:
+                raise KeyError(f"数据集中没有列 {name}（可用: {', '.join(self.schema)}）")
+            if self.schema[name] == "str":
+                self._columns[name] = StringColumn(self.path, name)
+            else:
+                self._columns[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        return self._columns[name]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def valid(self, name):
+        """name 列每行是否有值（bool 数组）；早先导出的整数列没有 valid 文件，视为全部有值"""
+        col = self.column(name)
+        if isinstance(col, StringColumn):
+            return col.valid
+        if name not in self._valid:
+            path = self.path / f"{name}.valid.npy"
+            self._valid[name] = np.load(path, mmap_mode="r") if path.exists() else np.ones(len(col), dtype=bool)
+        return self._valid[name]
+
+    def row(self, i, columns=None):
+        """第 i 行的字典，只包含 columns 指定的列（默认全部）"""
+        result = {}
+        for name in columns or self.schema:
+            col = self.column(name)
+            if isinstance(col, StringColumn):
+                result[name] = col[i]
+            else:
+                result[name] = col[i].item() if self.valid(name)[i] else None
+        return result
+
+    def rows(self, indices, columns=None):
+        """批量取多行，返回字典列表"""
+        indices = np.asarray(indices, dtype=np.int64)
+        values = {}
+        for name in columns or self.schema:
+            col = self.column(name)
+            if isinstance(col, StringColumn):
+                values[name] = col.take(indices)
+            else:
+                values[name] = [value if ok else None
+                                for value, ok in zip(col[indices].tolist(), self.valid(name)[indices].tolist())]
+        return [dict(zip(values, row)) for row in zip(*values.values())]
+
+    def close(self):
+        for col in self._columns.values():
+            if isinstance(col, StringColumn):
+                col.close()
+        self._columns.clear()
+        self._valid.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSONL 数据集 ↔ 列式内存映射格式")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="把 JSONL 数据集导出为列式目录")
+    p.add_argument("jsonl")
+    p.add_argument("path")
+    p = sub.add_parser("show", help="按行号打印记录")
+    p.add_argument("path")
+    p.add_argument("rows", type=int, nargs="+")
+    p.add_argument("--columns", default=None, help="逗号分隔的列名")
+    p = sub.add_parser("info", help="行数与各列大小")
+    p.add_argument("path")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "export":
+        export_jsonl(args.jsonl, args.path)
+    elif args.command == "show":
+        with ColumnarDataset(args.path) as ds:
+            columns = args.columns.split(",") if args.columns else None
+            for i in args.rows:
+                print(json.dumps(ds.row(i, columns), ensure_ascii=False))
+    else:
+        with ColumnarDataset(args.path) as ds:
+            print(f"行数: {len(ds)}  来源: {ds.meta.get('source')}")
+            for name, kind in ds.schema.items():
+                size = sum(p.stat().st_size for p in Path(args.path).glob(f"{name}.*"))
+                print(f"  {name:<12} {kind:<6} {size / 1024**2:8.1f} MB")
@@ -1,30 +1,50 @@
 import requests
 from bs4 import BeautifulSoup
-import json
-import re
 import random
 import time
 import logging
 import os
+import argparse
+from functools import partial
 from pathlib import Path
 
+from async_fetch import fetch_pages
+from block_jsonl import compressed_path, log_file_handler, open_jsonl
+from wiki_api import build_records, iter_math_wiki_api
+from frontier import CrawlFrontier
+from http_cache import HttpCache, mount_cache
+from extractors import EXTRACTORS, get_extractor
+from pipeline import CrawlPipeline
+from record_sink import JsonlSink
+from arxiv_harvest import ArxivHarvester
+from latex_scan import scan_formulas
+from raw_format import arxiv_record
+from records import dumps_line
+from rate_control import RateController, mount_rate_limit
+
 # === 配置输出路径 ===
 PROJECT_ROOT = Path("E:/Qwen_V2.5_CHN2LaTeX")
 DATA_DIR = PROJECT_ROOT / "data"
 RAW_DATA_FILE = DATA_DIR / "raw\\raw_data.jsonl"
 LOG_FILE = DATA_DIR / "processeed\\crawler.log"
+FRONTIER_DB = DATA_DIR / "processeed\\crawl_frontier.sqlite3"
+HTTP_CACHE_DB = DATA_DIR / "processeed\\http_cache.sqlite3"
+ARXIV_STATE_FILE = DATA_DIR / "processeed\\arxiv_state.json"
 
 # 确保目录存在
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 # === 配置日志系统 ===
-def setup_logger():
-    """配置日志系统，同时输出到文件和终端"""
+def setup_logger(log_file=LOG_FILE):
+    """配置日志系统，同时输出到文件和终端；重复调用时替换原有的处理器"""
     logger = logging.getLogger("crawler")
     logger.setLevel(logging.INFO)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
     
-    # 文件处理器（追加模式）
-    file_handler = logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8')
+    # 文件处理器（追加模式，*.gz 为块压缩格式）
+    file_handler = log_file_handler(log_file)
     file_handler.setLevel(logging.INFO)
     
     # 控制台处理器
@@ -44,29 +64,72 @@ def setup_logger():
 
 logger = setup_logger()
 
+# === 页面解析 ===
+WIKI_BASE_URL = "https://zh.wikipedia.org"
+WIKI_CATEGORY_PATH = "/wiki/Category:数学公式"
+
+def parse_category_links(html, base_url, visited):
+    """从分类页面中提取公式页面链接"""
+    soup = BeautifulSoup(html, 'html.parser')
+    category_links = []
+    for li in soup.select("#mw-pages li a"):
+        href = li.get('href')
+        if href and href.startswith("/wiki/") and href not in visited:
+            category_links.append(base_url + href)
+            visited.add(href)
+    return category_links
+
+def parse_wiki_page(html, url, extractor=None):
+    """解析单个维基百科页面，返回 (公式记录列表, 公式个数)"""
+    title, formulas = (extractor or get_extractor())(html)
+    
+    # 创建中文描述变体
+    records = build_records(title, formulas, url)
+    found_count = len(formulas)
+    return records, found_count
+
+def skip_finished(links, frontier):
+    """登记新发现的页面，并跳过前沿中已经完成的页面"""
+    if frontier is None:
+        return links
+    new_count = frontier.add(links)
+    remaining = frontier.filter(links)
+    logger.info(f"前沿新增 {new_count} 个页面，跳过 {len(links) - len(remaining)} 个已完成页面")
+    return remaining
+
+def build_session(cache=None, offline=False, controller=None):
+    """创建会话：按需挂载HTTP缓存与自适应限速"""
+    session = requests.Session()
+    if cache:
+        return mount_cache(session, cache, offline=offline, controller=controller)
+    if controller:
+        return mount_rate_limit(session, controller)
+    return session
+
 # === 爬虫函数 ==
-def crawl_math_wiki(max_pages=20):
-    """从数学维基百科爬取公式数据"""
-    base_url = "https://zh.wikipedia.org"
-    start_url = base_url + "/wiki/Category:数学公式"
+def iter_math_wiki(max_pages=20, base_url=WIKI_BASE_URL, delay=(0, 2), frontier=None, session=None,
+                   extractor=None):
+    """从数学维基百科爬取公式数据
+
+    生成器，每个页面产出一个记录列表；调用方写入后才在前沿中标记完成，
+    写入前崩溃的页面下次运行会重新抓取。
+    """
+    start_url = base_url + WIKI_CATEGORY_PATH
+    http = session or requests
     
-    data = []
+    total = 0
     visited = set()
     
     logger.info(f"开始爬取维基百科数学公式，目标页面数: {max_pages}")
     
     # 获取分类页面
     try:
-        response = requests.get(start_url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        response = http.get(start_url)
         
         # 获取分类中的页面链接
-        category_links = []
-        for li in soup.select("#mw-pages li a"):
-            href = li.get('href')
-            if href and href.startswith("/wiki/") and href not in visited:
-                category_links.append(base_url + href)
-                visited.add(href)
+        category_links = parse_category_links(response.text, base_url, visited)
+        
+        category_links = skip_finished(category_links, frontier)
         
         # 随机选择页面进行爬取
         random.shuffle(category_links)
@@ -75,48 +138,113 @@ def crawl_math_wiki(max_pages=20):
         for i, url in enumerate(category_links[:max_pages]):
             logger.info(f"爬取页面 {i+1}/{max_pages}: {url}")
             try:
-                response = requests.get(url)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # 提取页面标题作为公式描述
-                title = soup.find('h1', {'id': 'firstHeading'}).text.strip()
-                
-                # 提取所有LaTeX公式
-                math_elements = soup.find_all('span', {'class': 'mwe-math-element'})
-                found_count = 0
-                for elem in math_elements:
-                    mathml = elem.find('span', {'class': 'mwe-math-mathml-inline'})
-                    if mathml:
-                        latex = mathml.get('alttext', '').replace('\\displaystyle ', '')
-                        if latex:
-                            # 创建中文描述变体
-                            variants = [
-                                f"{title}的公式",
-                                f"{title}的数学表达式",
-                                f"如何用LaTeX表示{title}",
-                                f"{title}的标准写法"
-                            ]
-                            
-                            for desc in variants:
-                                data.append({
-                                    "chinese": desc,
-                                    "latex": latex,
-                                    "source": url
-                                })
-                            found_count += 1
-                
-                logger.info(f"在页面中找到 {found_count} 个公式")
-                time.sleep(random.uniform(0,2))  # 礼貌爬取
+                response = http.get(url)
+                records, found_count = parse_wiki_page(response.text, url, extractor)
             except Exception as e:
                 logger.error(f"爬取失败: {url} - {str(e)}")
+                if frontier:
+                    frontier.mark_failed(url, e)
+                continue
+            
+            logger.info(f"在页面中找到 {found_count} 个公式")
+            yield records
+            total += len(records)
+            if frontier:
+                frontier.mark_done(url, found_count)
+            if delay:
+                time.sleep(random.uniform(*delay))  # 礼貌爬取（使用自适应限速会话时传 delay=None）
     
     except Exception as e:
         logger.error(f"初始化爬取失败: {str(e)}")
     
-    logger.info(f"维基百科爬取完成，共获取 {len(data)} 条公式数据")
-    return data
+    logger.info(f"维基百科爬取完成，共获取 {total} 条公式数据")
+
+def crawl_math_wiki(*args, **kwargs):
+    """iter_math_wiki 的列表版本（页面在返回前就已标记完成，带前沿爬取时应把生成器直接写入 sink）"""
+    return [record for records in iter_math_wiki(*args, **kwargs) for record in records]
 
-def crawl_arxiv_abstracts(max_results=50):
+def iter_math_wiki_async(max_pages=20, base_url=WIKI_BASE_URL, concurrency=16, per_host_limit=4,
+                         frontier=None, extractor=None, rate_controller=None):
+    """iter_math_wiki 的异步版本：复用长连接并发抓取，输出记录与顺序版一致
+
+    同样逐页产出记录，调用方写入后才在前沿中标记完成。
+    """
+    start_url = base_url + WIKI_CATEGORY_PATH
+    
+    total = 0
+    visited = set()
+    
+    logger.info(f"开始异步爬取维基百科数学公式，目标页面数: {max_pages}，"
+                f"并发: {concurrency}，单主机并发: {per_host_limit}")
+    
+    try:
+        [(_, html, error)] = fetch_pages([start_url], concurrency, per_host_limit,
+                                         rate_controller=rate_controller)
+        if error:
+            raise error
+        
+        category_links = parse_category_links(html, base_url, visited)
+        category_links = skip_finished(category_links, frontier)
+        random.shuffle(category_links)
+        logger.info(f"找到 {len(category_links)} 个相关页面")
+        
+        # 并发抓取，按原顺序解析，保证与顺序版输出一致
+        results = fetch_pages(category_links[:max_pages], concurrency, per_host_limit,
+                              rate_controller=rate_controller)
+        for url, html, error in results:
+            if error:
+                logger.error(f"爬取失败: {url} - {str(error)}")
+                if frontier:
+                    frontier.mark_failed(url, error)
+                continue
+            try:
+                records, found_count = parse_wiki_page(html, url, extractor)
+            except Exception as e:
+                logger.error(f"解析失败: {url} - {str(e)}")
+                if frontier:
+                    frontier.mark_failed(url, e)
+                continue
+            logger.info(f"在页面 {url} 中找到 {found_count} 个公式")
+            yield records
+            total += len(records)
+            if frontier:
+                frontier.mark_done(url, found_count)
+    
+    except Exception as e:
+        logger.error(f"初始化爬取失败: {str(e)}")
+    
+    logger.info(f"维基百科爬取完成，共获取 {total} 条公式数据")
+
+def crawl_math_wiki_async(*args, **kwargs):
+    """iter_math_wiki_async 的列表版本"""
+    return [record for records in iter_math_wiki_async(*args, **kwargs) for record in records]
+
+def crawl_math_wiki_pipeline(sink, max_pages=20, base_url=WIKI_BASE_URL, fetch_workers=8,
+                             parse_workers=None, queue_depth=64, extractor="auto", frontier=None,
+                             session_factory=requests.Session):
+    """流水线版本：抓取线程与解析进程池解耦，记录由单一写入者直接写入 sink"""
+    start_url = base_url + WIKI_CATEGORY_PATH
+    visited = set()
+    
+    logger.info(f"开始以流水线方式爬取维基百科数学公式，目标页面数: {max_pages}，"
+                f"抓取线程: {fetch_workers}，解析进程: {parse_workers or os.cpu_count()}，队列深度: {queue_depth}")
+    
+    try:
+        response = session_factory().get(start_url)
+        category_links = parse_category_links(response.text, base_url, visited)
+        category_links = skip_finished(category_links, frontier)
+        random.shuffle(category_links)
+        logger.info(f"找到 {len(category_links)} 个相关页面")
+        
+        pipeline = CrawlPipeline(sink, fetch_workers=fetch_workers, parse_workers=parse_workers,
+                                 queue_depth=queue_depth, extractor=extractor, frontier=frontier,
+                                 session_factory=session_factory)
+        return pipeline.run(category_links[:max_pages])
+    except Exception as e:
+        logger.error(f"初始化爬取失败: {str(e)}")
+        return 0
+
+def crawl_arxiv_abstracts(max_results=50, session=None):
     
     """从arXiv爬取论文摘要中的公式"""
     url = "http://export.arxiv.org/api/query"
@@ -132,7 +260,7 @@ def crawl_arxiv_abstracts(max_results=50):
     logger.info(f"开始爬取arXiv论文摘要，目标结果数: {max_results}")
     
     try:
-        response = requests.get(url, params=params)
+        response = (session or requests).get(url, params=params)
         soup = BeautifulSoup(response.content, 'xml')
         
         entries = soup.find_all('entry')
@@ -143,25 +271,19 @@ def crawl_arxiv_abstracts(max_results=50):
                 abstract = entry.find('summary').text.strip()
                 
                 # 提取中文描述和公式
-                latex_pattern = r'\$(.*?)\$'
-                formulas = re.findall(latex_pattern, abstract)
+                # 单遍扫描 $…$、$$…$$、\(…\)、\[…\]，正确处理 \$ 转义
+                formulas = scan_formulas(abstract)
                 
                 if formulas:
                     title = entry.find('title').text.strip()
-                    # 创建中文描述
-                    desc = f"论文《{title}[](@replace=10001)》中的公式"
-                    
+                    # 中文描述由模板在导出时生成（见 raw_format）
                     valid_formulas = 0
                     for formula in formulas:
                         if len(formula) > 10:  # 过滤简单公式
-                            data.append({
-                                "chinese": desc,
-                                "latex": formula,
-                                "source": "arXiv"
-                            })
+                            data.append(arxiv_record(title, formula))
                             valid_formulas += 1
                     
-                    logger.info(f"在论文《{title[:20]}...[](@replace=10002)》中找到 {valid_formulas} 个有效公式")
+                    logger.info(f"在论文《{title[:20]}...》中找到 {valid_formulas} 个有效公式")
             except Exception as e:
                 logger.warning(f"处理论文时出错: {str(e)}")
     
@@ -174,30 +296,115 @@ def crawl_arxiv_abstracts(max_results=50):
 def save_data(data, filename):
     """保存数据到JSONL文件（追加模式）"""
     try:
-        with open(filename, 'a', encoding='utf-8') as f:
+        with open_jsonl(filename, 'a') as f:
             for item in data:
-                json_line = json.dumps(item, ensure_ascii=False)
-                f.write(json_line + '\n')
+                f.write(dumps_line(item))
         logger.info(f"成功保存 {len(data)} 条数据到 {filename}")
     except Exception as e:
         logger.error(f"保存数据失败: {str(e)}")
 
 # === 主程序 ===
+def parse_args():
+    parser = argparse.ArgumentParser(description="维基百科/arXiv 数学公式爬虫")
+    parser.add_argument("--mode", choices=["sequential", "async", "api", "pipeline"], default="sequential",
+                        help="维基百科抓取方式：顺序抓取、异步并发抓取、MediaWiki API批量获取或抓取/解析流水线")
+    parser.add_argument("--max-pages", type=int, default=20)
+    parser.add_argument("--max-results", type=int, default=30)
+    parser.add_argument("--arxiv-categories", default=None,
+                        help="逗号分隔的arXiv分类（如 math.AP,math.PR），指定后并行增量采集")
+    parser.add_argument("--arxiv-batch", type=int, default=100, help="arXiv每次请求的论文数")
+    parser.add_argument("--arxiv-delay", type=float, default=3.0, help="同一分类相邻两次请求的间隔（秒）")
+    parser.add_argument("--arxiv-state", default=str(ARXIV_STATE_FILE), help="arXiv各分类高水位状态文件")
+    parser.add_argument("--concurrency", type=int, default=16, help="异步模式的全局在途请求上限")
+    parser.add_argument("--per-host", type=int, default=4, help="异步模式的单主机在途请求上限")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="流水线模式的抓取线程数")
+    parser.add_argument("--parse-workers", type=int, default=None, help="流水线模式的解析进程数（默认CPU核数）")
+    parser.add_argument("--queue-depth", type=int, default=64, help="流水线模式的队列深度")
+    parser.add_argument("--extractor", choices=["auto"] + list(EXTRACTORS), default="auto",
+                        help="页面解析后端：auto 优先使用 lxml")
+    parser.add_argument("--frontier", default=str(FRONTIER_DB), help="持久化爬取前沿数据库路径")
+    parser.add_argument("--no-frontier", action="store_true", help="不使用前沿，重新抓取所有页面")
+    parser.add_argument("--cache", default=str(HTTP_CACHE_DB), help="HTTP响应缓存数据库路径")
+    parser.add_argument("--no-cache", action="store_true", help="不使用HTTP响应缓存")
+    parser.add_argument("--cache-max-mb", type=float, default=2048, help="缓存容量上限（MB），超出后LRU淘汰")
+    parser.add_argument("--offline", action="store_true", help="只使用缓存内容，不访问网络")
+    parser.add_argument("--refresh-days", type=float, default=None,
+                        help="已完成页面超过该天数后重新抓取（默认永不刷新）")
+    parser.add_argument("--rate", type=float, default=2.0, help="每个主机的初始请求速率（次/秒），随后自适应调整")
+    parser.add_argument("--max-rate", type=float, default=20.0, help="每个主机的请求速率上限（次/秒）")
+    parser.add_argument("--fixed-delay", action="store_true",
+                        help="关闭自适应限速，顺序模式改用每页随机等待0-2秒")
+    parser.add_argument("--compress", action="store_true",
+                        help="原始数据与日志使用块压缩格式（*.gz，可用 zcat 查看，见 block_jsonl）")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.compress:
+        RAW_DATA_FILE = compressed_path(RAW_DATA_FILE)
+        LOG_FILE = compressed_path(LOG_FILE)
+        logger = setup_logger(LOG_FILE)
     logger.info("="*50)
     logger.info("爬虫程序启动")
     logger.info(f"数据将保存到: {RAW_DATA_FILE}")
     logger.info(f"日志将保存到: {LOG_FILE}")
     
-    # 爬取数据
-    wiki_data = crawl_math_wiki(max_pages=20)
-    arxiv_data = crawl_arxiv_abstracts(max_results=30)
+    frontier = None
+    if not args.no_frontier:
+        refresh_after = args.refresh_days * 86400 if args.refresh_days is not None else None
+        frontier = CrawlFrontier(args.frontier, refresh_after=refresh_after)
+        logger.info(f"爬取前沿: {args.frontier} {frontier.stats()}")
+    
+    cache = None
+    if not args.no_cache:
+        cache = HttpCache(args.cache, max_bytes=int(args.cache_max_mb * 1024**2))
+    controller = None
+    if not args.fixed_delay:
+        controller = RateController(rate=args.rate, max_rate=args.max_rate)
+    session = build_session(cache, args.offline, controller)
+    delay = (0, 2) if args.fixed_delay else None
+    
+    # 爬取数据：边爬边写入原始数据文件。前沿与 arXiv 高水位都在记录写入之后才推进，
+    # 中途崩溃时已写入的记录不丢，未写入的页面/论文下次运行会重新获取
+    with JsonlSink(RAW_DATA_FILE) as sink:
+        if args.mode == "async":
+            sink.consume(iter_math_wiki_async(max_pages=args.max_pages,
+                                              concurrency=args.concurrency,
+                                              per_host_limit=args.per_host,
+                                              frontier=frontier,
+                                              extractor=get_extractor(args.extractor),
+                                              rate_controller=controller))
+        elif args.mode == "pipeline":
+            crawl_math_wiki_pipeline(sink, max_pages=args.max_pages,
+                                     fetch_workers=args.fetch_workers,
+                                     parse_workers=args.parse_workers,
+                                     queue_depth=args.queue_depth,
+                                     extractor=args.extractor,
+                                     frontier=frontier,
+                                     session_factory=partial(build_session, cache, args.offline, controller))
+        elif args.mode == "api":
+            sink.consume(iter_math_wiki_api(WIKI_BASE_URL, max_pages=args.max_pages, session=session,
+                                            frontier=frontier))
+        else:
+            sink.consume(iter_math_wiki(max_pages=args.max_pages, delay=delay, frontier=frontier, session=session,
+                                        extractor=get_extractor(args.extractor)))
+        if args.arxiv_categories:
+            harvester = ArxivHarvester(args.arxiv_state,
+                                       categories=args.arxiv_categories.split(","),
+                                       batch_size=args.arxiv_batch,
+                                       delay=args.arxiv_delay,
+                                       max_per_category=args.max_results,
+                                       session_factory=partial(build_session, controller=controller))
+            sink.consume(harvester.iter_batches())
+        else:
+            sink.write_batch(crawl_arxiv_abstracts(max_results=args.max_results, session=session))
     
-    all_data = wiki_data + arxiv_data
-    logger.info(f"共爬取 {len(all_data)} 条公式数据")
+    if cache:
+        logger.info(cache.summary())
+    if controller:
+        logger.info(controller.summary())
     
-    # 保存原始数据
-    save_data(all_data, RAW_DATA_FILE)
+    logger.info(f"共爬取 {sink.records} 条公式数据")
     
     logger.info("爬虫程序执行完毕")
     logger.info("="*50)
\ No newline at end of file
@@ -1,45 +1,86 @@
 import requests
 from bs4 import BeautifulSoup
-import json
-import re
 import time
 import random
 import logging
+import argparse
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-# 配置日志系统
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('crawler.log'),
-        logging.StreamHandler()
-    ]
-)
+from block_jsonl import compressed_path, log_file_handler, open_jsonl
+from wiki_api import build_records, iter_math_wiki_api
+from frontier import CrawlFrontier
+from http_cache import CachingAdapter, HttpCache
+from record_sink import JsonlSink
+from extractors import EXTRACTORS, get_extractor
+from arxiv_harvest import ArxivHarvester
+from latex_scan import scan_formulas
+from raw_format import arxiv_record
+from records import dumps_line
+from rate_control import RateController, RateLimitedAdapter
+
+FRONTIER_DB = "crawl_frontier.sqlite3"
+HTTP_CACHE_DB = "http_cache.sqlite3"
+ARXIV_STATE_FILE = "arxiv_state.json"
+LOG_FILE = "crawler.log"
+
+# 全局HTTP缓存与自适应限速控制器，在主程序中按参数初始化
+http_cache = None
+offline_mode = False
+rate_controller = None
+
+# 配置日志系统；重复调用时替换原有的处理器（*.gz 日志为块压缩格式）
+def setup_logging(log_file=LOG_FILE):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            log_file_handler(log_file),
+            logging.StreamHandler()
+        ],
+        force=True
+    )
+
+setup_logging()
 
 # ==== 高亮改进1：创建带重试机制的会话 ====
 def create_retry_session(retries=5, backoff_factor=0.3):
     session = requests.Session()
+    # 启用限速时，429/5xx 由限速适配器降速后重发，Retry 只负责连接错误
     retry = Retry(
         total=retries,
         backoff_factor=backoff_factor,
-        status_forcelist=[500, 502, 503, 504]
+        status_forcelist=[] if rate_controller else [500, 502, 503, 504]
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    # 启用缓存时使用带条件请求的缓存适配器
+    if http_cache is not None:
+        adapter = CachingAdapter(http_cache, offline=offline_mode, controller=rate_controller,
+                                 throttle_retries=retries, max_retries=retry)
+    elif rate_controller is not None:
+        adapter = RateLimitedAdapter(rate_controller, throttle_retries=retries, max_retries=retry)
+    else:
+        adapter = HTTPAdapter(max_retries=retry)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
 # ==== 高亮改进2：移除max_pages参数，实现无限爬取 ====
-def crawl_math_wiki():
-    """从数学维基百科爬取公式数据（无限制）"""
+def crawl_math_wiki(use_api=False, frontier=None, extractor="auto"):
+    """从数学维基百科爬取公式数据（无限制）
+
+    生成器：每个页面产出一个记录列表，由调用方流式写入，内存不随爬取量增长。
+    """
     base_url = "https://zh.wikipedia.org"
     start_url = base_url + "/wiki/Category:数学公式"
     
-    data = []
+    # API模式：按续传令牌枚举分类，每次请求批量获取多个页面的 wikitext
+    if use_api:
+        yield from iter_math_wiki_api(base_url, session=create_retry_session(), frontier=frontier)
+        return
+    
     visited = set()
     session = create_retry_session()  # 使用重试会话
+    extract = get_extractor(extractor)  # 页面解析后端，只提取标题和公式
     
     # ==== 高亮改进3：处理分页逻辑 ====
     next_page_url = start_url
@@ -54,38 +95,29 @@ def crawl_math_wiki():
                 if href and href.startswith("/wiki/") and href not in visited:
                     page_url = base_url + href
                     visited.add(href)
+                    # 跨运行去重：前沿中已完成的页面直接跳过
+                    if frontier:
+                        frontier.add([page_url])
+                        if not frontier.should_fetch(page_url):
+                            continue
                     try:
                         page_response = session.get(page_url)
-                        page_soup = BeautifulSoup(page_response.text, 'html.parser')
+                        title, formulas = extract(page_response.text)
                         
-                        # 提取页面标题
-                        title = page_soup.find('h1', {'id': 'firstHeading'}).text.strip()
+                        page_records = build_records(title, formulas, page_url)
                         
-                        # 提取所有LaTeX公式
-                        math_elements = page_soup.find_all('span', {'class': 'mwe-math-element'})
-                        for elem in math_elements:
-                            mathml = elem.find('span', {'class': 'mwe-math-mathml-inline'})
-                            if mathml:
-                                latex = mathml.get('alttext', '').replace('\\displaystyle ', '')
-                                if latex:
-                                    variants = [
-                                        f"{title}的公式",
-                                        f"{title}的数学表达式",
-                                        f"如何用LaTeX表示{title}",
-                                        f"{title}的标准写法"
-                                    ]
-                                    for desc in variants:
-                                        data.append({
-                                            "chinese": desc,
-                                            "latex": latex,
-                                            "source": page_url
-                                        })
+                        # 先交给调用方写入，再标记完成，保证崩溃后该页会被重爬
+                        yield page_records
+                        if frontier:
+                            frontier.mark_done(page_url)
                         
                         # ==== 高亮改进4：随机延迟防止被封 ====
                         #time.sleep(random.uniform(1, 3))  # 随机延迟1-3秒
                         
                     except Exception as e:
                         logging.error(f"页面爬取失败: {page_url} - {str(e)}")
+                        if frontier:
+                            frontier.mark_failed(page_url, e)
             
             # ==== 高亮改进5：查找下一页链接 ====
             next_link = soup.find('a', text='下一页')
@@ -94,14 +126,14 @@ def crawl_math_wiki():
         except Exception as e:
             logging.error(f"分类页面爬取失败: {next_page_url} - {str(e)}")
             next_page_url = None
-    
-    return data
 
 # ==== 高亮改进6：arXiv爬取无限制 ====
 def crawl_arxiv_abstracts():
-    """从arXiv爬取论文摘要中的公式（无限制）"""
+    """从arXiv爬取论文摘要中的公式（无限制）
+
+    生成器：每个API分页产出一个记录列表。
+    """
     url = "http://export.arxiv.org/api/query"
-    data = []
     session = create_retry_session()
     
     start = 0
@@ -125,27 +157,23 @@ def crawl_arxiv_abstracts():
             if not entries:
                 has_more = False
                 continue
-                
+            
+            batch_records = []
             for entry in entries:
                 try:
                     abstract = entry.find('summary').text.strip()
-                    latex_pattern = r'\$(.*?)\$'
-                    formulas = re.findall(latex_pattern, abstract)
+                    # 单遍扫描 $…$、$$…$$、\(…\)、\[…\]，正确处理 \$ 转义
+                    formulas = scan_formulas(abstract)
                     
                     if formulas:
                         title = entry.find('title').text.strip()
-                        desc = f"论文《{title}[](@replace=10001)》中的公式"
-                        
                         for formula in formulas:
                             if len(formula) > 10:
-                                data.append({
-                                    "chinese": desc,
-                                    "latex": formula,
-                                    "source": "arXiv"
-                                })
+                                batch_records.append(arxiv_record(title, formula))
                 except Exception:
                     continue
             
+            yield batch_records
             start += batch_size
             # ==== 高亮改进7：API请求延迟 ====
             # time.sleep(random.uniform(2, 5))  # 随机延迟2-5秒
@@ -153,23 +181,71 @@ def crawl_arxiv_abstracts():
         except Exception as e:
             logging.error(f"arXiv API请求失败: {str(e)}")
             has_more = False
-    
-    return data
 
 # 保存数据函数保持不变
 def save_data(data, filename):
-    with open(filename, 'a', encoding='utf-8') as f:
+    with open_jsonl(filename, 'a') as f:
         for item in data:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+            f.write(dumps_line(item))
 
 if __name__ == "__main__":
-    # 爬取数据（无限制）
-    wiki_data = crawl_math_wiki()
-    arxiv_data = crawl_arxiv_abstracts()
+    parser = argparse.ArgumentParser(description="无限制爬取维基百科/arXiv 数学公式")
+    parser.add_argument("--wiki-mode", choices=["html", "api"], default="html",
+                        help="维基百科抓取方式：逐页解析HTML或MediaWiki API批量获取")
+    parser.add_argument("--extractor", choices=["auto"] + list(EXTRACTORS), default="auto",
+                        help="页面解析后端：auto 优先使用 lxml")
+    parser.add_argument("--frontier", default=FRONTIER_DB, help="持久化爬取前沿数据库路径")
+    parser.add_argument("--refresh-days", type=float, default=None,
+                        help="已完成页面超过该天数后重新抓取（默认永不刷新）")
+    parser.add_argument("--cache", default=HTTP_CACHE_DB, help="HTTP响应缓存数据库路径")
+    parser.add_argument("--no-cache", action="store_true", help="不使用HTTP响应缓存")
+    parser.add_argument("--cache-max-mb", type=float, default=2048, help="缓存容量上限（MB），超出后LRU淘汰")
+    parser.add_argument("--offline", action="store_true", help="只使用缓存内容，不访问网络")
+    parser.add_argument("--arxiv-categories", default=None,
+                        help="逗号分隔的arXiv分类，指定后并行增量采集（只获取上次运行之后的新论文）")
+    parser.add_argument("--arxiv-batch", type=int, default=100, help="arXiv每次请求的论文数")
+    parser.add_argument("--arxiv-delay", type=float, default=3.0, help="同一分类相邻两次请求的间隔（秒）")
+    parser.add_argument("--arxiv-state", default=ARXIV_STATE_FILE, help="arXiv各分类高水位状态文件")
+    parser.add_argument("--rate", type=float, default=2.0, help="每个主机的初始请求速率（次/秒），随后自适应调整")
+    parser.add_argument("--max-rate", type=float, default=20.0, help="每个主机的请求速率上限（次/秒）")
+    parser.add_argument("--no-rate-limit", action="store_true", help="关闭自适应限速（不等待，容易被封）")
+    parser.add_argument("--output", default="raw_data.jsonl", help="原始数据输出文件（以 .gz 结尾时为块压缩格式）")
+    parser.add_argument("--rotate-mb", type=float, default=None, help="输出文件超过该大小（MB）后轮转")
+    parser.add_argument("--fsync-interval", type=float, default=5.0, help="两次 fsync 之间的最长间隔（秒）")
+    parser.add_argument("--compress", action="store_true",
+                        help="输出文件与日志使用块压缩格式（*.gz，可用 zcat 查看，见 block_jsonl）")
+    args = parser.parse_args()
+    if args.compress:
+        args.output = compressed_path(args.output)
+        setup_logging(compressed_path(LOG_FILE))
+    
+    if not args.no_cache:
+        http_cache = HttpCache(args.cache, max_bytes=int(args.cache_max_mb * 1024**2))
+        offline_mode = args.offline
+    if not args.no_rate_limit:
+        rate_controller = RateController(rate=args.rate, max_rate=args.max_rate)
+    
+    refresh_after = args.refresh_days * 86400 if args.refresh_days is not None else None
+    frontier = CrawlFrontier(args.frontier, refresh_after=refresh_after)
     
-    all_data = wiki_data + arxiv_data
-    print(f"共爬取 {len(all_data)} 条公式数据")
+    # 爬取数据（无限制），边爬边写入
+    max_bytes = int(args.rotate_mb * 1024**2) if args.rotate_mb else None
+    with JsonlSink(args.output, max_bytes=max_bytes, fsync_interval=args.fsync_interval) as sink:
+        sink.consume(crawl_math_wiki(use_api=args.wiki_mode == "api", frontier=frontier,
+                                     extractor=args.extractor))
+        if args.arxiv_categories:
+            harvester = ArxivHarvester(args.arxiv_state,
+                                       categories=args.arxiv_categories.split(","),
+                                       batch_size=args.arxiv_batch,
+                                       delay=args.arxiv_delay,
+                                       session_factory=create_retry_session)
+            sink.consume(harvester.iter_batches())
+        else:
+            sink.consume(crawl_arxiv_abstracts())
     
-    # 保存原始数据
-    save_data(all_data, "raw_data.jsonl")
-    print("原始数据已保存到 raw_data.jsonl")
\ No newline at end of file
+    print(f"共爬取 {sink.records} 条公式数据")
+    if http_cache is not None:
+        print(http_cache.summary())
+    if rate_controller is not None:
+        print(rate_controller.summary())
+    print(f"原始数据已保存到 {args.output}")
\ No newline at end of file
@@ -3,8 +3,17 @@ from pathlib import Path
 import json
 import logging
 import hashlib
-from collections import defaultdict
-import uuid  # 导入 uuid 库用于生成唯一 ID
+import time
+import argparse
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from block_jsonl import BlockIndex, compressed_path, is_blocked, jsonl_size, open_jsonl, sync_file
+from hash_set import CompactHashSet
+from label_store import IdRegistry, formula_id, formula_key
+from latex_norm import NORMALIZER_VERSION, canonical_latex
+from records import RawRecord, RecordError, SplitRecord, dumps_line, loads
+from wash_index import WashIndex
 
 # ================== 配置参数 ==================
 PROJECT_ROOT = Path("E:/Qwen_V2.5_CHN2LaTeX")
@@ -14,6 +23,9 @@ DATAWASH_LOG_FILE = DATA_DIR / "processed/datawash.log"
 DATASPLITS_FILE = DATA_DIR / "splits/data_splits_NO_CHN.jsonl"
 ERROR_LOG_FILE = DATA_DIR / "splits/error_log.jsonl"
 DUPLICATE_LOG_FILE = DATA_DIR / "processed/duplicates.jsonl"
+WASH_INDEX_FILE = DATA_DIR / "processed/wash_index.sqlite3"
+NEAR_DUP_FILE = DATA_DIR / "processed/near_duplicates.jsonl"
+LABEL_STORE_FILE = DATA_DIR / "processed/labels.sqlite3"
 
 # ================== 日志系统优化 ==================
 class EnhancedLogger:
@@ -64,14 +76,14 @@ def save_data(data, filename):
         os.makedirs(os.path.dirname(filename), exist_ok=True)
         batch_size = 100  # 分批保存减少内存压力
         
-        with open(filename, 'a', encoding='utf-8') as f:
+        with open_jsonl(filename, 'a') as f:
             for i in range(0, len(data), batch_size):
                 batch = data[i:i + batch_size]
                 for item in batch:
-                    # 创建新的字典，排除"hash"字段
-                    item_to_save = {k: v for k, v in item.items() if k != "hash"}
-                    json_line = json.dumps(item_to_save, ensure_ascii=False)
-                    f.write(json_line + '\n')
+                    # 排除"hash"字段；只有带该字段的记录才需要复制
+                    if isinstance(item, dict) and "hash" in item:
+                        item = {k: v for k, v in item.items() if k != "hash"}
+                    f.write(dumps_line(item))
         
         logger.info(f"成功保存 {len(data)} 条数据到 {filename}")
         return True
@@ -79,6 +91,339 @@ def save_data(data, filename):
         logger.error(f"保存数据失败: {str(e)}", exc_info=True)
         return False
 
+def build_entry(latex_content, line_num, custom_id=None):
+    """创建规范化的数据结构（适配百炼 API 批处理格式，字段见 records.SplitRecord）"""
+    # custom_id 由规范化公式的摘要决定，重跑清洗时不变，批处理结果可以跨运行关联
+    if custom_id is None:
+        custom_id = formula_id(formula_key(canonical_latex(latex_content)))
+    return SplitRecord(custom_id, latex_content, source_line=line_num).to_dict()
+
+class JsonlWriter:
+    """长期打开的缓冲写入器：整个处理过程只打开一次文件，首次写入时才创建
+
+    文件名以 .gz 结尾时写块压缩格式（见 block_jsonl），sync 时切块落盘。
+    """
+    def __init__(self, filename, buffer_size=1024 * 1024):
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.file = None
+        self.count = 0
+    
+    def write(self, item):
+        """写入一条记录（字典或 records 中的记录对象）；与 save_data 一致，排除"hash"字段"""
+        if isinstance(item, dict) and "hash" in item:
+            item = {k: v for k, v in item.items() if k != "hash"}
+        self.write_line(dumps_line(item))
+    
+    def write_line(self, line):
+        """写入已序列化好的一行（并行模式由工作进程预先序列化）"""
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            self.file = open_jsonl(self.filename, 'a', buffering=self.buffer_size)
+        self.file.write(line)
+        self.count += 1
+    
+    def sync(self):
+        """刷新缓冲并落盘（增量模式提交水位线之前调用）"""
+        if self.file is not None:
+            sync_file(self.file)
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def process_raw_data_stream(raw_file=RAW_DATA_FILE, output_file=DATASPLITS_FILE,
+                            duplicate_file=DUPLICATE_LOG_FILE, error_file=ERROR_LOG_FILE,
+                            progress_lines=100000, index=None, commit_lines=100000, digest_bits=64,
+                            registry=None):
+    """流式处理原始数据：单遍读取，按字节偏移估算进度，内存占用只随唯一公式数增长
+    
+    与 process_raw_data 输出相同的记录，但重复项和错误项边处理边写出，不在内存中累积。
+    去重键为规范化公式（latex_norm.canonical_latex）的 128 位 blake2b 摘要，在紧凑的
+    开放寻址表中保存其低 digest_bits 位（每条约 12 字节）；输出的仍是首次出现时的原始写法。
+    custom_id 由同一摘要得到；传入 registry（IdRegistry）时登记并检查 id 冲突。
+    传入 index（WashIndex）时为增量模式：从上次的水位线继续，只输出从未见过的公式，
+    每 commit_lines 行落盘并提交一次水位线。
+    返回统计字典 {"lines", "unique", "duplicates", "errors", "error_types"}。
+    """
+    logger.info("="*50)
+    logger.info(f"开始数据处理流程（{'增量' if index is not None else '流式'}模式）")
+    logger.info(f"输入文件: {raw_file}")
+    logger.info(f"输出文件: {output_file}")
+    logger.info("="*50)
+    
+    stats = {"lines": 0, "unique": 0, "duplicates": 0, "errors": 0, "error_types": defaultdict(int)}
+    outputs = {"output": output_file, "duplicates": duplicate_file, "errors": error_file}
+    
+    start_offset, line_base = 0, 0
+    if index is not None:
+        index.rollback_outputs(outputs)
+        start_offset, line_base = index.watermark(raw_file)
+        if index.get("normalizer", 0) != NORMALIZER_VERSION and index.count():
+            logger.warning("去重索引由旧的公式规范化规则生成，仅写法不同的已见公式可能会再输出一次")
+        index.set("normalizer", NORMALIZER_VERSION)
+        is_new = index.add
+    else:
+        # 使用定长摘要跟踪已处理的公式
+        is_new = CompactHashSet(bits=digest_bits).add
+    
+    total_bytes = jsonl_size(raw_file)
+    if total_bytes == 0:
+        logger.warning("输入文件为空！")
+        return stats
+    if total_bytes == start_offset:
+        logger.info(f"没有新数据（已处理到第 {line_base} 行）")
+        return stats
+    
+    def record_error(errs, line_num, error_msg, **fields):
+        errs.write(dict({"line": line_num, "error": error_msg}, **fields))
+        stats["errors"] += 1
+        stats["error_types"][error_msg] += 1
+    
+    def checkpoint(offset, line_num):
+        for writer in (out, dups, errs):
+            writer.sync()
+        if registry is not None:
+            registry.commit()
+        index.commit(raw_file, offset, line_num, outputs)
+    
+    start = time.perf_counter()
+    line_num = line_base
+    if start_offset:
+        logger.info(f"从第 {line_base + 1} 行（字节偏移 {start_offset}）继续，"
+                    f"新增 {(total_bytes - start_offset)/1024**2:.1f} MB 数据...")
+    else:
+        logger.info(f"开始处理 {total_bytes/1024**2:.1f} MB 数据...")
+    try:
+        with open_jsonl(raw_file, "rb") as f, JsonlWriter(output_file) as out, \
+                JsonlWriter(duplicate_file) as dups, JsonlWriter(error_file) as errs:
+            f.seek(start_offset)
+            offset = start_offset
+            for line_num, line in enumerate(f, line_base + 1):
+                if index is not None and not line.endswith(b"\n"):
+                    # 最后一行可能正被爬虫写入，留到下次运行
+                    line_num -= 1
+                    break
+                try:
+                    # 按字节累计偏移（块压缩文件为解压后偏移）；编解码器直接解析 UTF-8 字节
+                    note = loads(line)
+                    try:
+                        record = RawRecord.from_dict(note)
+                    except RecordError as e:
+                        error_msg = str(e)
+                        record_error(errs, line_num, error_msg, data=note)
+                        logger.warning(error_msg, extra={"line": line_num, "data": note})
+                    else:
+                        # 使用规范化公式的摘要检查重复
+                        latex_content = record.latex
+                        canonical = canonical_latex(latex_content)
+                        key = formula_key(canonical)
+                        if is_new(key):
+                            custom_id = formula_id(key) if registry is None else registry.assign(canonical, key)
+                            out.write(SplitRecord(custom_id, latex_content, source_line=line_num))
+                        else:
+                            dups.write({"line": line_num, "latex": latex_content})
+                            stats["duplicates"] += 1
+                
+                except json.JSONDecodeError:
+                    error_msg = "JSON解析错误"
+                    record_error(errs, line_num, error_msg, raw_line=line.decode('utf-8', 'replace').strip())
+                    logger.error(error_msg, exc_info=True, extra={"line": line_num})
+                except Exception as e:
+                    error_msg = f"处理错误: {str(e)}"
+                    record_error(errs, line_num, error_msg, raw_line=line.decode('utf-8', 'replace').strip())
+                    logger.error(error_msg, exc_info=True, extra={"line": line_num})
+                
+                offset += len(line)
+                if index is not None and line_num % commit_lines == 0:
+                    checkpoint(offset, line_num)
+                
+                # 按已读字节数估算进度，无需预先数行
+                if line_num % progress_lines == 0:
+                    done = line_num - line_base
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"进度: 约 {offset/total_bytes:.1%} ({line_num} 行, {done/max(elapsed, 1e-9):,.0f} 行/秒) "
+                                f"| 新增唯一公式: {out.count}")
+            
+            if index is not None:
+                checkpoint(offset, line_num)
+            elif registry is not None:
+                registry.commit()
+            stats["unique"] = out.count
+    
+    except Exception as e:
+        logger.critical(f"文件处理发生致命错误: {str(e)}", exc_info=True)
+    
+    stats["lines"] = line_num - line_base
+    if stats["duplicates"]:
+        logger.info(f"检测到 {stats['duplicates']} 条重复数据，已保存到 {duplicate_file}")
+    if stats["errors"]:
+        logger.info(f"检测到 {stats['errors']} 条错误数据，已保存到 {error_file}")
+    return stats
+
+# ================== 并行处理 ==================
+def shard_ranges(raw_file, shard_bytes):
+    """按字节把文件切成若干分片，分片边界对齐到行首，返回 [(start, end), ...]
+
+    块压缩文件按块索引切分（块总在行尾结束），偏移为解压后偏移。
+    """
+    if is_blocked(raw_file):
+        return BlockIndex(raw_file).ranges(shard_bytes)
+    total_bytes = os.path.getsize(raw_file)
+    ranges = []
+    with open(raw_file, "rb") as f:
+        start = 0
+        while start < total_bytes:
+            f.seek(min(start + shard_bytes, total_bytes))
+            f.readline()  # 前进到下一行行首
+            end = min(f.tell(), total_bytes)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def count_shard_lines(raw_file, start, end):
+    """统计分片中的行数（末尾没有换行符的最后一行也算一行）"""
+    if is_blocked(raw_file):
+        return BlockIndex(raw_file).count_lines(start, end)
+    with open(raw_file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+
+def wash_shard(raw_file, start, end, line_base):
+    """工作进程：解析并预先序列化一个分片
+    
+    返回与行一一对应的 (摘要, a, b, c)：
+    - 正常行: (摘要, 输出记录行, 重复记录行, 规范形式)，由合并步骤根据是否首次出现二选一写出；
+      分片内已出现过的公式一定是重复，不再序列化输出记录，a 与规范形式为 None
+    - 错误行: (None, 错误类型, 错误记录行, 日志级别)
+    """
+    with open_jsonl(raw_file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    
+    results = []
+    local_seen = set()
+    for line_num, line in enumerate(lines, line_base + 1):
+        level = logging.ERROR
+        try:
+            note = loads(line)
+            try:
+                record = RawRecord.from_dict(note)
+            except RecordError as e:
+                error = {"line": line_num, "error": str(e), "data": note}
+                level = logging.WARNING
+            else:
+                latex_content = record.latex
+                canonical = canonical_latex(latex_content)
+                digest = formula_key(canonical)
+                entry = None
+                if digest not in local_seen:
+                    local_seen.add(digest)
+                    entry = dumps_line(SplitRecord(formula_id(digest), latex_content, source_line=line_num))
+                else:
+                    canonical = None
+                results.append((digest, entry, dumps_line({"line": line_num, "latex": latex_content}), canonical))
+                continue
+        except json.JSONDecodeError:
+            error = {"line": line_num, "error": "JSON解析错误", "raw_line": line.decode('utf-8', 'replace').strip()}
+        except Exception as e:
+            error = {"line": line_num, "error": f"处理错误: {str(e)}",
+                     "raw_line": line.decode('utf-8', 'replace').strip()}
+        results.append((None, error["error"], dumps_line(error), level))
+    return results
+
+def process_raw_data_parallel(raw_file=RAW_DATA_FILE, output_file=DATASPLITS_FILE,
+                              duplicate_file=DUPLICATE_LOG_FILE, error_file=ERROR_LOG_FILE,
+                              workers=None, shard_mb=4, digest_bits=64, registry=None):
+    """多进程处理原始数据，输出与 process_raw_data_stream 完全一致
+    
+    1. 按字节切分为行对齐的分片，并行统计各分片行数，得到每个分片的起始行号
+    2. 进程池并行解析、计算摘要并预先序列化各分片
+    3. 主进程按分片顺序合并：按原始行序做“首次出现者保留”的去重，再写出
+    同时在途的分片不超过 2×workers 个，内存占用与输入大小无关。
+    错误行的日志由主进程在合并时输出，不含工作进程中的堆栈信息。
+    """
+    workers = workers or os.cpu_count() or 1
+    logger.info("="*50)
+    logger.info(f"开始数据处理流程（并行模式，{workers} 个进程）")
+    logger.info(f"输入文件: {raw_file}")
+    logger.info(f"输出文件: {output_file}")
+    logger.info("="*50)
+    
+    stats = {"lines": 0, "unique": 0, "duplicates": 0, "errors": 0, "error_types": defaultdict(int)}
+    total_bytes = jsonl_size(raw_file)
+    if total_bytes == 0:
+        logger.warning("输入文件为空！")
+        return stats
+    
+    start = time.perf_counter()
+    ranges = shard_ranges(raw_file, int(shard_mb * 1024**2))
+    seen = CompactHashSet(bits=digest_bits)
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = list(pool.map(count_shard_lines, [raw_file] * len(ranges),
+                               [s for s, _ in ranges], [e for _, e in ranges]))
+        line_bases = [0]
+        for count in counts[:-1]:
+            line_bases.append(line_bases[-1] + count)
+        logger.info(f"共 {len(ranges)} 个分片, {sum(counts)} 行 ({total_bytes/1024**2:.1f} MB)")
+        
+        with JsonlWriter(output_file) as out, JsonlWriter(duplicate_file) as dups, \
+                JsonlWriter(error_file) as errs:
+            in_flight = deque()
+            next_shard = 0
+            for shard in range(len(ranges)):
+                while next_shard < len(ranges) and len(in_flight) < 2 * workers:
+                    shard_start, shard_end = ranges[next_shard]
+                    in_flight.append(pool.submit(wash_shard, raw_file, shard_start, shard_end,
+                                                 line_bases[next_shard]))
+                    next_shard += 1
+                
+                # 按分片顺序合并，保证去重结果与单进程一致
+                line_num = line_bases[shard]
+                for digest, a, b, c in in_flight.popleft().result():
+                    line_num += 1
+                    if digest is None:
+                        errs.write_line(b)
+                        stats["errors"] += 1
+                        stats["error_types"][a] += 1
+                        logger.log(c, a, extra={"line": line_num})
+                    elif a is not None and seen.add(digest):
+                        if registry is not None:
+                            custom_id = registry.assign(c, digest)
+                            if custom_id != formula_id(digest):
+                                a = a.replace(f'"{formula_id(digest)}"', f'"{custom_id}"', 1)
+                        out.write_line(a)
+                    else:
+                        dups.write_line(b)
+                        stats["duplicates"] += 1
+                
+                done_bytes = ranges[shard][1]
+                elapsed = time.perf_counter() - start
+                logger.info(f"进度: {done_bytes/total_bytes:.1%} ({line_num} 行, {line_num/max(elapsed, 1e-9):,.0f} 行/秒) "
+                            f"| 唯一公式: {out.count}")
+            stats["unique"] = out.count
+            stats["lines"] = line_num
+    if registry is not None:
+        registry.commit()
+    
+    if stats["duplicates"]:
+        logger.info(f"检测到 {stats['duplicates']} 条重复数据，已保存到 {duplicate_file}")
+    if stats["errors"]:
+        logger.info(f"检测到 {stats['errors']} 条错误数据，已保存到 {error_file}")
+    return stats
+
 def process_raw_data():
     """高效处理原始数据，处理重复项和错误"""
     logger.info("="*50)
@@ -96,7 +441,7 @@ def process_raw_data():
     
     try:
         # 先统计文件行数用于进度显示
-        with open(RAW_DATA_FILE, "r", encoding="utf-8") as f:
+        with open_jsonl(RAW_DATA_FILE, "r") as f:
             total_lines = sum(1 for _ in f)
         
         if total_lines == 0:
@@ -105,20 +450,20 @@ def process_raw_data():
         
         logger.info(f"开始处理 {total_lines} 行数据...")
         
-        with open(RAW_DATA_FILE, "r", encoding="utf-8") as f:
+        with open_jsonl(RAW_DATA_FILE, "r") as f:
             for line_num, line in enumerate(f, 1):
                 try:
-                    note = json.loads(line)
-                    latex_content = note.get("latex")
-                    
-                    if not latex_content:
-                        error_msg = "缺少 'latex' 字段"
+                    note = loads(line)
+                    try:
+                        latex_content = RawRecord.from_dict(note).latex
+                    except RecordError as e:
+                        error_msg = str(e)
                         errors.append({"line": line_num, "error": error_msg, "data": note})
                         logger.warning(error_msg, extra={"line": line_num, "data": note})
                         continue
                     
-                    # 使用哈希值检查重复
-                    content_hash = calculate_hash(latex_content)
+                    # 使用规范化公式的哈希值检查重复
+                    content_hash = calculate_hash(canonical_latex(latex_content))
                     
                     if content_hash in seen_hashes:
                         dup_info = {
@@ -133,26 +478,7 @@ def process_raw_data():
                     seen_hashes.add(content_hash)
                     
                     # 创建规范化的数据结构（保留哈希值用于内部处理）
-                    # 重要修改：添加 custom_id 字段用于百炼 API
-                    mapping_entry = {
-                        "custom_id": f"latex_{uuid.uuid4().hex}",
-                        "method": "POST",  # 必须字段
-                        "input": latex_content,
-                        "request_parameters": {   # API调用参数
-                            "temperature": 0.2,
-                            "max_tokens": 256,
-                            "top_p": 0.9
-                        },
-                        "LaTeX": latex_content,
-                        "CHINESE": None,
-                        "Meaning": None,
-                        "Solve" : None,
-                        "source_line": line_num,
-                        "metadata": {
-                        "length": len(latex_content),
-                        "complexity": len(latex_content.split())
-                        }
-                    }
+                    mapping_entry = build_entry(latex_content, line_num)
                     
                     processed_data.append(mapping_entry)
                     
@@ -218,35 +544,105 @@ def create_sample_file():
             return False
     return True
 
-def generate_report(unique_count, total_lines, errors, duplicates):
+def count_error_types(errors):
+    """错误类型分析"""
+    error_types = defaultdict(int)
+    for error in errors:
+        error_types[error["error"]] += 1
+    return error_types
+
+def generate_report(unique_count, total_lines, error_types, duplicate_count):
     """生成处理结果报告"""
+    error_count = sum(error_types.values())
     logger.info("="*50)
     logger.info("数据处理结果报告:")
     logger.info(f"处理总行数: {total_lines}")
     logger.info(f"提取唯一公式: {unique_count} 条")
-    logger.info(f"重复公式数量: {len(duplicates)}")
-    logger.info(f"错误/无效行数: {len(errors)}")
+    logger.info(f"重复公式数量: {duplicate_count}")
+    logger.info(f"错误/无效行数: {error_count}")
     logger.info(f"唯一率: {unique_count/max(total_lines, 1):.2%}")
     
-    if errors:
-        # 错误类型分析
-        error_types = defaultdict(int)
-        for error in errors:
-            error_types[error["error"]] += 1
-        
+    if error_count:
         logger.warning("错误类型统计:")
         for err_type, count in error_types.items():
             logger.warning(f"  {err_type}: {count} 处")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="原始公式数据清洗与去重")
+    parser.add_argument("--legacy", action="store_true",
+                        help="使用原始实现（两遍读取，重复项与错误项在内存中累积到结束）")
+    parser.add_argument("--progress-lines", type=int, default=100000, help="流式模式每处理多少行输出一次进度")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量模式：只处理上次运行之后追加的行，只输出从未见过的公式")
+    parser.add_argument("--index", default=str(WASH_INDEX_FILE), help="增量模式的去重索引与水位线数据库")
+    parser.add_argument("--bloom", action="store_true",
+                        help="增量模式用磁盘布隆过滤器（索引路径 + .bloom）预判新公式，减少逐条查库")
+    parser.add_argument("--digest-bits", type=int, choices=[64, 128], default=64,
+                        help="流式模式去重摘要位数（增量模式固定128位）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="并行模式的进程数：按字节分片多进程解析，结果与单进程完全一致")
+    parser.add_argument("--shard-mb", type=float, default=4, help="并行模式每个分片的大小（MB）")
+    parser.add_argument("--registry", nargs="?", const=str(LABEL_STORE_FILE), default=None,
+                        help=f"登记 custom_id 并检查冲突（默认库 {LABEL_STORE_FILE.name}，与 label_store 共用）")
+    parser.add_argument("--near-dup", action="store_true",
+                        help=f"清洗后用 MinHash/LSH 聚类近似重复公式，簇信息写入 {NEAR_DUP_FILE.name}（需要 numpy）")
+    parser.add_argument("--near-dup-threshold", type=float, default=0.6, help="近似重复的 Jaccard 相似度阈值")
+    parser.add_argument("--line-index", action="store_true",
+                        help="清洗后增量更新原始数据的行号索引（<原始文件>.lines），供 line_index 按行号追溯来源")
+    parser.add_argument("--compress", action="store_true",
+                        help=f"原始数据与重复记录使用块压缩格式（{compressed_path(RAW_DATA_FILE.name)} 等，见 block_jsonl）")
+    args = parser.parse_args()
+    if args.workers and (args.incremental or args.legacy):
+        parser.error("--workers 不能与 --incremental 或 --legacy 同时使用")
+    if args.registry and args.legacy:
+        parser.error("--registry 不能与 --legacy 同时使用")
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.compress:
+        RAW_DATA_FILE = compressed_path(RAW_DATA_FILE)
+        DUPLICATE_LOG_FILE = compressed_path(DUPLICATE_LOG_FILE)
     try:
         initialize_data_dir()
         
         if not create_sample_file():
             exit(1)
-            
-        unique_formulas, total_lines, errors, duplicates = process_raw_data()
-        generate_report(unique_formulas, total_lines, errors, duplicates)
+        
+        registry = IdRegistry(args.registry) if args.registry else None
+        if args.legacy:
+            unique_formulas, total_lines, errors, duplicates = process_raw_data()
+            generate_report(unique_formulas, total_lines, count_error_types(errors), len(duplicates))
+        elif args.incremental:
+            index = WashIndex(args.index, bloom_path=args.index + ".bloom" if args.bloom else None)
+            stats = process_raw_data_stream(RAW_DATA_FILE, duplicate_file=DUPLICATE_LOG_FILE,
+                                            progress_lines=args.progress_lines, index=index, registry=registry)
+            generate_report(stats["unique"], stats["lines"], stats["error_types"], stats["duplicates"])
+            logger.info(f"去重索引累计公式: {index.count()} 条 ({args.index})")
+            index.close()
+        elif args.workers:
+            stats = process_raw_data_parallel(RAW_DATA_FILE, duplicate_file=DUPLICATE_LOG_FILE,
+                                              workers=args.workers, shard_mb=args.shard_mb,
+                                              digest_bits=args.digest_bits, registry=registry)
+            generate_report(stats["unique"], stats["lines"], stats["error_types"], stats["duplicates"])
+        else:
+            stats = process_raw_data_stream(RAW_DATA_FILE, duplicate_file=DUPLICATE_LOG_FILE,
+                                            progress_lines=args.progress_lines, digest_bits=args.digest_bits,
+                                            registry=registry)
+            generate_report(stats["unique"], stats["lines"], stats["error_types"], stats["duplicates"])
+        
+        if registry is not None:
+            logger.info(f"custom_id 登记表: 共 {registry.count()} 个，本次冲突 {registry.collisions} 个 ({args.registry})")
+            registry.close()
+        
+        if args.line_index:
+            from line_index import LineIndex
+            with LineIndex(RAW_DATA_FILE) as line_index:
+                logger.info(f"行号索引: {line_index.lines} 行 ({line_index.path})")
+        
+        if args.near_dup:
+            from near_dup import near_duplicate_stage
+            near_duplicate_stage(DATASPLITS_FILE, NEAR_DUP_FILE, threshold=args.near_dup_threshold)
         
         logger.info("="*50)
         logger.info(f"处理完成! 结果保存至: {DATASPLITS_FILE}")
@@ -0,0 +1,82 @@
+import logging
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:  # lxml 为可选依赖，缺失时回退到 SoupStrainer
+    lxml = None
+
+logger = logging.getLogger("crawler")
+
+# 只保留标题和公式所在的元素，其余标签在解析阶段直接丢弃
+WIKI_STRAINER = SoupStrainer(["h1", "span"])
+
+MATH_ELEMENT_XPATH = "//span[contains(concat(' ', normalize-space(@class), ' '), ' mwe-math-element ')]"
+MATHML_XPATH = ".//span[contains(concat(' ', normalize-space(@class), ' '), ' mwe-math-mathml-inline ')]"
+
+def clean_alttext(alttext):
+    return alttext.replace('\\displaystyle ', '')
+
+# === 提取后端 ===
+# 每个后端接收页面HTML，返回 (标题, [LaTeX公式, ...])，结果必须与 bs4 后端完全一致
+
+def _extract_from_soup(soup):
+    # 提取页面标题作为公式描述
+    title = soup.find('h1', {'id': 'firstHeading'}).text.strip()
+
+    # 提取所有LaTeX公式
+    formulas = []
+    for elem in soup.find_all('span', {'class': 'mwe-math-element'}):
+        mathml = elem.find('span', {'class': 'mwe-math-mathml-inline'})
+        if mathml:
+            # alttext 位于内层 <math> 元素上，旧版页面则直接挂在 span 上
+            math = mathml.find('math')
+            alttext = mathml.get('alttext') or (math.get('alttext', '') if math else '')
+            latex = clean_alttext(alttext)
+            if latex:
+                formulas.append(latex)
+    return title, formulas
+
+def extract_bs4(html):
+    """完整解析整个文档（原始实现）"""
+    return _extract_from_soup(BeautifulSoup(html, 'html.parser'))
+
+def extract_strainer(html):
+    """用 SoupStrainer 只构建 h1/span 子树，减少建树开销"""
+    return _extract_from_soup(BeautifulSoup(html, 'html.parser', parse_only=WIKI_STRAINER))
+
+def extract_lxml(html):
+    """lxml 的C解析器 + XPath 直接定位标题和公式元素"""
+    tree = lxml.html.fromstring(html)
+    heading = tree.xpath("//h1[@id='firstHeading']")
+    if not heading:
+        raise AttributeError("页面缺少 h1#firstHeading")
+    title = heading[0].text_content().strip()
+
+    formulas = []
+    for elem in tree.xpath(MATH_ELEMENT_XPATH):
+        mathml = elem.xpath(MATHML_XPATH)
+        if mathml:
+            mathml = mathml[0]
+            math = mathml.find('.//math')
+            alttext = mathml.get('alttext') or (math.get('alttext', '') if math is not None else '')
+            latex = clean_alttext(alttext)
+            if latex:
+                formulas.append(latex)
+    return title, formulas
+
+EXTRACTORS = {
+    "bs4": extract_bs4,
+    "strainer": extract_strainer,
+}
+if lxml is not None:
+    EXTRACTORS["lxml"] = extract_lxml
+
+def get_extractor(name="auto"):
+    """按名称获取提取后端；auto 优先使用 lxml，缺失时使用 SoupStrainer"""
+    if name == "auto":
+        name = "lxml" if "lxml" in EXTRACTORS else "strainer"
+    if name not in EXTRACTORS:
+        raise ValueError(f"未知或不可用的提取后端: {name}（可用: {', '.join(EXTRACTORS)}）")
+    return EXTRACTORS[name]
@@ -0,0 +1,117 @@
+import argparse
+import sqlite3
+import time
+
+# 页面状态
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# === 持久化爬取前沿 ===
+class CrawlFrontier:
+    """基于SQLite的爬取前沿与跨运行的已访问索引
+
+    - 每个URL一行：状态、加入时间、最后抓取时间、尝试次数、最后一次错误
+    - 已完成的页面在 refresh_after 秒内不会被重复抓取（None 表示永不刷新）
+    - 失败的页面在 max_attempts 次以内会在后续运行中重试
+    """
+    def __init__(self, db_path, refresh_after=None, max_attempts=3):
+        self.db_path = str(db_path)
+        self.refresh_after = refresh_after
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                fetched_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                formulas INTEGER,
+                error TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_status ON pages(status, fetched_at)")
+        self.conn.commit()
+
+    def add(self, urls):
+        """把新发现的URL加入前沿，已存在的保持原状态，返回新增数量"""
+        now = time.time()
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO pages (url, status, added_at) VALUES (?, ?, ?)",
+            [(url, PENDING, now) for url in urls]
+        )
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def should_fetch(self, url):
+        """判断页面是否需要抓取：未完成、失败可重试或已过刷新周期"""
+        row = self.conn.execute(
+            "SELECT status, fetched_at, attempts FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return True
+        status, fetched_at, attempts = row
+        if status == PENDING:
+            return True
+        if status == FAILED:
+            return attempts < self.max_attempts
+        if self.refresh_after is None:
+            return False
+        return time.time() - fetched_at >= self.refresh_after
+
+    def filter(self, urls):
+        """保序过滤出需要抓取的URL"""
+        return [url for url in urls if self.should_fetch(url)]
+
+    def mark_done(self, url, formulas=None):
+        self.conn.execute("""
+            INSERT INTO pages (url, status, added_at, fetched_at, attempts, formulas)
+            VALUES (?, ?, ?, ?, 1, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                status = excluded.status, fetched_at = excluded.fetched_at,
+                attempts = attempts + 1, formulas = excluded.formulas, error = NULL
+        """, (url, DONE, time.time(), time.time(), formulas))
+        self.conn.commit()
+
+    def mark_failed(self, url, error):
+        self.conn.execute("""
+            INSERT INTO pages (url, status, added_at, fetched_at, attempts, error)
+            VALUES (?, ?, ?, ?, 1, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                status = excluded.status, fetched_at = excluded.fetched_at,
+                attempts = attempts + 1, error = excluded.error
+        """, (url, FAILED, time.time(), time.time(), str(error)[:500]))
+        self.conn.commit()
+
+    def pending(self, limit=None):
+        """前沿中所有待抓取的URL（按加入顺序），用于断点续爬"""
+        rows = self.conn.execute(
+            "SELECT url FROM pages WHERE status != ? ORDER BY added_at, rowid", (DONE,)
+        ).fetchall()
+        urls = [url for (url,) in rows if self.should_fetch(url)]
+        return urls[:limit] if limit else urls
+
+    def stats(self):
+        """各状态的页面数量"""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM pages GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看爬取前沿状态")
+    parser.add_argument("db", help="前沿数据库路径")
+    parser.add_argument("--pending", action="store_true", help="列出待抓取的URL")
+    args = parser.parse_args()
+
+    frontier = CrawlFrontier(args.db)
+    for status, count in sorted(frontier.stats().items()):
+        print(f"{status}: {count}")
+    if args.pending:
+        for url in frontier.pending():
+            print(url)
+    frontier.close()
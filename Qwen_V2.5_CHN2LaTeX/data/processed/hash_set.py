@@ -0,0 +1,170 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+from array import array
+
+MASK64 = (1 << 64) - 1
+
+def content_digest(text, bits=64):
+    """公式内容的 blake2b 摘要（64 或 128 位整数），用作去重键"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=bits // 8).digest(), 'big')
+
+# === 开放寻址哈希集合 ===
+class CompactHashSet:
+    """只保存定长二进制摘要的去重集合
+
+    - 槽位是 array('Q') 中的无符号64位整数，0 表示空槽；128位摘要再用一个数组存高64位
+    - 线性探测，装载因子超过 max_load 时容量翻倍
+    - 每条约 8/max_load（64位）或 16/max_load（128位）字节，Python set 存SHA256十六进制串约 150 字节
+    """
+    def __init__(self, capacity=1 << 16, bits=64, max_load=0.7):
+        if bits not in (64, 128):
+            raise ValueError(f"不支持的摘要位数: {bits}（可选 64 或 128）")
+        self.bits = bits
+        self.max_load = max_load
+        self.count = 0
+        self._allocate(1 << max(4, math.ceil(math.log2(capacity / max_load))))
+
+    def _allocate(self, size):
+        self.mask = size - 1
+        self.limit = int(size * self.max_load)
+        self.lo = array('Q', bytes(8 * size))
+        self.hi = array('Q', bytes(8 * size)) if self.bits == 128 else None
+
+    def _split(self, digest):
+        # 低64位为0的摘要映射为1，把0留给空槽（只会与低位恰为1且高位相同的摘要混淆）
+        return (digest & MASK64) or 1, digest >> 64
+
+    def add(self, digest):
+        """加入摘要，首次出现返回 True"""
+        lo, hi = self._split(digest)
+        los, his, mask = self.lo, self.hi, self.mask
+        i = lo & mask
+        while True:
+            slot = los[i]
+            if slot == 0:
+                break
+            if slot == lo and (his is None or his[i] == hi):
+                return False
+            i = (i + 1) & mask
+        los[i] = lo
+        if his is not None:
+            his[i] = hi
+        self.count += 1
+        if self.count > self.limit:
+            self._grow()
+        return True
+
+    def __contains__(self, digest):
+        lo, hi = self._split(digest)
+        los, his, mask = self.lo, self.hi, self.mask
+        i = lo & mask
+        while True:
+            slot = los[i]
+            if slot == 0:
+                return False
+            if slot == lo and (his is None or his[i] == hi):
+                return True
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old_lo, old_hi = self.lo, self.hi
+        self._allocate(len(old_lo) * 2)
+        los, his, mask = self.lo, self.hi, self.mask
+        for j, lo in enumerate(old_lo):
+            if lo:
+                i = lo & mask
+                while los[i]:
+                    i = (i + 1) & mask
+                los[i] = lo
+                if his is not None:
+                    his[i] = old_hi[j]
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return len(self.lo) * 8 * (2 if self.hi is not None else 1)
+
+# === 布隆过滤器 ===
+BLOOM_MAGIC = b"CLBF"
+BLOOM_HEADER = struct.Struct("<4sQIQ")  # 魔数、位数 m、哈希函数个数 k、版本号（由使用者维护）
+
+class BloomFilter:
+    """位数组布隆过滤器，可映射到磁盘文件跨运行保存
+
+    由128位摘要的高低两半做双重哈希得到 k 个位置（因此要求 128 位摘要）；
+    只会误报“可能存在”，不会漏报。path 为 None 时位数组在内存中。
+    磁盘文件头中的 generation 供使用者判断位数组是否与数据源同步（见 wash_index）。
+    """
+    def __init__(self, capacity, error_rate=0.01, path=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.m = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        nbytes = (self.m + 7) // 8
+        self.path = path
+        self.file = None
+        self.created = True
+        self.generation = 0
+        if path is None:
+            self.bits = bytearray(nbytes)
+            self.offset = 0
+            return
+
+        self.offset = BLOOM_HEADER.size
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                header = f.read(BLOOM_HEADER.size)
+            if len(header) == BLOOM_HEADER.size and BLOOM_HEADER.unpack(header)[:3] == (BLOOM_MAGIC, self.m, self.k):
+                self.created = False
+                self.generation = BLOOM_HEADER.unpack(header)[3]
+        self.file = open(path, "r+b" if not self.created else "w+b")
+        if self.created:
+            self.file.write(BLOOM_HEADER.pack(BLOOM_MAGIC, self.m, self.k, 0))
+            self.file.truncate(self.offset + nbytes)
+        self.bits = mmap.mmap(self.file.fileno(), self.offset + nbytes)
+
+    def _positions(self, digest):
+        h1 = digest & MASK64
+        h2 = ((digest >> 64) & MASK64) | 1
+        m = self.m
+        return [(h1 + j * h2) % m for j in range(self.k)]
+
+    def add(self, digest):
+        bits, offset = self.bits, self.offset
+        for pos in self._positions(digest):
+            bits[offset + (pos >> 3)] |= 1 << (pos & 7)
+
+    def __contains__(self, digest):
+        bits, offset = self.bits, self.offset
+        for pos in self._positions(digest):
+            if not bits[offset + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self):
+        return (self.m + 7) // 8
+
+    def clear(self):
+        self.bits[self.offset:self.offset + self.nbytes] = bytes(self.nbytes)
+
+    def set_generation(self, generation):
+        """更新文件头中的版本号，随下一次 flush 落盘"""
+        self.generation = generation
+        if self.file is not None:
+            self.bits[:BLOOM_HEADER.size] = BLOOM_HEADER.pack(BLOOM_MAGIC, self.m, self.k, generation)
+
+    def flush(self):
+        if self.file is not None:
+            self.bits.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.bits.close()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,173 @@
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from rate_control import RateLimitedAdapter
+
+logger = logging.getLogger("crawler")
+
+# 需要随缓存一起保存的响应头
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+# === 磁盘HTTP响应缓存 ===
+class HttpCache:
+    """以URL为键的响应缓存，正文zlib压缩后存入SQLite
+
+    - 保存 ETag / Last-Modified，供条件请求重新验证
+    - 总大小超过 max_bytes 时按最近访问时间淘汰（LRU）
+    - 统计命中、未命中以及因复用缓存节省的字节数
+    - 可被多个抓取线程共享，数据库访问由锁串行化
+    """
+    def __init__(self, db_path, max_bytes=2 * 1024**3):
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_lru ON responses(accessed_at)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "bytes_saved": 0, "evicted": 0}
+
+    def get(self, url):
+        """返回 (响应头字典, 正文字节)，不存在时返回 None"""
+        with self._lock:
+            row = self.conn.execute("SELECT headers, body FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+        return json.loads(row[0]), zlib.decompress(row[1])
+
+    def put(self, url, headers, body):
+        kept = {k: headers[k] for k in KEPT_HEADERS if k in headers}
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, headers, body, size, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, json.dumps(kept), compressed, len(compressed), now, now)
+            )
+            self.total_bytes += len(compressed) - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """超出容量时删除最久未访问的条目"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+        for url, size in rows:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.total_bytes -= size
+            self.stats["evicted"] += 1
+
+    def summary(self):
+        entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return (f"缓存条目 {entries} 个, 占用 {self.total_bytes/1024**2:.1f} MB | "
+                f"命中 {self.stats['hits']} (其中304重新验证 {self.stats['revalidated']}), "
+                f"未命中 {self.stats['misses']}, 节省流量 {self.stats['bytes_saved']/1024**2:.1f} MB, "
+                f"淘汰 {self.stats['evicted']}")
+
+    def close(self):
+        self.conn.close()
+
+# === requests 适配器 ===
+class CachingAdapter(RateLimitedAdapter):
+    """在 HTTPAdapter 之下接入缓存：带条件头发请求，304 时复用缓存正文
+
+    offline=True 时完全不访问网络，只返回缓存内容（未缓存的URL抛出 ConnectionError）。
+    传入 controller 时只有真正发往网络的请求才受限速约束，离线命中不等待。
+    """
+    def __init__(self, cache, offline=False, controller=None, **kwargs):
+        self.cache = cache
+        self.offline = offline
+        super().__init__(controller, **kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != "GET":
+            return super().send(request, **kwargs)
+
+        cached = self.cache.get(request.url)
+        if self.offline:
+            if cached is None:
+                self.cache.stats["misses"] += 1
+                raise requests.ConnectionError(f"离线模式下缓存未命中: {request.url}")
+            self.cache.stats["hits"] += 1
+            self.cache.stats["bytes_saved"] += len(cached[1])
+            return self._from_cache(request, *cached)
+
+        if cached is not None:
+            headers, _ = cached
+            if "ETag" in headers:
+                request.headers["If-None-Match"] = headers["ETag"]
+            if "Last-Modified" in headers:
+                request.headers["If-Modified-Since"] = headers["Last-Modified"]
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            self.cache.stats["hits"] += 1
+            self.cache.stats["revalidated"] += 1
+            self.cache.stats["bytes_saved"] += len(cached[1])
+            return self._from_cache(request, *cached)
+
+        self.cache.stats["misses"] += 1
+        if response.status_code == 200 and not kwargs.get("stream"):
+            self.cache.put(request.url, response.headers, response.content)
+        return response
+
+    def _from_cache(self, request, headers, body):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+def mount_cache(session, cache, offline=False, max_retries=0, controller=None):
+    """把缓存适配器挂到会话上，返回该会话"""
+    adapter = CachingAdapter(cache, offline=offline, controller=controller, max_retries=max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看或清理HTTP响应缓存")
+    parser.add_argument("db", help="缓存数据库路径")
+    parser.add_argument("--max-mb", type=float, default=None, help="按新的容量上限执行LRU淘汰")
+    args = parser.parse_args()
+
+    cache = HttpCache(args.db)
+    if args.max_mb is not None:
+        cache.max_bytes = int(args.max_mb * 1024**2)
+        cache._evict()
+        cache.conn.commit()
+        cache.conn.execute("VACUUM")
+    print(cache.summary())
+    cache.close()
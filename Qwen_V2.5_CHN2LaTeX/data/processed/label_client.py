@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from array import array
+
+import aiohttp
+
+from rate_control import THROTTLE_STATUS, parse_retry_after
+from records import dumps_line, loads
+
+logger = logging.getLogger("data_wash")
+
+# 百炼的 OpenAI 兼容接口；本地模拟服务或其他兼容服务用 --base-url 指定
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+DEFAULT_MODEL = "qwen2.5-72b-instruct"
+API_KEY_ENV = "DASHSCOPE_API_KEY"
+
+SYSTEM_PROMPT = (
+    "你是数学公式标注助手。用户给出一条 LaTeX 公式，请只返回一个 JSON 对象，不要附加其他文字：\n"
+    '{"CHINESE": "公式的中文读法或描述（用户会用这句话找到这条公式）", '
+    '"Meaning": "一两句话说明公式的含义与常见用途"}'
+)
+
+# 超时、连接错误之外，这些状态码也值得重试（其余 4xx 重试也不会成功）
+RETRY_STATUS = THROTTLE_STATUS | {408}
+
+class LabelError(Exception):
+    """重试用尽或不可重试的错误，记录到失败文件等待重新提交"""
+
+def build_request(entry, model):
+    """由数据集记录生成 chat/completions 请求体；记录中的 request_parameters 原样并入"""
+    body = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": entry["input"]},
+        ],
+    }
+    body.update(entry.get("request_parameters") or {})
+    return body
+
+def parse_label(content):
+    """解析模型回复，返回 (CHINESE, Meaning)
+
+    回复应为 JSON 对象（允许包在 ```json 代码块中）；不是 JSON 时整段回复作为 CHINESE。
+    """
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.startswith("json"):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return content.strip(), None
+    if not isinstance(data, dict) or not data.get("CHINESE"):
+        return content.strip(), None
+    return str(data["CHINESE"]).strip(), data.get("Meaning")
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+# === 异步标注客户端 ===
+class LabelClient:
+    """OpenAI 兼容 chat/completions 接口的异步客户端
+
+    - 共享一个 aiohttp.ClientSession，连接数上限等于 concurrency
+    - 超时、连接错误和 429/5xx 按指数退避重试（带随机抖动），有 Retry-After 时按其等待
+    - 传入 rate_controller 时按主机自适应限速（见 rate_control.RateController）
+    """
+    def __init__(self, base_url=DEFAULT_BASE_URL, api_key=None, model=DEFAULT_MODEL, concurrency=32,
+                 timeout=60, max_retries=5, backoff=1.0, max_backoff=30.0, rate_controller=None):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.api_key = api_key
+        self.model = model
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_controller = rate_controller
+        self.session = None
+        self.stats = {"requests": 0, "retries": 0, "errors": 0}
+
+    async def __aenter__(self):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def _post(self, body):
+        """发送一次请求，返回 (回复文本或None, 错误描述, 是否可重试, Retry-After)"""
+        if self.rate_controller:
+            await self.rate_controller.acquire_async(self.url)
+        self.stats["requests"] += 1
+        async with self.session.post(self.url, json=body) as response:
+            if self.rate_controller:
+                self.rate_controller.observe(self.url, response.status, response.headers)
+            if response.status != 200:
+                await response.read()
+                return (None, f"HTTP {response.status}", response.status in RETRY_STATUS,
+                        parse_retry_after(response.headers.get("Retry-After")))
+            data = await response.json(content_type=None)
+        try:
+            return data["choices"][0]["message"]["content"], None, False, None
+        except (KeyError, IndexError, TypeError):
+            return None, f"无法解析的响应: {str(data)[:200]}", True, None
+
+    async def label(self, entry):
+        """标注一条记录，返回 (CHINESE, Meaning)；失败时抛出 LabelError"""
+        body = build_request(entry, self.model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                content, error, retryable, retry_after = await self._post(body)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                # ValueError：状态码 200 但响应体不是合法 JSON（aiohttp.ContentTypeError 属于 ClientError）
+                content, error, retryable, retry_after = None, f"{type(e).__name__}: {e}", True, None
+            if content is not None:
+                return parse_label(content)
+            if not retryable or attempt == self.max_retries:
+                break
+            self.stats["retries"] += 1
+            if retry_after is None:
+                retry_after = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            await asyncio.sleep(retry_after)
+        self.stats["errors"] += 1
+        raise LabelError(error)
+
+# === 断点续传 ===
+def load_checkpoint(output_file):
+    """读取已写出的 custom_id
+
+    只截掉进程中断留下的、没有换行符的最后一行；中间无法解析或没有 custom_id 的行
+    记录警告后跳过，其后的记录照常读取。
+    """
+    done = set()
+    if not os.path.exists(output_file):
+        return done
+    skipped = 0
+    with open(output_file, "r+b") as f:
+        valid = 0
+        for line_num, line in enumerate(f, 1):
+            if not line.endswith(b"\n"):
+                break
+            valid += len(line)
+            if not line.strip():
+                continue
+            try:
+                done.add(loads(line)["custom_id"])
+            except (ValueError, KeyError, TypeError) as e:
+                skipped += 1
+                logger.warning(f"{output_file} 第 {line_num} 行无法识别 custom_id，已跳过: {type(e).__name__}: {e}")
+        if valid != f.seek(0, os.SEEK_END):
+            logger.warning(f"{output_file} 末尾有 {f.tell() - valid} 字节不完整的记录，已截断")
+            f.truncate(valid)
+    if skipped:
+        logger.warning(f"{output_file} 中共 {skipped} 行无法识别 custom_id，这些行对应的记录可能会被重新标注")
+    return done
+
+def read_entries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+async def label_entries(entries, output_file, failed_file, client, checkpoint_every=100, label_store=None):
+    """流式标注：有界队列 + concurrency 个工作协程，结果按完成顺序追加到 output_file
+
+    - 已在 output_file 中的 custom_id 直接跳过（断点续传），每 checkpoint_every 条刷新一次文件
+    - 重试用尽的记录写入 failed_file（custom_id 与错误），不写入输出，重跑时会再次尝试
+    - 传入 label_store（label_store.LabelStore）时同步登记标注，批处理分片据此跳过
+    返回统计字典。
+    """
+    done = load_checkpoint(output_file)
+    queue = asyncio.Queue(maxsize=client.concurrency * 2)
+    latencies = array('d')
+    pending_labels = []
+    stats = {"labelled": 0, "failed": 0, "skipped": 0}
+
+    out = open(output_file, 'a', encoding='utf-8')
+    failed = open(failed_file, 'a', encoding='utf-8')
+
+    def checkpoint():
+        out.flush()
+        failed.flush()
+        if label_store is not None and pending_labels:
+            label_store.put_many(pending_labels)
+            pending_labels.clear()
+
+    async def produce():
+        for entry in entries:
+            if entry["custom_id"] in done:
+                stats["skipped"] += 1
+                continue
+            await queue.put(entry)
+        for _ in range(client.concurrency):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            start = time.perf_counter()
+            try:
+                chinese, meaning = await client.label(entry)
+            except LabelError as e:
+                stats["failed"] += 1
+                failed.write(dumps_line({"custom_id": entry["custom_id"], "error": str(e)}))
+                continue
+            latencies.append(time.perf_counter() - start)
+            entry["CHINESE"] = chinese
+            entry["Meaning"] = meaning
+            out.write(dumps_line(entry))
+            stats["labelled"] += 1
+            if label_store is not None:
+                pending_labels.append((entry["custom_id"], chinese, client.model))
+            if stats["labelled"] % checkpoint_every == 0:
+                checkpoint()
+                logger.debug(f"已标注 {stats['labelled']} 条")
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(client.concurrency)))
+    finally:
+        checkpoint()
+        out.close()
+        failed.close()
+
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    stats.update(client.stats, elapsed=elapsed, rate=stats["labelled"] / max(elapsed, 1e-9),
+                 p50=percentile(ordered, 0.50), p95=percentile(ordered, 0.95),
+                 p99=percentile(ordered, 0.99), max=ordered[-1] if ordered else 0.0)
+    logger.info(f"标注完成: 成功 {stats['labelled']} 条，失败 {stats['failed']} 条，"
+                f"跳过已完成 {stats['skipped']} 条，用时 {elapsed:.1f}s ({stats['rate']:.1f} 条/秒)，"
+                f"请求 {stats['requests']} 次，重试 {stats['retries']} 次，"
+                f"延迟 p50 {stats['p50']*1000:.0f}ms / p95 {stats['p95']*1000:.0f}ms / "
+                f"p99 {stats['p99']*1000:.0f}ms / 最大 {stats['max']*1000:.0f}ms")
+    return stats
+
+def label_splits(splits_file, output_file, failed_file, base_url=DEFAULT_BASE_URL, api_key=None,
+                 model=DEFAULT_MODEL, concurrency=32, max_retries=5, timeout=60, limit=None,
+                 rate_controller=None, label_store=None):
+    """同步入口：标注 splits_file 中的记录，写出带 CHINESE/Meaning 的数据集"""
+    async def _run():
+        entries = read_entries(splits_file)
+        if limit is not None:
+            entries = itertools.islice(entries, limit)
+        async with LabelClient(base_url, api_key, model, concurrency, timeout, max_retries,
+                               rate_controller=rate_controller) as client:
+            return await label_entries(entries, output_file, failed_file, client, label_store=label_store)
+
+    return asyncio.run(_run())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="异步调用大模型接口，为数据集填写 CHINESE/Meaning")
+    parser.add_argument("splits", help="datawash 输出的数据集（data_splits_NO_CHN.jsonl）")
+    parser.add_argument("output", help="标注后的数据集（data_splits_with_CHN.jsonl），重跑时从中断处继续")
+    parser.add_argument("--failed", default=None, help="失败记录文件（默认在输出文件名后加 .failed）")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="OpenAI 兼容接口地址")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--concurrency", type=int, default=32, help="在途请求上限")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="单次请求超时（秒）")
+    parser.add_argument("--limit", type=int, default=None, help="只处理前 N 条记录")
+    parser.add_argument("--rate", type=float, default=None, help="启用自适应限速，初始速率（次/秒）")
+    parser.add_argument("--labels", default=None, help="同时把标注登记到标注库（label_store）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    controller = None
+    if args.rate:
+        from rate_control import RateController
+        controller = RateController(rate=args.rate, max_rate=max(args.rate, 50.0))
+    store = None
+    if args.labels:
+        from label_store import LabelStore
+        store = LabelStore(args.labels)
+    label_splits(args.splits, args.output, args.failed or args.output + ".failed", args.base_url,
+                 os.environ.get(API_KEY_ENV), args.model, args.concurrency, args.max_retries,
+                 args.timeout, args.limit, controller, store)
+    if store is not None:
+        store.close()
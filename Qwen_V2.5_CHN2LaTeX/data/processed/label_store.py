@@ -0,0 +1,219 @@
+import argparse
+import logging
+import sqlite3
+import time
+
+from hash_set import content_digest
+from latex_norm import canonical_latex
+from records import dumps_line, loads
+
+logger = logging.getLogger("data_wash")
+
+# === 确定性 custom_id ===
+def formula_key(canonical):
+    """规范化公式的128位摘要：既是去重键，也决定 custom_id"""
+    return content_digest(canonical, 128)
+
+def formula_id(key):
+    """由公式摘要得到 custom_id；同一公式在任何一次运行中都得到同一个 id"""
+    return f"latex_{key:032x}"
+
+# === id 登记表 ===
+class IdRegistry:
+    """custom_id → 规范化公式的登记表，检查不同公式的 id 是否冲突
+
+    - 首次出现的 id 登记其规范形式；再次出现时规范形式必须一致
+    - 不一致（128位摘要冲突）时依次尝试 id_1、id_2…，冲突的公式得到带后缀的 id
+    - 新登记的 id 先放在内存中，commit() 时批量写入
+    """
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS ids (custom_id TEXT PRIMARY KEY, canonical TEXT NOT NULL)")
+        self.conn.commit()
+        self.pending = {}
+        self.collisions = 0
+
+    def _lookup(self, custom_id):
+        canonical = self.pending.get(custom_id)
+        if canonical is None:
+            row = self.conn.execute("SELECT canonical FROM ids WHERE custom_id = ?", (custom_id,)).fetchone()
+            canonical = row[0] if row else None
+        return canonical
+
+    def assign(self, canonical, key=None):
+        """返回规范化公式的 custom_id，必要时登记"""
+        base = formula_id(formula_key(canonical) if key is None else key)
+        custom_id = base
+        suffix = 0
+        while True:
+            existing = self._lookup(custom_id)
+            if existing == canonical:
+                return custom_id
+            if existing is None:
+                break
+            suffix += 1
+            custom_id = f"{base}_{suffix}"
+        self.pending[custom_id] = canonical
+        if suffix:
+            self.collisions += 1
+            logger.warning(f"custom_id 冲突: {base} 已属于另一公式，改用 {custom_id}")
+        return custom_id
+
+    def commit(self):
+        if self.pending:
+            self.conn.executemany("INSERT OR IGNORE INTO ids VALUES (?, ?)", self.pending.items())
+            self.pending.clear()
+        self.conn.commit()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM ids").fetchone()[0] + len(self.pending)
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+# === 标注结果库 ===
+def parse_batch_result(item):
+    """解析批处理输出中的一行，返回 (custom_id, 标注文本, 模型)；失败的请求返回 None"""
+    response = item.get("response") or {}
+    if item.get("error") or response.get("status_code", 200) != 200:
+        return None
+    body = response.get("body") or {}
+    choices = body.get("choices") or []
+    if not choices:
+        return None
+    content = (choices[0].get("message") or {}).get("content")
+    if not content:
+        return None
+    return item["custom_id"], content.strip(), body.get("model")
+
+class LabelStore:
+    """按 custom_id 保存已完成的标注，供后续批处理任务跳过已标注公式"""
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS labels "
+                          "(custom_id TEXT PRIMARY KEY, chinese TEXT NOT NULL, model TEXT, updated REAL)")
+        self.conn.commit()
+
+    def get(self, custom_id):
+        row = self.conn.execute("SELECT chinese FROM labels WHERE custom_id = ?", (custom_id,)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, custom_id):
+        return self.conn.execute("SELECT 1 FROM labels WHERE custom_id = ?", (custom_id,)).fetchone() is not None
+
+    def put_many(self, labels):
+        """labels: [(custom_id, 标注文本, 模型)]；同一 id 以最新结果为准"""
+        now = time.time()
+        cursor = self.conn.executemany("INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?)",
+                                       ((custom_id, chinese, model, now) for custom_id, chinese, model in labels))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def import_results(self, path, batch_size=10000):
+        """导入批处理输出文件，返回 (导入数, 失败数)"""
+        imported = failed = 0
+        batch = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                label = parse_batch_result(loads(line))
+                if label is None:
+                    failed += 1
+                    continue
+                batch.append(label)
+                if len(batch) >= batch_size:
+                    imported += self.put_many(batch)
+                    batch = []
+        if batch:
+            imported += self.put_many(batch)
+        return imported, failed
+
+    def unlabelled(self, entries, chunk=500):
+        """过滤掉已有标注的记录（按 custom_id 分块批量查询）"""
+        buffer = []
+        for entry in entries:
+            buffer.append(entry)
+            if len(buffer) >= chunk:
+                yield from self._filter(buffer)
+                buffer = []
+        yield from self._filter(buffer)
+
+    def _filter(self, entries):
+        if not entries:
+            return
+        ids = [entry["custom_id"] for entry in entries]
+        placeholders = ",".join("?" * len(ids))
+        done = {row[0] for row in self.conn.execute(
+            f"SELECT custom_id FROM labels WHERE custom_id IN ({placeholders})", ids)}
+        for entry in entries:
+            if entry["custom_id"] not in done:
+                yield entry
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+def read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="custom_id 登记表与标注结果库")
+    parser.add_argument("db", help="标注库路径（SQLite）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="导入批处理输出文件中的标注")
+    p.add_argument("results", nargs="+")
+    p = sub.add_parser("pending", help="从数据集中筛出尚未标注的记录")
+    p.add_argument("splits")
+    p.add_argument("output")
+    p = sub.add_parser("export", help="导出带中文标注的数据集（LaTeX, CHINESE）")
+    p.add_argument("splits")
+    p.add_argument("output")
+    p = sub.add_parser("id", help="打印公式的 custom_id")
+    p.add_argument("latex")
+    sub.add_parser("stats", help="登记的 id 数与已标注数")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "id":
+        canonical = canonical_latex(args.latex)
+        print(f"{formula_id(formula_key(canonical))}\t{canonical}")
+        raise SystemExit
+    store = LabelStore(args.db)
+    if args.command == "import":
+        for path in args.results:
+            imported, failed = store.import_results(path)
+            logger.info(f"{path}: 导入 {imported} 条标注，跳过失败请求 {failed} 条")
+    elif args.command == "pending":
+        written = 0
+        with open(args.output, 'w', encoding='utf-8') as out:
+            for entry in store.unlabelled(read_jsonl(args.splits)):
+                out.write(dumps_line(entry))
+                written += 1
+        total = sum(1 for _ in read_jsonl(args.splits))
+        logger.info(f"共 {total} 条记录，已标注 {total - written} 条，待标注 {written} 条 → {args.output}")
+    elif args.command == "export":
+        labelled = 0
+        with open(args.output, 'w', encoding='utf-8') as out:
+            for entry in read_jsonl(args.splits):
+                chinese = store.get(entry["custom_id"])
+                if chinese is not None:
+                    out.write(dumps_line({"LaTeX": entry["LaTeX"], "CHINESE": chinese}))
+                    labelled += 1
+        logger.info(f"导出 {labelled} 条已标注公式 → {args.output}")
+    else:
+        registry = IdRegistry(args.db)
+        print(f"登记的 custom_id: {registry.count()}")
+        print(f"已标注: {store.count()}")
+        registry.close()
+    store.close()
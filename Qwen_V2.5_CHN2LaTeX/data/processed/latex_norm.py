@@ -0,0 +1,238 @@
+import argparse
+import re
+import sys
+
+# 规范化规则有变化时递增；增量去重索引据此判断旧摘要是否还能复用
+NORMALIZER_VERSION = 1
+
+# === 词法 ===
+# 控制词 | 控制符号 | 空白（含 ~）| 花括号 | 普通字符串
+TOKEN_PATTERN = re.compile(r"\\[A-Za-z]+|\\.|[\s~]+|[{}]|[^\\{}\s~]+", re.DOTALL)
+
+ASCII_LETTERS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+ALNUM = ASCII_LETTERS | frozenset("0123456789")
+
+# === 规则表 ===
+# 同义命令统一为一种写法
+COMMAND_ALIASES = {
+    "\\le": "\\leq",
+    "\\ge": "\\geq",
+    "\\ne": "\\neq",
+    "\\to": "\\rightarrow",
+    "\\gets": "\\leftarrow",
+    "\\land": "\\wedge",
+    "\\lor": "\\vee",
+    "\\lnot": "\\neg",
+    "\\owns": "\\ni",
+    "\\lbrace": "\\{",
+    "\\rbrace": "\\}",
+    "\\lbrack": "[",
+    "\\rbrack": "]",
+    "\\vert": "|",
+    "\\Vert": "\\|",
+    "\\dfrac": "\\frac",
+    "\\tfrac": "\\frac",
+    "\\dbinom": "\\binom",
+    "\\tbinom": "\\binom",
+    "\\bm": "\\boldsymbol",
+}
+
+# 只影响排版样式或间距、不改变公式内容的命令，直接丢弃
+DROP_COMMANDS = frozenset({
+    "\\displaystyle", "\\textstyle", "\\scriptstyle", "\\scriptscriptstyle",
+    "\\quad", "\\qquad", "\\thinspace", "\\medspace", "\\thickspace", "\\negthinspace",
+})
+DROP_SYMBOLS = frozenset({"\\,", "\\:", "\\;", "\\!", "\\>", "\\ "})
+
+# 参数按文本排版的命令：参数中的空白有意义，只合并不删除
+TEXT_COMMANDS = frozenset({
+    "\\text", "\\textrm", "\\textbf", "\\textit", "\\textsf", "\\texttt", "\\textup",
+    "\\textnormal", "\\mbox", "\\hbox", "\\emph",
+})
+
+TRAILING_PUNCTUATION = ".,;"
+# 这些命令后面的 . 是空定界符，不是标点
+DELIMITER_PREFIXES = ("\\right", "\\left", "\\middle", "\\big", "\\Big")
+
+def _is_word(item):
+    return len(item) > 1 and item[0] == "\\" and item[1] in ASCII_LETTERS
+
+def _join(items):
+    """拼接为字符串；控制词后紧跟字母时补一个空格，否则会粘成另一个命令"""
+    parts = []
+    prev_word = False
+    for item in items:
+        if prev_word and item[0] in ASCII_LETTERS:
+            parts.append(" ")
+        parts.append(item)
+        prev_word = _is_word(item)
+    return "".join(parts)
+
+def _close_group(items, parent, text_mode):
+    """把一个花括号组并入上一层；去掉冗余的花括号"""
+    if not text_mode:
+        if len(items) == 1:
+            item = items[0]
+            if item[0] == "{":
+                # {{…}} → {…}
+                parent.append(item)
+                return
+            # 单个字母数字或控制词加不加括号都一样；^ _ 之后的单个记号同理
+            if len(item) == 1 and (item in ALNUM or (parent and parent[-1][-1] in "^_")) or _is_word(item):
+                parent.append(item)
+                return
+    parent.append("{" + _join(items) + "}")
+
+# === 规范化 ===
+def canonical_latex(latex):
+    """返回 LaTeX 公式的规范形式，只用于计算去重键，不用于输出
+
+    - 数学模式下删除全部空白与间距命令，文本命令参数中的连续空白合并为一个空格
+    - 删除 \\displaystyle 等样式命令，统一同义命令（\\le → \\leq、\\dfrac → \\frac 等）
+    - 去掉冗余花括号：{\\varepsilon}、x^{2}、\\mathbb{R}、{{a+b}} 中的外层括号
+    - 去掉末尾的句号、逗号、分号（维基百科行间公式常带标点）
+    花括号不配对时按普通字符处理，不会抛出异常。
+    """
+    items = []
+    stack = []      # [(上一层 items, 上一层是否文本模式)]
+    text_mode = False
+    for token in TOKEN_PATTERN.findall(latex):
+        first = token[0]
+        if first == "\\":
+            if len(token) == 2 and token[1] not in ASCII_LETTERS:
+                if token in DROP_SYMBOLS:
+                    if text_mode and (not items or items[-1] != " "):
+                        items.append(" ")
+                    continue
+                items.append(token)
+                continue
+            if token in DROP_COMMANDS:
+                continue
+            items.append(COMMAND_ALIASES.get(token, token))
+        elif first == "{":
+            stack.append((items, text_mode))
+            text_mode = text_mode or (bool(items) and items[-1] in TEXT_COMMANDS)
+            items = []
+        elif first == "}":
+            if not stack:
+                items.append("}")
+                continue
+            parent, parent_text = stack.pop()
+            _close_group(items, parent, text_mode and not parent_text)
+            items, text_mode = parent, parent_text
+        elif first.isspace() or first == "~":
+            if text_mode and items and items[-1] != " ":
+                items.append(" ")
+        else:
+            items.append(token)
+
+    # 未闭合的花括号原样保留
+    while stack:
+        parent, text_mode = stack.pop()
+        parent.append("{")
+        parent.extend(items)
+        items = parent
+
+    # 整个公式只是一个花括号组
+    if len(items) == 1 and items[0][0] == "{" and len(items[0]) > 1:
+        return canonical_latex(items[0][1:-1])
+
+    # 末尾标点；\right. 之类的定界符不能去掉
+    while items and items[-1][0] != "\\" and not (len(items) > 1 and items[-2].startswith(DELIMITER_PREFIXES)):
+        stripped = items[-1].rstrip(TRAILING_PUNCTUATION)
+        if stripped == items[-1]:
+            break
+        if stripped:
+            items[-1] = stripped
+            break
+        items.pop()
+    return _join(items)
+
+# === 回归用例 ===
+# 每对公式规范化后必须相同
+EQUIVALENT_PAIRS = [
+    ("\\varepsilon", "\\varepsilon "),
+    ("\\varepsilon", "{\\varepsilon}"),
+    ("\\varepsilon", "{{\\varepsilon}}"),
+    ("\\displaystyle \\sum_{i=1}^{n} i", "\\sum_{i=1}^n i"),
+    ("\\displaystyle{\\frac{a}{b}}", "\\frac ab"),
+    ("\\dfrac{1}{2}", "\\frac{1}{2}"),
+    ("x^{2} + y^{2} = z^{2}", "x^2+y^2=z^2"),
+    ("a_{i}", "a_i"),
+    ("e^{i\\pi}+1=0", "e^{i \\pi} + 1 = 0"),
+    ("\\mathbb{R}", "\\mathbb R"),
+    ("\\alpha\\beta", "\\alpha \\beta"),
+    ("\\alpha b", "\\alpha  b"),
+    ("a \\le b", "a\\leq b"),
+    ("a \\ne b", "a\\neq b"),
+    ("f: X \\to Y", "f:X\\rightarrow Y"),
+    ("\\lbrace x \\rbrace", "\\{ x \\}"),
+    ("\\vert x \\vert", "|x|"),
+    ("a \\, b \\; c \\! d", "abcd"),
+    ("x = 1, \\quad y = 2", "x=1,y=2"),
+    ("a~b", "a b"),
+    ("E = mc^2.", "E = mc^2"),
+    ("E = mc^2 ,", "E = mc^2"),
+    ("\\lambda_k(\\Omega).", "\\lambda_k(\\Omega)"),
+    ("\\int_0^1 f(x)\\,dx", "\\int_{0}^{1} f(x) dx"),
+    ("\\text{if  } x", "\\text{if } x"),
+    ("\\left( x \\right)", "\\left(x\\right)"),
+    ("\\sqrt{2}", "\\sqrt 2"),
+    ("{a+b}", "{{a+b}}"),
+    ("\\bm{x}", "\\boldsymbol x"),
+    ("\n\\sum_{k}\tk\n", "\\sum_k k"),
+]
+
+# 每对公式规范化后必须不同
+DISTINCT_PAIRS = [
+    ("\\alpha b", "\\alphab"),
+    ("x^{23}", "x^23"),
+    ("\\frac{ab}{c}", "\\frac abc"),
+    ("\\text{if x}", "\\text{ifx}"),
+    ("\\text{a b}", "\\text{ab}"),
+    ("a+b", "a-b"),
+    ("\\{x\\}", "{x}"),
+    ("\\left. f \\right|", "\\left. f \\right."),
+    ("\\bigl( x \\bigr.", "\\bigl( x \\bigr"),
+    ("\\sum_{i}^{n}", "\\sum_{i}^{m}"),
+    ("\\mathbb{R}", "\\mathbf{R}"),
+    ("\\le", "\\lt"),
+    ("x_{i+1}", "x_i+1"),
+    ("\\sqrt{a}b", "\\sqrt{ab}"),
+    ("a\\\\b", "ab"),
+    ("1.5", "15"),
+    ("a{+}b", "a+b"),
+]
+
+def self_check():
+    """运行回归用例，返回失败描述列表（空列表表示全部通过）"""
+    failures = []
+    for a, b in EQUIVALENT_PAIRS:
+        ca, cb = canonical_latex(a), canonical_latex(b)
+        if ca != cb:
+            failures.append(f"应相同: {a!r} → {ca!r}  vs  {b!r} → {cb!r}")
+    for a, b in DISTINCT_PAIRS:
+        ca, cb = canonical_latex(a), canonical_latex(b)
+        if ca == cb:
+            failures.append(f"应不同: {a!r} 与 {b!r} 都规范化为 {ca!r}")
+    # 规范形式必须是不动点，否则同一公式多次规范化会得到不同的键
+    for a, _ in EQUIVALENT_PAIRS + DISTINCT_PAIRS:
+        ca = canonical_latex(a)
+        if canonical_latex(ca) != ca:
+            failures.append(f"不是不动点: {a!r} → {ca!r} → {canonical_latex(ca)!r}")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LaTeX 公式规范化（去重键）")
+    parser.add_argument("--check", action="store_true", help="运行等价/不等价回归用例")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = self_check()
+        for failure in failures:
+            print(failure)
+        print(f"用例 {len(EQUIVALENT_PAIRS)} 对等价 + {len(DISTINCT_PAIRS)} 对不等价，失败 {len(failures)} 项")
+        sys.exit(1 if failures else 0)
+    # 否则逐行读取标准输入，输出规范形式
+    for line in sys.stdin:
+        print(canonical_latex(line.rstrip("\n")))
@@ -0,0 +1,56 @@
+import re
+from bisect import bisect_right
+
+# 批量扫描时用于分隔摘要的字符，公式内容不允许跨越它
+SEPARATOR = "\x00"
+
+# === 单遍扫描器 ===
+# 所有定界形式合并为一个预编译正则，从左到右一次扫描：
+#   \$          转义的美元符号，跳过（不作为定界符）
+#   $$…$$       行间公式
+#   $…$         行内公式，内容中允许 \$ 等转义
+#   \(…\)       行内公式
+#   \[…\]       行间公式
+#   \x          其余转义序列整体跳过，避免 \\$ 之类被误判
+LATEX_SPAN_PATTERN = re.compile(r"""
+      \\\$
+    | \$\$ (?P<display>[^$\\\x00]*(?:\\[^\x00][^$\\\x00]*)*) \$\$
+    | \$ (?!\$) (?P<inline>[^$\\\x00]*(?:\\[^\x00][^$\\\x00]*)*) \$
+    | \\\( (?P<paren>[^\\\x00]*(?:\\[^)\x00][^\\\x00]*)*) \\\)
+    | \\\[ (?P<bracket>[^\\\x00]*(?:\\[^\]\x00][^\\\x00]*)*) \\\]
+    | \\.
+""", re.VERBOSE | re.DOTALL)
+# 内容部分采用“展开循环”写法（普通字符串 + 转义序列交替），失配时回溯是线性的
+
+def scan_formulas(text):
+    """提取一段文本中的全部公式（按出现顺序），返回去掉首尾空白的内容列表"""
+    formulas = []
+    for match in LATEX_SPAN_PATTERN.finditer(text):
+        # 只有四种公式分支带命名分组，转义分支的 lastgroup 为 None
+        if match.lastgroup:
+            content = match.group(match.lastgroup).strip()
+            if content:
+                formulas.append(content)
+    return formulas
+
+def scan_batch(texts):
+    """对一批摘要做一次线性扫描，返回与输入一一对应的公式列表"""
+    texts = list(texts)
+    results = [[] for _ in texts]
+    if not texts:
+        return results
+
+    # 记录每段文本在拼接串中的起始位置，用于把匹配映射回所属摘要
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + 1
+    joined = SEPARATOR.join(texts)
+
+    for match in LATEX_SPAN_PATTERN.finditer(joined):
+        if match.lastgroup:
+            content = match.group(match.lastgroup).strip()
+            if content:
+                results[bisect_right(starts, match.start()) - 1].append(content)
+    return results
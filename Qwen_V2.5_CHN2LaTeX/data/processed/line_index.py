@@ -0,0 +1,236 @@
+import argparse
+import logging
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from block_jsonl import jsonl_size, open_jsonl
+from records import dumps_line, loads
+from wash_index import file_fingerprint
+
+logger = logging.getLogger("data_wash")
+
+# === 行号 → 字节偏移索引 ===
+INDEX_SUFFIX = ".lines"
+INDEX_MAGIC = b"LNIX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sI64s")  # 魔数、版本、原始文件指纹（wash_index.file_fingerprint）
+OFFSET_DTYPE = np.dtype("<u8")
+SCAN_CHUNK = 4 * 1024 * 1024
+
+def index_path(raw_file):
+    return Path(str(raw_file) + INDEX_SUFFIX)
+
+class LineIndex:
+    """原始数据的行号 → 字节偏移索引，保存在 <原始文件>.lines 中
+
+    - 文件头之后每个完整的行一个 uint64：该行结束（即下一行开始）的偏移，第 n 行占 ends[n-2]:ends[n-1]
+    - 只追加：打开或 refresh 时从已索引的位置继续扫描新增的行，查询时内存映射
+    - 没有换行符的最后一行（可能正被爬虫写入）不写入索引，但仍可按行号读取
+    - 原始文件被替换或截断（开头的指纹不同，或比已索引的位置短）时重建
+    - 块压缩的原始文件（*.gz）按解压后的偏移索引，读取一行只解压所在的块
+    行号从1计，与 datawash 输出中的 line / source_line 一致（空行也算一行）。
+    """
+    def __init__(self, raw_file, path=None):
+        self.raw_file = Path(raw_file)
+        self.path = Path(path) if path else index_path(self.raw_file)
+        self.ends = np.empty(0, dtype=OFFSET_DTYPE)
+        self.lines = 0
+        self.indexed = 0   # 已索引的字节数（最后一个完整行的结束偏移）
+        self.raw_size = 0
+        self.raw = None
+        self.refresh()
+
+    def _load(self):
+        """返回有效的已索引行数与结束偏移；索引不存在或已失效时返回 None"""
+        if not self.path.exists():
+            return None
+        with open(self.path, "rb") as f:
+            header = f.read(INDEX_HEADER.size)
+            if len(header) != INDEX_HEADER.size:
+                return None
+            magic, version, fingerprint = INDEX_HEADER.unpack(header)
+            if (magic, version) != (INDEX_MAGIC, INDEX_VERSION):
+                return None
+            if fingerprint.decode("ascii") != file_fingerprint(self.raw_file):
+                return None
+            # 写到一半的条目不算
+            lines = (os.fstat(f.fileno()).st_size - INDEX_HEADER.size) // OFFSET_DTYPE.itemsize
+            if not lines:
+                return 0, 0
+            f.seek(INDEX_HEADER.size + (lines - 1) * OFFSET_DTYPE.itemsize)
+            end = int.from_bytes(f.read(OFFSET_DTYPE.itemsize), "little")
+        return lines, end
+
+    def refresh(self):
+        """索引原始文件新增的完整行，返回新增行数"""
+        self._release()
+        raw_size = jsonl_size(self.raw_file)
+        loaded = self._load()
+        if loaded is None or loaded[1] > raw_size:
+            if self.path.exists():
+                logger.warning(f"原始文件已被替换或截断，重建行索引: {self.path}")
+            with open(self.path, "wb") as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, file_fingerprint(self.raw_file).encode("ascii")))
+            lines, end = 0, 0
+        else:
+            lines, end = loaded
+            size = INDEX_HEADER.size + lines * OFFSET_DTYPE.itemsize
+            if self.path.stat().st_size != size:
+                with open(self.path, "r+b") as f:
+                    f.truncate(size)
+
+        added = 0
+        if raw_size > end:
+            start = time.perf_counter()
+            with open_jsonl(self.raw_file, "rb") as raw, open(self.path, "ab") as out:
+                raw.seek(end)
+                pos = end
+                for chunk in iter(lambda: raw.read(SCAN_CHUNK), b""):
+                    ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 0x0A).astype(OFFSET_DTYPE)
+                    ends += pos + 1
+                    out.write(ends.tobytes())
+                    added += len(ends)
+                    pos += len(chunk)
+                    if len(ends):
+                        end = int(ends[-1])
+            raw_size = pos
+            if added:
+                logger.info(f"行索引新增 {added} 行，共 {lines + added} 行 → {self.path} "
+                            f"({time.perf_counter() - start:.1f}s)")
+
+        self.lines = lines + added
+        self.indexed = end
+        self.raw_size = raw_size
+        if self.lines:
+            self.ends = np.memmap(self.path, dtype=OFFSET_DTYPE, mode="r", offset=INDEX_HEADER.size,
+                                  shape=(self.lines,))
+        return added
+
+    def __len__(self):
+        """可读取的行数，含没有换行符的最后一行"""
+        return self.lines + (1 if self.raw_size > self.indexed else 0)
+
+    def span(self, line):
+        """第 line 行的 (起始偏移, 结束偏移)"""
+        if not 1 <= line <= len(self):
+            raise IndexError(f"行号超出范围: {line}（共 {len(self)} 行）")
+        start = int(self.ends[line - 2]) if line > 1 else 0
+        end = int(self.ends[line - 1]) if line <= self.lines else self.raw_size
+        return start, end
+
+    def _read(self, start, end):
+        if self.raw is None:
+            self.raw = open_jsonl(self.raw_file, "rb")
+        self.raw.seek(start)
+        return self.raw.read(end - start)
+
+    def read(self, line):
+        """读取第 line 行的原始字节（含换行符）"""
+        return self._read(*self.span(line))
+
+    def read_range(self, first, count):
+        """读取从第 first 行起的 count 行（超出末尾的部分忽略），只做一次 seek"""
+        last = min(first + count - 1, len(self))
+        if count <= 0 or first > last:
+            return []
+        start, end = self.span(first)[0], self.span(last)[1]
+        return self._read(start, end).splitlines(keepends=True)
+
+    def read_many(self, lines):
+        """批量读取，返回与输入等长的列表；按偏移顺序访问原始文件，超出范围的行号为 None"""
+        lines = np.asarray(lines, dtype=np.int64)
+        result = [None] * len(lines)
+        valid = np.flatnonzero((lines >= 1) & (lines <= len(self)))
+        for i in valid[np.argsort(lines[valid], kind="stable")].tolist():
+            result[i] = self.read(int(lines[i]))
+        return result
+
+    def _release(self):
+        self.ends = np.empty(0, dtype=OFFSET_DTYPE)
+        # 块压缩文件的读取器缓存了块索引，新增的块要重新打开才能读到
+        if self.raw is not None:
+            self.raw.close()
+            self.raw = None
+
+    def close(self):
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# === 溯源 ===
+def reference_line(record):
+    """清洗输出中指向原始数据的行号：数据集为 source_line，重复/错误记录为 line"""
+    if isinstance(record, dict):
+        line = record.get("source_line", record.get("line"))
+        if isinstance(line, int):
+            return line
+    return None
+
+def decode_raw(line):
+    """原始行解码为 JSON；坏行原样返回字符串"""
+    try:
+        return loads(line)
+    except ValueError:
+        return line.decode("utf-8", "replace").rstrip("\n")
+
+def audit(raw_file, ref_file, out, limit=None, chunk=10000):
+    """逐条输出清洗记录与其指向的原始记录 {"line", "ref", "raw"}，返回输出条数
+
+    ref_file 为 datawash 的数据集、duplicates 或 error_log（*.gz 亦可）。
+    """
+    written = 0
+    with LineIndex(raw_file) as index, open_jsonl(ref_file, "rb") as f:
+        batch = []
+        for line in f:
+            if limit is not None and written + len(batch) >= limit:
+                break
+            if line.strip():
+                batch.append(loads(line))
+            if len(batch) >= chunk:
+                written += _audit_batch(index, batch, out)
+                batch = []
+        written += _audit_batch(index, batch, out)
+    return written
+
+def _audit_batch(index, records, out):
+    raws = index.read_many([reference_line(r) or 0 for r in records])
+    for record, raw in zip(records, raws):
+        out.write(dumps_line({"line": reference_line(record), "ref": record,
+                              "raw": decode_raw(raw) if raw is not None else None}))
+    return len(records)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="原始数据的行号索引：按行号读取原始记录，追溯清洗输出的来源")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="建立或增量更新 <原始文件>.lines")
+    p.add_argument("raw")
+    p = sub.add_parser("show", help="按行号（从1计）打印原始行")
+    p.add_argument("raw")
+    p.add_argument("first", type=int)
+    p.add_argument("count", type=int, nargs="?", default=1)
+    p = sub.add_parser("audit", help="把数据集/重复记录/错误记录与对应的原始记录并排输出为 JSONL")
+    p.add_argument("raw")
+    p.add_argument("refs", help="data_splits_*.jsonl、duplicates.jsonl 或 error_log.jsonl")
+    p.add_argument("--limit", type=int, default=None, help="最多输出多少条")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "build":
+        with LineIndex(args.raw) as index:
+            print(f"行数: {index.lines}  已索引 {index.indexed / 1024**2:.1f} MB  "
+                  f"索引 {index.path.stat().st_size / 1024**2:.1f} MB ({index.path})")
+    elif args.command == "show":
+        with LineIndex(args.raw) as index:
+            for line in index.read_range(args.first, args.count):
+                sys.stdout.write(line.decode("utf-8", "replace"))
+    else:
+        audit(args.raw, args.refs, sys.stdout, args.limit)
@@ -0,0 +1,181 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+from extractors import get_extractor
+from wiki_api import build_records
+
+logger = logging.getLogger("crawler")
+
+# 队列结束标记
+_DONE = object()
+
+def parse_page(extractor_name, url, html):
+    """解析进程中执行：HTML -> (url, 记录列表, 公式个数)"""
+    title, formulas = get_extractor(extractor_name)(html)
+    return url, build_records(title, formulas, url), len(formulas)
+
+# === 抓取/解析/写入 三段流水线 ===
+class CrawlPipeline:
+    """生产者/消费者流水线：抓取线程 -> 有界队列 -> 解析进程池 -> 单一写入者
+
+    - 抓取线程把原始页面放入容量为 queue_depth 的队列，队列满时阻塞（反压）
+    - 分发线程把页面提交给进程池，在途解析任务同样不超过 queue_depth
+    - 主线程是唯一的写入者：写入 sink，并在写入后更新前沿
+    """
+    def __init__(self, sink, fetch_workers=8, parse_workers=None, queue_depth=64,
+                 extractor="auto", frontier=None, session_factory=requests.Session):
+        self.sink = sink
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.queue_depth = queue_depth
+        self.extractor = extractor
+        self.frontier = frontier
+        self.session_factory = session_factory
+        self.stats = {
+            "fetched": 0, "fetch_errors": 0, "fetch_blocked": 0,
+            "parsed": 0, "parse_errors": 0,
+            "written": 0, "records": 0,
+        }
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _fetch_worker(self, urls, page_queue, write_queue):
+        # 无论如何退出都要发出结束标记，否则分发线程与写入者会一直等待
+        try:
+            session = self.session_factory()
+            while True:
+                with self._lock:
+                    url = next(urls, None)
+                if url is None:
+                    break
+                try:
+                    response = session.get(url)
+                    response.raise_for_status()
+                    # 解码正文也可能出错，同样记为抓取失败
+                    item = (url, response.text)
+                    self._count("fetched")
+                except Exception as e:
+                    self._count("fetch_errors")
+                    write_queue.put(("failed", url, e))
+                    continue
+                try:
+                    page_queue.put_nowait(item)
+                except queue.Full:
+                    # 解析跟不上，抓取线程在此等待
+                    self._count("fetch_blocked")
+                    page_queue.put(item)
+        except Exception as e:
+            logger.error(f"抓取线程异常退出: {str(e)}", exc_info=True)
+        finally:
+            page_queue.put(_DONE)
+
+    def _dispatch(self, pool, page_queue, write_queue):
+        in_flight = threading.BoundedSemaphore(self.queue_depth)
+        finished_fetchers = 0
+        broken = None
+
+        def on_done(future):
+            try:
+                write_queue.put(("parsed",) + future.result())
+                self._count("parsed")
+            except Exception as e:
+                self._count("parse_errors")
+                write_queue.put(("failed", future.url, e))
+            # 结果入队后才释放名额，保证收尾时所有结果都已交给写入者
+            in_flight.release()
+
+        try:
+            while finished_fetchers < self.fetch_workers:
+                item = page_queue.get()
+                if item is _DONE:
+                    finished_fetchers += 1
+                    continue
+                url, html = item
+                if broken is not None:
+                    # 进程池已不可用：其余页面记为失败（下次运行重试），抓取线程照常取走队列后退出
+                    self._count("parse_errors")
+                    write_queue.put(("failed", url, broken))
+                    continue
+                in_flight.acquire()
+                try:
+                    future = pool.submit(parse_page, self.extractor, url, html)
+                except Exception as e:
+                    in_flight.release()
+                    logger.error(f"提交解析任务失败，其余页面将记为失败: {str(e)}", exc_info=True)
+                    broken = e
+                    self._count("parse_errors")
+                    write_queue.put(("failed", url, e))
+                    continue
+                future.url = url
+                future.add_done_callback(on_done)
+
+            # 收回全部名额即表示所有解析任务都已完成
+            for _ in range(self.queue_depth):
+                in_flight.acquire()
+        except Exception as e:
+            logger.error(f"分发线程异常退出: {str(e)}", exc_info=True)
+        finally:
+            write_queue.put(_DONE)
+
+    def run(self, urls):
+        """抓取并解析给定的URL，返回写入的记录数"""
+        urls = iter(urls)
+        page_queue = queue.Queue(maxsize=self.queue_depth)
+        write_queue = queue.Queue(maxsize=self.queue_depth)
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            fetchers = [
+                threading.Thread(target=self._fetch_worker, args=(urls, page_queue, write_queue), daemon=True)
+                for _ in range(self.fetch_workers)
+            ]
+            dispatcher = threading.Thread(target=self._dispatch, args=(pool, page_queue, write_queue), daemon=True)
+            for thread in fetchers:
+                thread.start()
+            dispatcher.start()
+
+            # 主线程：唯一写入者
+            while True:
+                item = write_queue.get()
+                if item is _DONE:
+                    break
+                if item[0] == "failed":
+                    _, url, error = item
+                    logger.error(f"爬取失败: {url} - {str(error)}")
+                    if self.frontier:
+                        self.frontier.mark_failed(url, error)
+                    continue
+                _, url, records, found_count = item
+                self.sink.write_batch(records)
+                self.stats["written"] += 1
+                self.stats["records"] += len(records)
+                if self.frontier:
+                    self.frontier.mark_done(url, found_count)
+
+            for thread in fetchers:
+                thread.join()
+            dispatcher.join()
+
+        self.elapsed = time.perf_counter() - start
+        logger.info(self.summary())
+        return self.stats["records"]
+
+    def summary(self):
+        elapsed = max(self.elapsed, 1e-9)
+        s = self.stats
+        return (f"流水线完成，用时 {elapsed:.2f}s | "
+                f"抓取 {s['fetched']} 页 ({s['fetched']/elapsed:.1f} 页/秒, 失败 {s['fetch_errors']}, "
+                f"因反压等待 {s['fetch_blocked']} 次) | "
+                f"解析 {s['parsed']} 页 ({s['parsed']/elapsed:.1f} 页/秒, 失败 {s['parse_errors']}, "
+                f"{self.parse_workers} 进程) | "
+                f"写入 {s['written']} 页 {s['records']} 条记录 ({s['records']/elapsed:.1f} 条/秒)")
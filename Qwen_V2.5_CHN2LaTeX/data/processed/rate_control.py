@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("crawler")
+
+# 视为“服务器要求减速”的状态码
+THROTTLE_STATUS = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或HTTP日期），返回需要等待的秒数，无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# === 单主机令牌桶 ===
+class HostBucket:
+    """单个主机的令牌桶，速率按 AIMD 调整
+
+    - 每个正常响应把速率加 increase（加性增）
+    - 429/5xx 或带 Retry-After 的响应把速率乘以 decrease（乘性减），
+      同一个发送间隔内的多次限流只减一次，避免并发在途请求把速率一下压到底
+    - Retry-After 指定的时间内该主机暂停发送
+    """
+    def __init__(self, host, rate=2.0, min_rate=0.2, max_rate=50.0, increase=0.2, decrease=0.5, burst=1.0):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "decreases": 0, "retry_after": 0,
+                      "waited": 0.0, "peak_rate": rate}
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预订一个令牌，返回发送前需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 允许令牌为负：负数部分即排在前面的请求，按当前速率折算为等待时间
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            wait = max(wait, self.blocked_until - now)
+            self.stats["requests"] += 1
+            self.stats["waited"] += wait
+            return wait
+
+    def on_response(self, status, retry_after=None):
+        """根据响应调整速率"""
+        with self._lock:
+            now = time.monotonic()
+            if status not in THROTTLE_STATUS and retry_after is None:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+                self.stats["peak_rate"] = max(self.stats["peak_rate"], self.rate)
+                return
+
+            self.stats["throttled"] += 1
+            if now - self.last_decrease >= 1.0 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.last_decrease = now
+                self.stats["decreases"] += 1
+            if retry_after is not None:
+                self.stats["retry_after"] += 1
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            # 清空积攒的令牌，恢复发送后从新速率开始
+            self.tokens = min(self.tokens, 0.0)
+            logger.warning(f"主机 {self.host} 要求减速（状态码 {status}"
+                           f"{f'，Retry-After {retry_after:.1f}s' if retry_after is not None else ''}），"
+                           f"速率降至 {self.rate:.2f} 次/秒")
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, rate=round(self.rate, 3), waited=round(self.stats["waited"], 3))
+
+# === 多主机速率控制器 ===
+class RateController:
+    """按主机维护 HostBucket；同步调用方用 acquire，asyncio 调用方用 acquire_async"""
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=50.0, increase=0.2, decrease=0.5, burst=1.0):
+        self.options = {"rate": rate, "min_rate": min_rate, "max_rate": max_rate,
+                        "increase": increase, "decrease": decrease, "burst": burst}
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.buckets:
+                self.buckets[host] = HostBucket(host, **self.options)
+            return self.buckets[host]
+
+    def acquire(self, url):
+        """阻塞到该主机允许发送下一个请求"""
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url):
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def observe(self, url, status, headers=None):
+        """把响应状态码和 Retry-After 反馈给对应主机"""
+        retry_after = parse_retry_after(headers.get("Retry-After")) if headers else None
+        self.bucket(url).on_response(status, retry_after)
+
+    def metrics(self):
+        """{主机: {rate, requests, throttled, decreases, retry_after, waited, peak_rate}}"""
+        with self._lock:
+            buckets = list(self.buckets.values())
+        return {bucket.host: bucket.metrics() for bucket in buckets}
+
+    def summary(self):
+        parts = []
+        for host, m in self.metrics().items():
+            parts.append(f"{host}: 当前 {m['rate']:.2f} 次/秒（峰值 {m['peak_rate']:.2f}），"
+                         f"请求 {m['requests']}，限流 {m['throttled']} 次，"
+                         f"Retry-After {m['retry_after']} 次，累计等待 {m['waited']:.1f}s")
+        return "速率控制 | " + ("; ".join(parts) if parts else "无请求")
+
+# === requests 接入 ===
+class RateLimitedAdapter(HTTPAdapter):
+    """发送前按主机取令牌，收到响应后反馈状态码；controller 为 None 时与 HTTPAdapter 相同
+
+    被限流的响应（429/5xx）在降速后重发，最多 throttle_retries 次；
+    状态码重试交给这里而不是 urllib3 的 Retry，控制器才能看到每一次限流。
+    """
+    def __init__(self, controller=None, throttle_retries=3, **kwargs):
+        self.controller = controller
+        self.throttle_retries = throttle_retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.controller is None:
+            return super().send(request, **kwargs)
+        for attempt in range(self.throttle_retries + 1):
+            self.controller.acquire(request.url)
+            response = super().send(request, **kwargs)
+            self.controller.observe(request.url, response.status_code, response.headers)
+            if response.status_code not in THROTTLE_STATUS or attempt == self.throttle_retries:
+                return response
+            response.close()
+
+def mount_rate_limit(session, controller, max_retries=0, throttle_retries=3):
+    """把限速适配器挂到会话上，返回该会话"""
+    adapter = RateLimitedAdapter(controller, throttle_retries=throttle_retries, max_retries=max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
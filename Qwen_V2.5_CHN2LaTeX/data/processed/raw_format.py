@@ -0,0 +1,152 @@
+import argparse
+import logging
+import re
+import time
+
+from block_jsonl import open_jsonl
+from records import RawRecord, dumps_line, loads
+
+logger = logging.getLogger("crawler")
+
+# === 中文描述模板 ===
+# 原始数据中每条公式只存一次：{"title", "latex", "source", "variants": [模板编号...]}，
+# 中文描述在导出训练数据时再由模板展开。编号一经使用不能改动，只能追加。
+DESCRIPTION_TEMPLATES = [
+    "{title}的公式",
+    "{title}的数学表达式",
+    "如何用LaTeX表示{title}",
+    "{title}的标准写法",
+    "论文《{title}》中的公式",
+]
+# 早期爬虫写出的 arXiv 描述带有残留的占位标记；转换时按对应的模板解析，标记随之去掉
+LEGACY_TEMPLATES = [
+    (4, "论文《{title}[](@replace=10001)》中的公式"),
+]
+WIKI_VARIANTS = [0, 1, 2, 3]
+ARXIV_VARIANTS = [4]
+
+def compact_record(title, latex, source, variants):
+    return RawRecord(latex, source, title, list(variants))
+
+def arxiv_record(title, formula):
+    """arXiv 论文摘要中的一条公式"""
+    return compact_record(title, formula, "arXiv", ARXIV_VARIANTS)
+
+def is_compact(record):
+    if isinstance(record, RawRecord):
+        return record.variants is not None
+    return "variants" in record
+
+def expand_record(record):
+    """展开为旧格式的 {"chinese", "latex", "source"} 记录列表；旧格式记录原样返回
+
+    record 可以是 RawRecord 或解码后的字典（字典先按 RawRecord 校验）。
+    """
+    if not is_compact(record):
+        return [record.to_dict() if isinstance(record, RawRecord) else record]
+    if not isinstance(record, RawRecord):
+        record = RawRecord.from_dict(record)
+    return [{"chinese": DESCRIPTION_TEMPLATES[v].format(title=record.title),
+             "latex": record.latex, "source": record.source}
+            for v in record.variants]
+
+# 按模板反解标题；更具体（更长）的模板先匹配（“论文《…》中的公式”也以“的公式”结尾）
+_TEMPLATE_PATTERNS = [
+    (v, re.compile(re.escape(t).replace(re.escape("{title}"), "(?P<title>.+)") + r"\Z", re.DOTALL))
+    for v, t in sorted(list(enumerate(DESCRIPTION_TEMPLATES)) + LEGACY_TEMPLATES, key=lambda item: -len(item[1]))]
+
+def match_template(chinese):
+    """返回 (模板编号, 标题)；不是由模板生成的描述返回 None"""
+    if not isinstance(chinese, str):
+        return None
+    for variant, pattern in _TEMPLATE_PATTERNS:
+        match = pattern.match(chinese)
+        if match:
+            return variant, match.group("title")
+    return None
+
+# === 旧格式转换 ===
+LEGACY_FIELDS = {"chinese", "latex", "source"}
+
+def compact_lines(lines):
+    """把旧格式的 JSONL 行流转换为紧凑格式的行流
+
+    相邻的、latex/source/标题都相同的模板描述合并为一条；无法解析的行、
+    不是模板生成的描述原样保留（datawash 两种格式都能读）。
+    """
+    group = None
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = loads(line)
+            # 只合并恰好由 chinese/latex/source 组成的记录，其余字段不能丢
+            matched = match_template(record["chinese"]) if record.keys() == LEGACY_FIELDS else None
+        except (ValueError, AttributeError):
+            record, matched = None, None
+        if matched is not None:
+            variant, title = matched
+            key = (title, record.get("latex"), record.get("source"))
+            if group is not None and group[0] == key and variant not in group[1]:
+                group[1].append(variant)
+                continue
+            if group is not None:
+                yield dumps_line(compact_record(*group[0], group[1]))
+            group = (key, [variant])
+            continue
+        if group is not None:
+            yield dumps_line(compact_record(*group[0], group[1]))
+            group = None
+        yield line if line.endswith('\n') else line + '\n'
+    if group is not None:
+        yield dumps_line(compact_record(*group[0], group[1]))
+
+def convert_file(src, dst):
+    """把旧格式原始数据转换为紧凑格式，返回 (输入行数, 输出行数)；*.gz 文件按块压缩格式读写"""
+    counts = [0, 0]
+    def counted(f):
+        for line in f:
+            counts[0] += 1
+            yield line
+    start = time.perf_counter()
+    with open_jsonl(src, 'r') as f, open_jsonl(dst, 'w') as out:
+        for line in compact_lines(counted(f)):
+            out.write(line)
+            counts[1] += 1
+    logger.info(f"转换完成: {counts[0]} 行 → {counts[1]} 行 ({time.perf_counter() - start:.1f}s)")
+    return tuple(counts)
+
+def expand_file(src, dst):
+    """把紧凑格式展开为旧格式（每种描述一行），返回输出行数"""
+    written = 0
+    with open_jsonl(src, 'r') as f, open_jsonl(dst, 'w') as out:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records = expand_record(loads(line))
+            except (ValueError, KeyError, IndexError, TypeError):
+                out.write(line if line.endswith('\n') else line + '\n')
+                written += 1
+                continue
+            for record in records:
+                out.write(dumps_line(record))
+            written += len(records)
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="原始数据格式转换：旧格式（每种描述一行）↔ 紧凑格式（每条公式一行）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("compact", help="旧格式 → 紧凑格式")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p = sub.add_parser("expand", help="紧凑格式 → 旧格式（导出训练数据时展开描述）")
+    p.add_argument("src")
+    p.add_argument("dst")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "compact":
+        convert_file(args.src, args.dst)
+    else:
+        logger.info(f"展开完成: {expand_file(args.src, args.dst)} 行 → {args.dst}")
@@ -0,0 +1,87 @@
+import logging
+import time
+from pathlib import Path
+
+from block_jsonl import BLOCK_SUFFIX, is_blocked, move_jsonl, open_jsonl, sync_file
+from records import dumps_line
+
+logger = logging.getLogger("crawler")
+
+# === 流式记录写入器 ===
+class JsonlSink:
+    """把爬虫产出的记录批量追加到JSONL文件
+
+    - 每写入一批（一个页面）就 flush 到操作系统，进程崩溃不丢已写数据
+    - 距上次 fsync 超过 fsync_interval 秒时落盘一次，兼顾断电安全与吞吐
+    - 文件超过 max_bytes 时轮转为 <名称>.00001.jsonl 等编号文件，再从空文件继续写
+    - 文件名以 .gz 结尾时写块压缩格式（见 block_jsonl）：记录攒满一块或 fsync 时才压缩写出，
+      进程崩溃最多丢失 fsync_interval 秒内的记录；max_bytes 按解压后大小计
+    """
+    def __init__(self, path, max_bytes=None, fsync_interval=5.0):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = None
+        self.last_fsync = time.monotonic()
+        self.records = 0
+        self.batches = 0
+        self.rotations = 0
+        self._open()
+
+    def _open(self):
+        self.file = open_jsonl(self.path, 'a', buffering=1024 * 1024)
+
+    def write_batch(self, records):
+        """追加一批记录（字典或 records.RawRecord），返回写入条数"""
+        if not records:
+            return 0
+        self.file.write(''.join(map(dumps_line, records)))
+        self.file.flush()
+        self.records += len(records)
+        self.batches += 1
+        if time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.sync()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+        return len(records)
+
+    def consume(self, batches):
+        """消费生成器产出的记录批次，直到耗尽"""
+        for records in batches:
+            self.write_batch(records)
+        return self.records
+
+    def sync(self):
+        sync_file(self.file)
+        self.last_fsync = time.monotonic()
+
+    def rotate(self):
+        """把当前文件改名为下一个可用编号，并重新打开空文件"""
+        self.sync()
+        self.file.close()
+        # 块压缩文件的编号插在 .gz 之前：raw_data.00001.jsonl.gz
+        base = self.path.with_name(self.path.name[:-len(BLOCK_SUFFIX)]) if is_blocked(self.path) else self.path
+        extra = BLOCK_SUFFIX if is_blocked(self.path) else ""
+        index = 1
+        while True:
+            target = base.with_name(f"{base.stem}.{index:05d}{base.suffix}{extra}")
+            if not target.exists():
+                break
+            index += 1
+        move_jsonl(self.path, target)
+        self.rotations += 1
+        logger.info(f"数据文件已轮转: {target}")
+        self._open()
+
+    def close(self):
+        if self.file and not self.file.closed:
+            self.sync()
+            self.file.close()
+        logger.info(f"共写入 {self.records} 条数据（{self.batches} 批，轮转 {self.rotations} 次）到 {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,204 @@
+import json
+import os
+
+# === JSON 编解码器 ===
+# 按 orjson → 标准库 json 的顺序选第一个可用的；环境变量 CHN2LATEX_CODEC 可指定。
+# 两种实现输出逐字节相同：不转义非 ASCII 字符，分隔符不带空格（"a":1,"b":2）。
+# 解析失败统一抛出 json.JSONDecodeError（orjson.JSONDecodeError 是其子类），
+# 无效的 UTF-8 字节也算解析失败，与使用哪种实现无关。
+CODEC_ENV = "CHN2LATEX_CODEC"
+
+def _encode_default(obj):
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+def _orjson_codec():
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_encode_default).decode("utf-8")
+    return orjson.loads, dumps
+
+def _stdlib_codec():
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_encode_default)
+
+    def loads(data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            try:
+                data = bytes(data).decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise json.JSONDecodeError(f"无效的 UTF-8: {e.reason}", "", e.start) from None
+        return json.loads(data)
+    return loads, encoder.encode
+
+CODECS = {"orjson": _orjson_codec, "json": _stdlib_codec}
+
+def get_codec(name=None):
+    """返回 (名称, loads, dumps)；name 为 None 时选第一个可用的实现
+
+    loads 接受 str 或 UTF-8 字节，dumps 返回 str；Record 对象按 to_dict() 序列化。
+    """
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError(f"未知的编解码器: {name}（可选: {', '.join(CODECS)}）")
+        return (name,) + CODECS[name]()
+    for candidate, factory in CODECS.items():
+        try:
+            return (candidate,) + factory()
+        except ImportError:
+            continue
+    raise RuntimeError("没有可用的 JSON 编解码器")
+
+CODEC, loads, dumps = get_codec(os.environ.get(CODEC_ENV) or None)
+
+def dumps_line(obj):
+    """序列化为一行 JSONL（带换行符）"""
+    return dumps(obj) + "\n"
+
+# === 记录类型 ===
+class RecordError(ValueError):
+    """记录不符合模式：缺少必需字段或字段类型不对"""
+
+def _require_dict(data):
+    if not isinstance(data, dict):
+        raise RecordError("记录不是 JSON 对象")
+
+def _field(data, key, types, required=False):
+    """取出字段并检查类型；required 的字段不能缺失，也不能为空"""
+    value = data.get(key)
+    if value is None or (required and not value):
+        if required:
+            raise RecordError(f"缺少 '{key}' 字段")
+        return None
+    if not isinstance(value, types):
+        raise RecordError(f"'{key}' 字段类型错误: {type(value).__name__}")
+    return value
+
+class Record:
+    """带 __slots__ 的记录基类：比字典省内存，字段在解码时校验
+
+    子类在 _fields 中列出全部字段，实现 from_dict / to_dict。
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)})"
+
+    @classmethod
+    def from_json(cls, data):
+        """由一行 JSON（str 或字节）解码；JSON 无效时抛出 json.JSONDecodeError，不符合模式时抛出 RecordError"""
+        return cls.from_dict(loads(data))
+
+    def to_json(self):
+        return dumps(self.to_dict())
+
+class RawRecord(Record):
+    """原始数据（raw_data.jsonl）中的一条公式
+
+    两种格式都能表示（见 raw_format）：
+    - 紧凑格式 {"title", "latex", "source", "variants"}，variants 不为 None
+    - 旧格式 {"chinese", "latex", "source"}
+    """
+    __slots__ = ("latex", "source", "title", "variants", "chinese")
+    _fields = __slots__
+
+    def __init__(self, latex, source=None, title=None, variants=None, chinese=None):
+        self.latex = latex
+        self.source = source
+        self.title = title
+        self.variants = variants
+        self.chinese = chinese
+
+    @classmethod
+    def from_dict(cls, data):
+        _require_dict(data)
+        latex = _field(data, "latex", str, required=True)
+        variants = data.get("variants")
+        if variants is not None:
+            if not isinstance(variants, list) or not all(type(v) is int for v in variants):
+                raise RecordError("'variants' 字段应为整数列表")
+            title = _field(data, "title", str, required=True)
+        else:
+            title = None
+        return cls(latex, _field(data, "source", str), title, variants, _field(data, "chinese", str))
+
+    def to_dict(self):
+        if self.variants is not None:
+            return {"title": self.title, "latex": self.latex, "source": self.source, "variants": self.variants}
+        return {"chinese": self.chinese, "latex": self.latex, "source": self.source}
+
+# 批处理请求的默认参数（百炼 API）
+REQUEST_PARAMETERS = {"temperature": 0.2, "max_tokens": 256, "top_p": 0.9}
+
+class SplitRecord(Record):
+    """清洗后数据集（data_splits_*.jsonl）中的一条记录，兼作百炼批处理请求
+
+    to_dict 的字段与顺序同 datawash.build_entry；input 与 LaTeX 相同，不单独保存，
+    metadata 展开为 length / complexity 两个字段。
+    """
+    __slots__ = ("custom_id", "latex", "chinese", "meaning", "solve", "source_line", "length",
+                 "complexity", "request_parameters")
+    _fields = __slots__
+    # 子类可以放宽或收紧的必需字段
+    ID_REQUIRED = True
+    CHINESE_REQUIRED = False
+
+    def __init__(self, custom_id, latex, chinese=None, meaning=None, solve=None, source_line=None,
+                 length=None, complexity=None, request_parameters=None):
+        self.custom_id = custom_id
+        self.latex = latex
+        self.chinese = chinese
+        self.meaning = meaning
+        self.solve = solve
+        self.source_line = source_line
+        self.length = len(latex) if length is None else length
+        self.complexity = len(latex.split()) if complexity is None else complexity
+        self.request_parameters = REQUEST_PARAMETERS if request_parameters is None else request_parameters
+
+    @classmethod
+    def from_dict(cls, data):
+        _require_dict(data)
+        metadata = _field(data, "metadata", dict) or {}
+        return cls(
+            _field(data, "custom_id", str, required=cls.ID_REQUIRED),
+            _field(data, "LaTeX", str, required=True),
+            _field(data, "CHINESE", str, required=cls.CHINESE_REQUIRED),
+            _field(data, "Meaning", str),
+            data.get("Solve"),
+            _field(data, "source_line", int),
+            _field(metadata, "length", int),
+            _field(metadata, "complexity", int),
+            _field(data, "request_parameters", dict),
+        )
+
+    def to_dict(self):
+        return {
+            "custom_id": self.custom_id,
+            "method": "POST",
+            "input": self.latex,
+            "request_parameters": dict(self.request_parameters),
+            "LaTeX": self.latex,
+            "CHINESE": self.chinese,
+            "Meaning": self.meaning,
+            "Solve": self.solve,
+            "source_line": self.source_line,
+            "metadata": {"length": self.length, "complexity": self.complexity},
+        }
+
+class LabelledRecord(SplitRecord):
+    """已标注的记录：CHINESE 必须非空
+
+    UI 的示例数据只有 LaTeX / CHINESE 两个字段，因此 custom_id 可以没有。
+    """
+    __slots__ = ()
+    ID_REQUIRED = False
+    CHINESE_REQUIRED = True
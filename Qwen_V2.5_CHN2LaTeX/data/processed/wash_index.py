@@ -0,0 +1,159 @@
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+
+from block_jsonl import jsonl_size, open_jsonl, truncate_jsonl
+from hash_set import BloomFilter
+
+logger = logging.getLogger("data_wash")
+
+# 用原始文件开头这么多字节（块压缩文件按解压后内容）的哈希识别“同一个文件”，被替换或截断时从头处理
+FINGERPRINT_BYTES = 4096
+
+def file_fingerprint(path):
+    with open_jsonl(path, "rb") as f:
+        return hashlib.sha256(f.read(FINGERPRINT_BYTES)).hexdigest()
+
+# === 持久化去重索引 ===
+class WashIndex:
+    """基于SQLite的跨运行去重索引与输入水位线
+
+    - hashes 表保存所有已输出公式的 128 位 blake2b 摘要（16字节二进制）
+    - meta 表保存原始文件已处理到的字节偏移（块压缩文件为解压后偏移）、行号，以及提交时各输出文件的大小
+    - 新哈希与水位线在同一事务中提交；输出文件先落盘再提交，崩溃后按记录的大小截断回滚
+    - 指定 bloom_path 时用磁盘布隆过滤器预判：判定为“一定没见过”的摘要不查库，
+      在提交时批量写入；只有“可能见过”的才逐条查库
+    - 每次提交了新哈希，meta 中的 generation 加一，并写入布隆过滤器文件头；
+      两者不一致（例如中间有一次不带布隆过滤器的运行）时从库中重建布隆过滤器
+    """
+    digest_bits = 128
+
+    def __init__(self, db_path, bloom_path=None, bloom_capacity=10_000_000):
+        self.db_path = str(db_path)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS hashes (hash BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        self.conn.commit()
+        self.added = 0
+        self.committed_added = 0
+        self.pending = set()
+        self.bloom = None
+        if bloom_path:
+            self._open_bloom(bloom_path, bloom_capacity)
+
+    def _open_bloom(self, path, capacity):
+        # 容量不足时按倍数扩大，参数变化会使旧文件失效并从库中重建
+        count = self.count()
+        while capacity < 2 * count:
+            capacity *= 2
+        self.bloom = BloomFilter(capacity, path=str(path))
+        generation = self.get("generation", 0)
+        if not self.bloom.created and self.bloom.generation != generation:
+            logger.warning(f"布隆过滤器（版本 {self.bloom.generation}）落后于去重索引（版本 {generation}），重建")
+            self.bloom.clear()
+        elif not self.bloom.created:
+            return
+        if count:
+            logger.info(f"从去重索引重建布隆过滤器（{count} 条，容量 {capacity}）")
+            for (key,) in self.conn.execute("SELECT hash FROM hashes"):
+                self.bloom.add(int.from_bytes(key, 'big'))
+        self.bloom.set_generation(generation)
+        self.bloom.flush()
+
+    def get(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set(self, key, value):
+        """写入元数据，随下一次 commit 一起提交"""
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def watermark(self, raw_file):
+        """返回 (起始字节偏移, 已处理行数)；原始文件被替换或截断时回到开头"""
+        offset = self.get("offset", 0)
+        lines = self.get("lines", 0)
+        if offset == 0:
+            return 0, 0
+        if jsonl_size(raw_file) < offset or self.get("fingerprint") != file_fingerprint(raw_file):
+            logger.warning(f"原始文件已被替换或截断，从头处理（已见过的公式仍会被跳过）: {raw_file}")
+            return 0, 0
+        return offset, lines
+
+    def add(self, digest):
+        """登记一个公式摘要（hash_set.content_digest 的128位整数），首次出现返回 True"""
+        key = digest.to_bytes(16, 'big')
+        if self.bloom is not None:
+            if digest not in self.bloom:
+                self.bloom.add(digest)
+                self.pending.add(key)
+                self.added += 1
+                return True
+            if key in self.pending:
+                return False
+        cursor = self.conn.execute("INSERT OR IGNORE INTO hashes VALUES (?)", (key,))
+        if cursor.rowcount == 1:
+            if self.bloom is not None:
+                self.bloom.add(digest)
+            self.added += 1
+            return True
+        return False
+
+    def rollback_outputs(self, outputs):
+        """把输出文件截断到上次提交时的大小，丢弃中断运行留下的未提交记录
+
+        大小按磁盘上的文件计；块压缩的输出在落盘时切块，提交时的大小总在块边界上。
+        """
+        for name, path in outputs.items():
+            committed = self.get(f"size:{name}")
+            if committed is None or not os.path.exists(path):
+                continue
+            size = os.path.getsize(path)
+            if size > committed:
+                truncate_jsonl(path, committed)
+                logger.warning(f"回滚 {path} 中上次中断后未提交的 {size - committed} 字节")
+
+    def commit(self, raw_file, offset, lines, outputs):
+        """提交新哈希与水位线；调用前输出文件必须已经落盘"""
+        if self.pending:
+            self.conn.executemany("INSERT OR IGNORE INTO hashes VALUES (?)", ((key,) for key in self.pending))
+            self.pending.clear()
+        if self.bloom is not None:
+            self.bloom.flush()
+        values = {"offset": offset, "lines": lines}
+        if offset:
+            values["fingerprint"] = file_fingerprint(raw_file)
+        for name, path in outputs.items():
+            values[f"size:{name}"] = os.path.getsize(path) if os.path.exists(path) else 0
+        generation = None
+        if self.added != self.committed_added:
+            generation = values["generation"] = self.get("generation", 0) + 1
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", values.items())
+        self.conn.commit()
+        self.committed_added = self.added
+        # 库先提交再更新布隆过滤器的版本号：两者之间崩溃只会导致下次重建
+        if self.bloom is not None and generation is not None:
+            self.bloom.set_generation(generation)
+            self.bloom.flush()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def close(self):
+        self.conn.rollback()
+        self.conn.close()
+        if self.bloom is not None:
+            self.bloom.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看增量清洗的去重索引与水位线")
+    parser.add_argument("db", help="索引数据库路径")
+    args = parser.parse_args()
+
+    index = WashIndex(args.db)
+    print(f"已登记公式: {index.count()}")
+    print(f"原始文件水位: {index.get('offset', 0)} 字节, {index.get('lines', 0)} 行")
+    index.close()
@@ -0,0 +1,165 @@
+import html
+import logging
+import re
+from urllib.parse import quote
+
+import requests
+
+from raw_format import WIKI_VARIANTS, compact_record
+
+logger = logging.getLogger("crawler")
+
+WIKI_API_PATH = "/w/api.php"
+WIKI_CATEGORY = "Category:数学公式"
+
+# MediaWiki 单次请求最多可查询 50 个标题的修订内容
+TITLES_PER_REQUEST = 50
+
+# <math>…</math> / <math display="block">…</math>，忽略大小写，允许跨行
+MATH_TAG_PATTERN = re.compile(r'<math(?:\s[^>]*)?>(.*?)</math\s*>', re.IGNORECASE | re.DOTALL)
+HTML_COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.DOTALL)
+
+# === MediaWiki API 客户端 ===
+class WikiApiClient:
+    """通过 MediaWiki API 批量获取分类成员和页面源码，统计请求数与流量"""
+    def __init__(self, base_url, session=None):
+        self.base_url = base_url
+        self.api_url = base_url + WIKI_API_PATH
+        self.session = session or requests.Session()
+        self.stats = {"requests": 0, "bytes": 0}
+
+    def _get(self, params):
+        params = dict(params, format="json", formatversion=2)
+        response = self.session.get(self.api_url, params=params)
+        response.raise_for_status()
+        self.stats["requests"] += 1
+        self.stats["bytes"] += len(response.content)
+        payload = response.json()
+        if "error" in payload:
+            raise RuntimeError(f"API错误: {payload['error'].get('info', payload['error'])}")
+        return payload
+
+    def iter_category_members(self, category=WIKI_CATEGORY, limit=500):
+        """按 cmcontinue 续传令牌遍历分类中的条目标题（仅主命名空间）"""
+        params = {
+            "action": "query",
+            "list": "categorymembers",
+            "cmtitle": category,
+            "cmnamespace": 0,
+            "cmtype": "page",
+            "cmlimit": limit,
+        }
+        while True:
+            payload = self._get(params)
+            for member in payload.get("query", {}).get("categorymembers", []):
+                yield member["title"]
+            if "continue" not in payload:
+                break
+            params.update(payload["continue"])
+
+    def fetch_wikitext(self, titles):
+        """批量获取多个页面的 wikitext，返回 {标题: wikitext}"""
+        params = {
+            "action": "query",
+            "prop": "revisions",
+            "rvprop": "content",
+            "rvslots": "main",
+            "titles": "|".join(titles),
+        }
+        pages = {}
+        while True:
+            payload = self._get(params)
+            for page in payload.get("query", {}).get("pages", []):
+                revisions = page.get("revisions")
+                if revisions:
+                    pages[page["title"]] = revisions[0]["slots"]["main"]["content"]
+            # 内容过大时 API 会返回 rvcontinue，需要继续请求剩余页面
+            if "continue" not in payload:
+                break
+            params.update(payload["continue"])
+        return pages
+
+    def page_url(self, title):
+        """与HTML模式一致的页面地址，作为记录的 source 字段"""
+        return self.base_url + "/wiki/" + quote(title.replace(" ", "_"))
+
+# === 公式提取 ===
+def extract_math(wikitext):
+    """直接从 wikitext 中提取 <math> 标签内的 LaTeX"""
+    wikitext = HTML_COMMENT_PATTERN.sub("", wikitext)
+    formulas = []
+    for match in MATH_TAG_PATTERN.finditer(wikitext):
+        latex = html.unescape(match.group(1)).strip()
+        latex = latex.replace('\\displaystyle ', '')
+        if latex:
+            formulas.append(latex)
+    return formulas
+
+def build_records(title, formulas, source):
+    """每条公式一条紧凑记录；四种中文描述变体只记模板编号，导出时再展开（见 raw_format）"""
+    return [compact_record(title, latex, source, WIKI_VARIANTS) for latex in formulas]
+
+def iter_math_wiki_api(base_url, max_pages=None, session=None, batch_size=TITLES_PER_REQUEST,
+                       frontier=None):
+    """API模式：枚举分类成员，按批拉取 wikitext 并提取公式
+
+    生成器，每批页面产出一个记录列表；调用方写入后才在前沿中标记完成。
+    """
+    client = WikiApiClient(base_url, session)
+    total = 0
+
+    logger.info(f"开始通过API爬取维基百科数学公式，目标页面数: {max_pages or '不限'}")
+
+    try:
+        titles = []
+        for title in client.iter_category_members():
+            # 前沿中已完成的页面不再重复获取
+            if frontier:
+                url = client.page_url(title)
+                frontier.add([url])
+                if not frontier.should_fetch(url):
+                    continue
+            titles.append(title)
+            if max_pages and len(titles) >= max_pages:
+                break
+        logger.info(f"找到 {len(titles)} 个相关页面")
+
+        for start in range(0, len(titles), batch_size):
+            batch = titles[start:start + batch_size]
+            try:
+                pages = client.fetch_wikitext(batch)
+            except Exception as e:
+                logger.error(f"批量获取页面失败: {batch[0]} 等 {len(batch)} 页 - {str(e)}")
+                if frontier:
+                    for title in batch:
+                        frontier.mark_failed(client.page_url(title), e)
+                continue
+            # 按枚举顺序输出，保证结果稳定
+            records = []
+            done = []
+            for title in batch:
+                if title not in pages:
+                    continue
+                formulas = extract_math(pages[title])
+                records.extend(build_records(title, formulas, client.page_url(title)))
+                done.append((client.page_url(title), len(formulas)))
+            yield records
+            total += len(records)
+            if frontier:
+                for url, count in done:
+                    frontier.mark_done(url, count)
+            logger.info(f"已处理 {min(start + batch_size, len(titles))}/{len(titles)} 页")
+
+    except Exception as e:
+        logger.error(f"API爬取失败: {str(e)}")
+
+    logger.info(f"维基百科API爬取完成，共获取 {total} 条公式数据，"
+                f"请求 {client.stats['requests']} 次，传输 {client.stats['bytes']/1024:.1f} KB")
+
+def crawl_math_wiki_api(base_url, max_pages=None, session=None, batch_size=TITLES_PER_REQUEST,
+                        frontier=None):
+    """iter_math_wiki_api 的列表版本"""
+    data = []
+    for records in iter_math_wiki_api(base_url, max_pages, session, batch_size, frontier):
+        data.extend(records)
+    return data